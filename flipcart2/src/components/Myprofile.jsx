@@ -22,7 +22,7 @@ const MyProfile = () => {
     setLoading(true);
     const res = await getOrders();
     if (res.success) {
-      setOrders(res.data);
+      setOrders(res.data.results || res.data);
     } else {
       console.error("Failed to fetch orders");
     }
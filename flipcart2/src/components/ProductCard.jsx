@@ -4,11 +4,30 @@ const ProductCard = ({ product, addToCart }) => {
   return (
     <div className="bg-white p-4 rounded shadow hover:shadow-lg transition-shadow duration-200">
       <Link to={`/product/${product.id}`}>
-        <img
-          src={product.image}
-          alt={product.name}
-          className="w-full h-40 object-cover mb-3 rounded"
-        />
+        {product.images ? (
+          // Locally generated variants: the browser picks the smallest that fits
+          <picture>
+            <source
+              type="image/webp"
+              srcSet={product.images.map((v) => `${v.webp} ${v.width}w`).join(", ")}
+              sizes="(min-width: 768px) 25vw, 100vw"
+            />
+            <img
+              src={product.images[product.images.length - 1].jpeg}
+              srcSet={product.images.map((v) => `${v.jpeg} ${v.width}w`).join(", ")}
+              sizes="(min-width: 768px) 25vw, 100vw"
+              alt={product.name}
+              loading="lazy"
+              className="w-full h-40 object-cover mb-3 rounded"
+            />
+          </picture>
+        ) : (
+          <img
+            src={product.image}
+            alt={product.name}
+            className="w-full h-40 object-cover mb-3 rounded"
+          />
+        )}
         <h3 className="font-semibold text-lg hover:text-blue-600 transition-colors">{product.name}</h3>
       </Link>
       <p className="text-blue-600 font-bold mt-1">₹{product.price}</p>
@@ -184,7 +184,7 @@ const Home = () => {
 
     const res = await getProducts(params);
     if (res.success) {
-      setProducts(res.data);
+      setProducts(res.data.results || res.data);
     } else {
       console.error("Failed to fetch products:", res.error);
       setProducts([]);
@@ -21,7 +21,8 @@ const ProductDetails = () => {
       // Fetch related products from same category
       const relatedRes = await getProducts({ category: res.data.category });
       if (relatedRes.success) {
-        setRelatedProducts(relatedRes.data.filter(p => p.id !== res.data.id));
+        const related = relatedRes.data.results || relatedRes.data;
+        setRelatedProducts(related.filter(p => p.id !== res.data.id));
       }
     } else {
       console.error("Failed to fetch product");
@@ -38,7 +38,7 @@ const SellerDashboard = () => {
     setLoading(true);
     
     // Fetch products
-    const productsRes = await getProducts({ limit: 100 });
+    const productsRes = await getProducts({ page_size: 100 });
     if (productsRes.success) {
       setProducts(productsRes.data.results || productsRes.data);
     }
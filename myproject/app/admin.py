@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Cart, CartItem, Order, OrderItem
+from .models import Product, ProductFacet, Cart, CartItem, Order, OrderItem
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -7,6 +7,11 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ['category', 'created_at']
     search_fields = ['name', 'description']
 
+@admin.register(ProductFacet)
+class ProductFacetAdmin(admin.ModelAdmin):
+    list_display = ['category', 'subcategory', 'price_band', 'count']
+    list_filter = ['category', 'price_band']
+
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'created_at']
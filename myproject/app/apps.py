@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401
+        from .database import configure_connection
+        from .search import reinstall_search_triggers
+        connection_created.connect(configure_connection)
+        post_migrate.connect(reinstall_search_triggers, sender=self)
+
+        if 'app.metrics.MetricsMiddleware' in settings.MIDDLEWARE:
+            from .metrics import install_query_counter
+            connection_created.connect(install_query_counter)
@@ -0,0 +1,180 @@
+"""
+Async read path for the public catalog endpoints.
+
+The product list (including ?search=), detail and facet views below answer
+GET like their DRF counterparts in views.py, with the same cache entries,
+ETags and response bodies, but as coroutines over the async ORM and cache
+API. Under an ASGI server a request waiting on the cache or database then
+parks on the event loop instead of holding one of the worker's threads.
+
+They are served under /api/async/, and in place of the synchronous views
+at the usual URLs when ASYNC_CATALOG_VIEWS is True; writes always go to
+the DRF views. DRF's APIView is synchronous, so these are plain Django
+views that reuse its request wrapper, serializers and JSON renderer.
+Catalog responses don't depend on the user, so nothing is authenticated.
+"""
+from abc import ABC, abstractmethod
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import acached_validators, acatalog_cache_key, arecord, normalize_params
+from .conditional import make_etag
+from .database import use_primary
+from .facets import afacet_counts
+from .filters import filter_products
+from .metrics import serializer_data
+from .models import Product
+from .pagination import KeysetPagination
+from .search import search_products
+from .serializers import ProductSerializer
+from .sparse import fieldset_params, sparse_queryset
+
+
+# The API's JSON renderer, as DRF views would negotiate for these clients
+renderer = next(renderer_class for renderer_class in api_settings.DEFAULT_RENDERER_CLASSES if renderer_class.format == 'json')()
+
+
+def json_response(data, status=200):
+	return HttpResponse(renderer.render(data), status=status, content_type=renderer.media_type)
+
+
+class AsyncCatalogView(ABC, View):
+	"""
+	GET-only async view with the catalog cache and conditional GET.
+
+	Subclasses implement ``get_data()`` and optionally ``get_validators()``,
+	both coroutines, like CatalogCacheMixin/ConditionalGetMixin views.
+	"""
+	http_method_names = ['get', 'head', 'options']
+	cache_namespace = None
+
+	async def get(self, request, **kwargs):
+		request = Request(request)
+		try:
+			etag, last_modified = await self.get_validators(request, **kwargs)
+			timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+			if (etag or timestamp) and get_conditional_response(request, etag=etag, last_modified=timestamp) is not None:
+				response = HttpResponseNotModified()
+			else:
+				response = await self.cached_response(request, kwargs)
+		except APIException as exc:
+			# Same body as DRF's exception handler
+			detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+			return json_response(detail, status=exc.status_code)
+
+		if response.status_code in (200, 304):
+			if etag:
+				response['ETag'] = etag
+			if last_modified:
+				response['Last-Modified'] = http_date(last_modified.timestamp())
+		return response
+
+	async def cached_response(self, request, kwargs):
+		key = await acatalog_cache_key(self.cache_namespace, request, kwargs)
+		data = await cache.aget(key)
+		if data is not None:
+			await arecord('hit')
+			response = json_response(data)
+			response['X-Cache'] = 'HIT'
+			return response
+
+		await arecord('miss')
+		# What goes into the cache must not come from a lagging replica
+		use_primary()
+		data = await self.get_data(request, **kwargs)
+		await cache.aset(key, data, settings.CATALOG_CACHE_TIMEOUT)
+		response = json_response(data)
+		response['X-Cache'] = 'MISS'
+		return response
+
+	async def get_validators(self, request, **kwargs):
+		return None, None
+
+	@abstractmethod
+	async def get_data(self, request, **kwargs):
+		"""The JSON-ready response body, cached under the catalog version."""
+
+
+class AsyncProductListView(AsyncCatalogView):
+	cache_namespace = 'products'
+
+	async def get_queryset(self, request):
+		queryset = Product.objects.select_related('seller').order_by('-created_at', 'id')
+		search = request.query_params.get('search', None)
+		if search:
+			# May look up whether the search index exists, which is a sync query
+			queryset = await sync_to_async(search_products)(queryset, search)
+		return sparse_queryset(filter_products(queryset, request.query_params), ProductSerializer, request)
+
+	async def get_validators(self, request, **kwargs):
+		async def compute():
+			queryset = await self.get_queryset(request)
+			stats = await queryset.order_by().aaggregate(last_modified=Max('updated_at'), count=Count('id'))
+			return make_etag('products', stats['count'], stats['last_modified'], normalize_params(request.query_params))
+		return await acached_validators(self.cache_namespace, request, kwargs, compute)
+
+	async def get_data(self, request, **kwargs):
+		paginator = KeysetPagination()
+		page = await paginator.apaginate_queryset(await self.get_queryset(request), request)
+		serializer = ProductSerializer(page, many=True, context={'request': request})
+		return paginator.get_paginated_data(serializer_data(serializer))
+
+
+class AsyncProductDetailView(AsyncCatalogView):
+	cache_namespace = 'product-detail'
+
+	async def get_validators(self, request, **kwargs):
+		async def compute():
+			updated_at = await Product.objects.filter(pk=kwargs['pk']).values_list('updated_at', flat=True).afirst()
+			if updated_at is None:
+				return None
+			return make_etag('product', kwargs['pk'], updated_at, fieldset_params(request.query_params))
+		return await acached_validators(self.cache_namespace, request, kwargs, compute)
+
+	async def get_data(self, request, **kwargs):
+		try:
+			product = await sparse_queryset(Product.objects.select_related('seller'), ProductSerializer, request).aget(pk=kwargs['pk'])
+		except Product.DoesNotExist:
+			raise NotFound()
+		return serializer_data(ProductSerializer(product, context={'request': request}))
+
+
+class AsyncProductFacetView(AsyncCatalogView):
+	cache_namespace = 'facets'
+
+	async def get_data(self, request, **kwargs):
+		search = request.query_params.get('search', None)
+		search_queryset = await sync_to_async(search_products)(Product.objects.all(), search) if search else None
+		return await afacet_counts(request.query_params, search_queryset)
+
+
+def catalog_view(async_view, sync_view):
+	"""
+	The view for a catalog URL. With ASYNC_CATALOG_VIEWS, GET/HEAD go to
+	``async_view`` and every other method (e.g. creating a product) to the
+	synchronous DRF ``sync_view``.
+	"""
+	if not settings.ASYNC_CATALOG_VIEWS:
+		return sync_view.as_view()
+	read = async_view.as_view()
+	write = sync_to_async(sync_view.as_view())
+
+	async def view(request, *args, **kwargs):
+		if request.method in ('GET', 'HEAD'):
+			return await read(request, *args, **kwargs)
+		return await write(request, *args, **kwargs)
+
+	# The DRF view enforces CSRF itself for session-authenticated writes
+	view.csrf_exempt = True
+	return view
@@ -0,0 +1,125 @@
+"""
+Token authentication that doesn't hit the database on every request.
+
+A token's user is looked up in two tiers before falling back to DRF's
+Token + User join: a small in-process LRU, then the configured Django cache
+(shared by every worker). Deleting a token (logout) or saving its user
+evicts the entry from this worker's LRU and from the shared cache. Other
+workers may keep serving their local copy for at most
+TOKEN_CACHE_LOCAL_TIMEOUT seconds, which is why that TTL is short.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+# Everything but the password hash; a user rebuilt from the snapshot loads
+# it lazily (and save() leaves it alone) because it is deferred.
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+class LocalTokenCache:
+	"""Thread-safe LRU of token digest -> snapshot with a per-entry TTL."""
+
+	def __init__(self, maxsize, timeout):
+		self.maxsize = maxsize
+		self.timeout = timeout
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, key):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is None:
+				return None
+			expires, value = entry
+			if expires < time.monotonic():
+				del self.entries[key]
+				return None
+			self.entries.move_to_end(key)
+			return value
+
+	def set(self, key, value):
+		with self.lock:
+			self.entries[key] = (time.monotonic() + self.timeout, value)
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.maxsize:
+				self.entries.popitem(last=False)
+
+	def delete(self, key):
+		with self.lock:
+			self.entries.pop(key, None)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+
+
+local_tokens = LocalTokenCache(
+	maxsize=getattr(settings, 'TOKEN_CACHE_LOCAL_SIZE', 1024),
+	timeout=getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 5),
+)
+
+
+def token_cache_key(key):
+	# Never put raw tokens in cache keys
+	return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def snapshot(token):
+	return {
+		'created': token.created,
+		'user': tuple(getattr(token.user, name) for name in USER_FIELDS),
+	}
+
+
+def restore(key, data):
+	db = router.db_for_read(User)
+	user = User.from_db(db, USER_FIELDS, data['user'])
+	token = Token.from_db(router.db_for_read(Token), ['key', 'user_id', 'created'], [key, user.pk, data['created']])
+	token.user = user
+	return token
+
+
+def forget_token(key):
+	cache_key = token_cache_key(key)
+	local_tokens.delete(cache_key)
+	cache.delete(cache_key)
+
+
+def clear_token_cache():
+	"""Empty this process's LRU. Shared entries are cleared with the cache itself."""
+	local_tokens.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+	"""Drop-in replacement for TokenAuthentication backed by the token cache."""
+
+	def authenticate_credentials(self, key):
+		cache_key = token_cache_key(key)
+		data = local_tokens.get(cache_key)
+		if data is None:
+			data = cache.get(cache_key)
+			if data is None:
+				try:
+					token = Token.objects.select_related('user').get(key=key)
+				except Token.DoesNotExist:
+					raise exceptions.AuthenticationFailed(_('Invalid token.'))
+				data = snapshot(token)
+				cache.set(cache_key, data, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+			local_tokens.set(cache_key, data)
+
+		token = restore(key, data)
+		if not token.user.is_active:
+			raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+		return token.user, token
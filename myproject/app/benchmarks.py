@@ -0,0 +1,181 @@
+"""
+Shared helpers for the ``bench_*`` management commands.
+
+Benchmarks always run against a throwaway test database so they can seed
+hundreds of thousands of rows without touching db.sqlite3.
+"""
+import asyncio
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from .metrics import registry
+from .models import Product
+
+
+BRANDS = ['Samsung', 'Apple', 'Sony', 'LG', 'OnePlus', 'Dell', 'HP', 'Lenovo', 'Nike', 'Adidas', 'Puma', 'Zara', 'Lakme', 'Nivea', 'Bosch', 'Philips']
+ADJECTIVES = ['Wireless', 'Premium', 'Classic', 'Smart', 'Ultra', 'Slim', 'Pro', 'Lite', 'Cotton', 'Leather', 'Matte', 'Portable']
+NOUNS = {
+	'electronics': ['Phone', 'Laptop', 'Headphones', 'Earbuds', 'Watch', 'Tablet', 'Speaker'],
+	'fashion': ['Shirt', 'Jeans', 'Dress', 'Sneakers', 'Jacket', 'Belt', 'Sunglasses'],
+	'beauty': ['Lipstick', 'Mascara', 'Serum', 'Shampoo', 'Perfume', 'Moisturizer'],
+	'appliances': ['Refrigerator', 'Washing Machine', 'Microwave', 'Air Conditioner', 'Vacuum'],
+}
+
+
+@contextmanager
+def benchmark_database(name=None, options=None, verbosity=0):
+	"""
+	Create a fresh, migrated test database for the duration of the block.
+
+	``name`` selects an on-disk database file (needed when several threads
+	must share one SQLite database); by default Django's in-memory test
+	database is used. ``options`` are merged into the connection OPTIONS.
+	Benchmark requests are kept out of the server's metrics (METRICS_DIR).
+	"""
+	connection = connections['default']
+	old_name = connection.settings_dict['NAME']
+	old_test_name = connection.settings_dict['TEST'].get('NAME')
+	old_options = dict(connection.settings_dict['OPTIONS'])
+	if name:
+		connection.settings_dict['TEST']['NAME'] = name
+	if options:
+		connection.settings_dict['OPTIONS'].update(options)
+	setup_test_environment()
+	metrics = override_settings(METRICS_DIR=None)
+	metrics.enable()
+	connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+	try:
+		yield connection
+	finally:
+		metrics.disable()
+		registry.reset()
+		connections.close_all()
+		connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+		connection.settings_dict['TEST']['NAME'] = old_test_name
+		connection.settings_dict['OPTIONS'] = old_options
+		teardown_test_environment()
+
+
+def synthetic_products(count, seller=None, seed=0, start=0):
+	"""Yield unsaved products with plausible, searchable names."""
+	rng = random.Random(seed + start)
+	categories = list(NOUNS)
+	for i in range(start, start + count):
+		category = rng.choice(categories)
+		noun = rng.choice(NOUNS[category])
+		brand = rng.choice(BRANDS)
+		adjective = rng.choice(ADJECTIVES)
+		yield Product(
+			seller=seller,
+			name=f'{brand} {adjective} {noun} {i}',
+			description=f'{adjective} {noun.lower()} by {brand} for everyday use',
+			price=Decimal(rng.randint(199, 199999)),
+			category=category,
+			stock=rng.randint(0, 500),
+		)
+
+
+def seed_products(count, seller=None, seed=0, start=0, batch_size=5000):
+	products = synthetic_products(count, seller=seller, seed=seed, start=start)
+	batch = []
+	for product in products:
+		batch.append(product)
+		if len(batch) >= batch_size:
+			Product.objects.bulk_create(batch)
+			batch = []
+	if batch:
+		Product.objects.bulk_create(batch)
+
+
+def timed(fn, repeat):
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		samples.append(time.perf_counter() - start)
+	return samples
+
+
+def percentile(samples, pct):
+	ordered = sorted(samples)
+	if not ordered:
+		return 0.0
+	index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+	return ordered[index]
+
+
+def summarize(samples):
+	return {
+		'count': len(samples),
+		'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+		'p50_ms': percentile(samples, 50) * 1000,
+		'p95_ms': percentile(samples, 95) * 1000,
+		'p99_ms': percentile(samples, 99) * 1000,
+	}
+
+
+class LatencyCache(LocMemCache):
+	"""
+	LocMemCache plus a fixed round trip per call (the LATENCY cache setting,
+	in seconds), standing in for a cache server on the network: sync calls
+	block their thread, async calls only suspend their coroutine.
+	"""
+
+	def __init__(self, name, params):
+		super().__init__(name, params)
+		self.latency = params.get('LATENCY', 0.001)
+
+	def get(self, *args, **kwargs):
+		time.sleep(self.latency)
+		return super().get(*args, **kwargs)
+
+	def set(self, *args, **kwargs):
+		time.sleep(self.latency)
+		return super().set(*args, **kwargs)
+
+	def add(self, *args, **kwargs):
+		time.sleep(self.latency)
+		return super().add(*args, **kwargs)
+
+	def incr(self, *args, **kwargs):
+		time.sleep(self.latency)
+		return super().incr(*args, **kwargs)
+
+	# One round trip for many keys, like memcached's and Redis's multi-get
+	def get_many(self, keys, version=None):
+		time.sleep(self.latency)
+		found = {}
+		for key in keys:
+			value = super().get(key, self._missing_key, version)
+			if value is not self._missing_key:
+				found[key] = value
+		return found
+
+	def set_many(self, data, timeout=None, version=None):
+		time.sleep(self.latency)
+		for key, value in data.items():
+			super().set(key, value, timeout, version)
+		return []
+
+	async def aget(self, *args, **kwargs):
+		await asyncio.sleep(self.latency)
+		return super().get(*args, **kwargs)
+
+	async def aset(self, *args, **kwargs):
+		await asyncio.sleep(self.latency)
+		return super().set(*args, **kwargs)
+
+	async def aadd(self, *args, **kwargs):
+		await asyncio.sleep(self.latency)
+		return super().add(*args, **kwargs)
+
+	async def aincr(self, *args, **kwargs):
+		await asyncio.sleep(self.latency)
+		return super().incr(*args, **kwargs)
@@ -0,0 +1,215 @@
+"""
+Versioned response cache for the public catalog endpoints.
+
+Every cache key embeds a catalog version number. Any change to a product
+bumps the version, which orphans all previously cached responses at once
+instead of hunting down the keys that might contain the product.
+"""
+import hashlib
+import time
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .conditional import make_etag
+from .database import use_primary
+from .sparse import fieldset_params
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_STATS_KEYS = {'hit': 'catalog:stats:hits', 'miss': 'catalog:stats:misses'}
+
+# Query params that change a catalog response, besides ?fields= and
+# ?expand= (see app/sparse.py); anything else is ignored.
+CATALOG_PARAMS = ('search', 'category', 'subcategory', 'min_price', 'max_price', 'cursor', 'page_size')
+CASE_INSENSITIVE_PARAMS = ('search', 'category', 'subcategory')
+PRICE_PARAMS = ('min_price', 'max_price')
+
+
+def _initial_version():
+	# Seed from the clock so a counter lost to eviction or a restart never
+	# comes back at a value that older cached responses were stored under.
+	return time.time_ns() // 1000
+
+
+def catalog_version():
+	version = cache.get(CATALOG_VERSION_KEY)
+	if version is None:
+		cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+		version = cache.get(CATALOG_VERSION_KEY)
+	return version
+
+
+async def acatalog_version():
+	version = await cache.aget(CATALOG_VERSION_KEY)
+	if version is None:
+		await cache.aadd(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+		version = await cache.aget(CATALOG_VERSION_KEY)
+	return version
+
+
+def bump_catalog_version():
+	try:
+		cache.incr(CATALOG_VERSION_KEY)
+	except ValueError:
+		cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+
+
+def catalog_changed():
+	"""Invalidate cached catalog responses once the current transaction commits."""
+	transaction.on_commit(bump_catalog_version)
+
+
+def normalize_params(query_params):
+	normalized = fieldset_params(query_params)
+	for name in CATALOG_PARAMS:
+		value = query_params.get(name, '').strip()
+		if not value:
+			continue
+		if name in CASE_INSENSITIVE_PARAMS:
+			value = ' '.join(value.lower().split())
+		elif name in PRICE_PARAMS:
+			try:
+				value = str(Decimal(value).normalize())
+			except InvalidOperation:
+				pass
+		normalized.append((name, value))
+	return normalized
+
+
+def versioned_key(version, namespace, request, kwargs=None):
+	parts = [
+		request.scheme,
+		request.get_host(),
+		urlencode(sorted((kwargs or {}).items())),
+		urlencode(normalize_params(request.query_params)),
+	]
+	digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+	return f'catalog:{version}:{namespace}:{digest}'
+
+
+def catalog_cache_key(namespace, request, kwargs=None):
+	return versioned_key(catalog_version(), namespace, request, kwargs)
+
+
+async def acatalog_cache_key(namespace, request, kwargs=None):
+	return versioned_key(await acatalog_version(), namespace, request, kwargs)
+
+
+def cached_many(namespace, request, pks, compute):
+	"""
+	``{pk: data}`` for ``pks`` as cached by the ``namespace`` detail view:
+	cached entries come from one get_many, the rest from ``compute(missing)``
+	(a ``{pk: data}`` dict) and are stored with one set_many.
+	"""
+	version = catalog_version()
+	keys = {pk: versioned_key(version, namespace, request, {'pk': pk}) for pk in pks}
+	cached = cache.get_many(keys.values())
+	found = {pk: cached[key] for pk, key in keys.items() if key in cached}
+	missing = [pk for pk in pks if pk not in found]
+	record('miss' if missing else 'hit')
+	if missing:
+		use_primary()
+		computed = compute(missing)
+		cache.set_many({keys[pk]: data for pk, data in computed.items()}, settings.CATALOG_CACHE_TIMEOUT)
+		found.update(computed)
+	return found
+
+
+def cached_validators(namespace, request, kwargs, compute):
+	"""
+	Return ``(etag, None)`` for the ETag ``compute()`` returns, memoized
+	under the current catalog version, so conditional GETs skip the database.
+
+	The version goes into the ETag, since catalog writes that no product
+	timestamp reflects (a deletion, a seller rename) bump it too; for the
+	same reason there is no Last-Modified.
+	"""
+	version = catalog_version()
+	key = versioned_key(version, f'{namespace}:validators', request, kwargs)
+	validators = cache.get(key)
+	if validators is None:
+		use_primary()
+		validators = versioned_validators(version, compute())
+		if validators[0] is not None:
+			cache.set(key, validators, settings.CATALOG_CACHE_TIMEOUT)
+	return validators
+
+
+async def acached_validators(namespace, request, kwargs, compute):
+	"""cached_validators() for a coroutine ``compute``."""
+	version = await acatalog_version()
+	key = versioned_key(version, f'{namespace}:validators', request, kwargs)
+	validators = await cache.aget(key)
+	if validators is None:
+		use_primary()
+		validators = versioned_validators(version, await compute())
+		if validators[0] is not None:
+			await cache.aset(key, validators, settings.CATALOG_CACHE_TIMEOUT)
+	return validators
+
+
+def versioned_validators(version, etag):
+	if etag is None:
+		return None, None
+	return make_etag(etag, version), None
+
+
+def record(outcome):
+	key = CATALOG_STATS_KEYS[outcome]
+	try:
+		cache.incr(key)
+	except ValueError:
+		cache.add(key, 1, timeout=None)
+
+
+async def arecord(outcome):
+	key = CATALOG_STATS_KEYS[outcome]
+	try:
+		await cache.aincr(key)
+	except ValueError:
+		await cache.aadd(key, 1, timeout=None)
+
+
+def cache_stats():
+	values = cache.get_many(CATALOG_STATS_KEYS.values())
+	hits = values.get(CATALOG_STATS_KEYS['hit'], 0)
+	misses = values.get(CATALOG_STATS_KEYS['miss'], 0)
+	total = hits + misses
+	return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+
+def reset_cache_stats():
+	cache.delete_many(CATALOG_STATS_KEYS.values())
+
+
+class CatalogCacheMixin:
+	"""
+	Serve GET responses from the versioned catalog cache.
+
+	Only successful responses are stored, read from the primary database.
+	The response payload must not depend on the requesting user.
+	"""
+	cache_namespace = None
+
+	def get(self, request, *args, **kwargs):
+		key = catalog_cache_key(self.cache_namespace, request, kwargs)
+		data = cache.get(key)
+		if data is not None:
+			record('hit')
+			response = Response(data)
+			response['X-Cache'] = 'HIT'
+			return response
+
+		record('miss')
+		# What goes into the cache must not come from a lagging replica
+		use_primary()
+		response = super().get(request, *args, **kwargs)
+		if response.status_code == 200:
+			cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+		response['X-Cache'] = 'MISS'
+		return response
@@ -0,0 +1,129 @@
+"""
+Cart writes.
+
+Adding to the cart is one INSERT ... ON CONFLICT DO UPDATE that adds to the
+stored quantity in the database, so two tabs adding the same product both
+count instead of one overwriting the other, and the (cart, product) unique
+constraint decides between a new line and a bigger one. Updates and
+removals are single conditional statements too, so a batch of operations
+costs a fixed number of queries however many items it touches.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Cart, CartItem, Product
+
+
+class ItemsNotFound(APIException):
+	status_code = status.HTTP_404_NOT_FOUND
+	default_code = 'not_found'
+
+	def __init__(self, error, product_ids):
+		super().__init__()
+		# Set directly so product ids stay numbers in the response
+		self.detail = {'error': error, 'items': sorted(product_ids)}
+		self.product_ids = product_ids
+
+
+def get_cart(user):
+	cart, created = Cart.objects.get_or_create(user=user)
+	return cart
+
+
+def add_items(cart, quantities):
+	"""
+	Add ``{product_id: quantity}`` to ``cart`` in one upsert. Returns the
+	ids of the products added; ids of missing products are skipped.
+	"""
+	if not quantities:
+		return set()
+	connection = connections[router.db_for_write(CartItem)]
+	if not connection.features.can_return_columns_from_insert:
+		# RETURNING needs SQLite 3.35; look the products up first instead
+		quantities = {
+			product_id: quantities[product_id]
+			for product_id in Product.objects.filter(pk__in=quantities).values_list('pk', flat=True)
+		}
+		if not quantities:
+			return set()
+
+	qn = connection.ops.quote_name
+	column = {name: qn(CartItem._meta.get_field(name).column) for name in ('cart', 'product', 'quantity', 'created_at', 'updated_at')}
+	item_table = qn(CartItem._meta.db_table)
+	product_pk = qn(Product._meta.pk.column)
+	now = CartItem._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+	product_ids = list(quantities)
+	sql = (
+		f'INSERT INTO {item_table} ({", ".join(column.values())}) '
+		f'SELECT %s, {product_pk}, CASE {product_pk} {" ".join(["WHEN %s THEN %s"] * len(product_ids))} END, %s, %s '
+		f'FROM {qn(Product._meta.db_table)} WHERE {product_pk} IN ({", ".join(["%s"] * len(product_ids))}) '
+		f'ON CONFLICT ({column["cart"]}, {column["product"]}) DO UPDATE SET '
+		f'{column["quantity"]} = {item_table}.{column["quantity"]} + excluded.{column["quantity"]}, '
+		f'{column["updated_at"]} = excluded.{column["updated_at"]}'
+	)
+	params = [cart.pk]
+	for product_id in product_ids:
+		params += [product_id, quantities[product_id]]
+	params += [now, now, *product_ids]
+
+	with connection.cursor() as cursor:
+		if not connection.features.can_return_columns_from_insert:
+			cursor.execute(sql, params)
+			return set(product_ids)
+		cursor.execute(sql + f' RETURNING {column["product"]}', params)
+		return {row[0] for row in cursor.fetchall()}
+
+
+def update_items(cart, quantities):
+	"""Set the quantity of ``{product_id: quantity}`` already in ``cart``."""
+	if not quantities:
+		return
+	items = CartItem.objects.filter(cart=cart, product_id__in=quantities)
+	updated = items.update(
+		quantity=Case(
+			*[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+			default=F('quantity'),
+		),
+		updated_at=timezone.now(),
+	)
+	if updated != len(quantities):
+		raise ItemsNotFound('Cart item not found', set(quantities) - set(items.values_list('product_id', flat=True)))
+
+
+def remove_items(cart, product_ids):
+	if not product_ids:
+		return
+	items = CartItem.objects.filter(cart=cart, product_id__in=product_ids)
+	missing = set(product_ids) - set(items.values_list('product_id', flat=True))
+	if missing:
+		raise ItemsNotFound('Cart item not found', missing)
+	items.delete()
+
+
+def apply_operations(user, operations):
+	"""
+	Apply validated ``{'op', 'product_id', 'quantity'}`` operations to the
+	user's cart all-or-nothing, with one statement per kind of operation.
+	Returns the cart.
+	"""
+	adds, updates, removes = {}, {}, []
+	for operation in operations:
+		if operation['op'] == 'add':
+			adds[operation['product_id']] = operation['quantity']
+		elif operation['op'] == 'update' and operation['quantity'] > 0:
+			updates[operation['product_id']] = operation['quantity']
+		else:
+			# Updating to zero removes the item, as PATCH /api/cart/ does
+			removes.append(operation['product_id'])
+
+	cart = get_cart(user)
+	with transaction.atomic(using=router.db_for_write(CartItem)):
+		remove_items(cart, removes)
+		update_items(cart, updates)
+		added = add_items(cart, adds)
+		if len(added) != len(adds):
+			raise ItemsNotFound('Product not found', set(adds) - added)
+	return cart
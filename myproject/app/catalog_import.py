@@ -0,0 +1,124 @@
+"""
+Bulk catalog import.
+
+Rows are validated against the Product fields and upserted by
+(seller, sku) in batches: each batch is one INSERT ... ON CONFLICT DO
+UPDATE in its own transaction, so memory use and transaction size stay flat
+however long the feed is. bulk_create skips signals, so facets and the
+catalog cache are refreshed once at the end.
+"""
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .cache import catalog_changed
+from .facets import rebuild_facets
+from .filters import canonical_choice
+from .models import Product
+
+
+IMPORT_FIELDS = ('sku', 'name', 'description', 'price', 'category', 'subcategory', 'stock', 'image')
+REQUIRED_FIELDS = ('sku', 'name', 'price')
+UPDATE_FIELDS = [name for name in IMPORT_FIELDS if name != 'sku'] + ['updated_at']
+
+
+def read_rows(stream, format):
+	"""Yield ``(line number, row)``; JSONL rows are decoded by build_product."""
+	if format == 'csv':
+		reader = csv.DictReader(stream)
+		for row in reader:
+			yield reader.line_num, row
+	else:
+		for number, line in enumerate(stream, 1):
+			if line.strip():
+				yield number, line
+
+
+def build_product(row, seller):
+	"""Validate one feed row into an unsaved Product; raises ValidationError."""
+	if isinstance(row, str):
+		try:
+			row = json.loads(row)
+		except ValueError as exc:
+			raise ValidationError(f'Invalid JSON: {exc}')
+	if not isinstance(row, dict):
+		raise ValidationError('Expected an object')
+
+	values = {}
+	errors = {}
+	for name in IMPORT_FIELDS:
+		field = Product._meta.get_field(name)
+		value = row.get(name)
+		if isinstance(value, str):
+			value = value.strip()
+		if value is None or value == '':
+			if name in REQUIRED_FIELDS:
+				errors[name] = 'This field is required.'
+				continue
+			value = field.get_default()
+		elif name in ('category', 'subcategory'):
+			value = canonical_choice(value)
+		elif isinstance(value, float):
+			# Decimal(str) keeps 19.99 from becoming 19.989999...
+			value = str(value)
+		try:
+			values[name] = field.clean(value, None)
+		except ValidationError as exc:
+			errors[name] = exc.messages
+	if errors:
+		raise ValidationError(errors)
+	return Product(seller=seller, **values)
+
+
+def write_batch(products, dry_run=False):
+	products = list(products)
+	if products and not dry_run:
+		with transaction.atomic():
+			Product.objects.bulk_create(
+				products,
+				update_conflicts=True,
+				unique_fields=['seller', 'sku'],
+				update_fields=UPDATE_FIELDS,
+			)
+	return len(products)
+
+
+def import_products(rows, seller, batch_size=1000, dry_run=False, on_error=None, on_batch=None):
+	"""
+	Upsert ``rows`` (from read_rows) for ``seller``.
+
+	Invalid rows are skipped and passed to ``on_error(line, error)``.
+	Returns counts of rows read, imported and invalid plus elapsed seconds.
+	"""
+	stats = {'rows': 0, 'imported': 0, 'invalid': 0, 'seconds': 0.0}
+	start = time.perf_counter()
+	batch = {}
+	try:
+		for number, row in rows:
+			stats['rows'] += 1
+			try:
+				product = build_product(row, seller)
+			except ValidationError as exc:
+				stats['invalid'] += 1
+				if on_error:
+					on_error(number, exc)
+				continue
+			# A SKU repeated within one batch can't be upserted twice in one statement; last row wins
+			batch[product.sku] = product
+			if len(batch) >= batch_size:
+				stats['imported'] += write_batch(batch.values(), dry_run)
+				batch = {}
+				stats['seconds'] = time.perf_counter() - start
+				if on_batch:
+					on_batch(stats)
+		stats['imported'] += write_batch(batch.values(), dry_run)
+	finally:
+		# Committed batches stay committed even if a later one fails
+		if stats['imported'] and not dry_run:
+			rebuild_facets()
+			catalog_changed()
+		stats['seconds'] = time.perf_counter() - start
+	return stats
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Window
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .database import write_transaction
+from .inventory import reserve_stock
+from .models import CartItem, Order, OrderItem
+
+
+class EmptyCart(APIException):
+	status_code = status.HTTP_400_BAD_REQUEST
+	default_detail = {'error': 'Cart is empty'}
+	default_code = 'empty_cart'
+
+
+class CheckoutConflict(APIException):
+	status_code = status.HTTP_409_CONFLICT
+	default_detail = {'error': 'Cart changed during checkout, please try again'}
+	default_code = 'checkout_conflict'
+
+
+def checkout_cart(user, payment_method=Order.PAYMENT_COD, shipping_address=''):
+	"""
+	Turn ``user``'s cart into an order as a single atomic unit.
+
+	The query count does not depend on the number of cart lines: one read
+	of the lines (with the order total computed by the database), one
+	UPDATE reserving stock, one INSERT for the order, one bulk INSERT for
+	its items and one DELETE.
+	"""
+	# Reads the cart before writing; take the write lock up front
+	with write_transaction():
+		lines = list(
+			CartItem.objects.filter(cart__user=user)
+			.select_related('product')
+			.annotate(order_total=Window(
+				Sum(F('product__price') * F('quantity')),
+				output_field=DecimalField(max_digits=12, decimal_places=2),
+			))
+			.order_by('id')
+		)
+		if not lines:
+			raise EmptyCart()
+
+		# One conditional UPDATE; raises OutOfStock and rolls back if any line is short
+		reserve_stock({line.product_id: line.quantity for line in lines})
+
+		order = Order.objects.create(
+			user=user,
+			total_price=lines[0].order_total,
+			payment_method=payment_method,
+			shipping_address=shipping_address,
+		)
+		items = []
+		for line in lines:
+			item = OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+			item.capture(line.product)
+			items.append(item)
+		OrderItem.objects.bulk_create(items)
+
+		# A concurrent checkout of the same cart deletes the lines first;
+		# roll back rather than ordering them twice.
+		deleted, _ = CartItem.objects.filter(pk__in=[line.pk for line in lines]).delete()
+		if deleted != len(lines):
+			raise CheckoutConflict()
+
+	return order
+
+
+def backfill_order_snapshots(batch_size=1000, on_batch=None):
+	"""
+	Capture product snapshots for order lines created before checkout did.
+
+	Walks the lines in primary key order, one query for a batch of lines
+	with their products and one UPDATE per batch. Lines whose product was
+	deleted in the meantime have nothing to copy and are left as they are.
+	Returns ``(updated, skipped)``.
+	"""
+	pending = OrderItem.objects.filter(product_name='').order_by('pk')
+	updated = skipped = 0
+	last_pk = 0
+	while True:
+		batch = list(
+			pending.filter(pk__gt=last_pk)
+			.select_related('product')
+			.only('product', 'product__name', 'product__category', 'product__image', 'product__image_hash', 'product__image_width', 'product__seller')[:batch_size]
+		)
+		if not batch:
+			return updated, skipped
+		last_pk = batch[-1].pk
+		found = [item for item in batch if item.product is not None]
+		for item in found:
+			item.capture(item.product)
+		with transaction.atomic():
+			OrderItem.objects.bulk_update(found, OrderItem.SNAPSHOT_FIELDS)
+		updated += len(found)
+		skipped += len(batch) - len(found)
+		if on_batch:
+			on_batch(updated, skipped)
@@ -0,0 +1,204 @@
+"""
+Keyword-based subcategory classification.
+
+All keywords are compiled into one trie-shaped regular expression, so a
+product is matched in a single pass over its text instead of one substring
+scan per keyword. The rules are those of the original per-keyword loop: a
+keyword matches anywhere in the lowercased name or description, and when
+several match, the one listed first in the mappings wins.
+"""
+import re
+import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import catalog_changed
+from .facets import rebuild_facets
+from .models import Product
+
+
+# Keyword -> subcategory, in priority order
+SUBCATEGORY_MAPPINGS = {
+	# Electronics subcategories
+	'MacBook': 'laptops',
+	'Dell XPS': 'laptops',
+	'HP Spectre': 'laptops',
+	'Laptop': 'laptops',
+	'iPhone': 'smartphones',
+	'Samsung Galaxy': 'smartphones',
+	'Phone': 'smartphones',
+	'Headphones': 'headphones',
+	'Earbuds': 'headphones',
+	'AirPods': 'headphones',
+	'Watch': 'smart watches',
+	'Apple Watch': 'smart watches',
+
+	# Fashion subcategories
+	"Men's": "men's clothing",
+	"Men Shirt": "men's clothing",
+	"Men T-Shirt": "men's clothing",
+	"Women's": "women's clothing",
+	"Women Dress": "women's clothing",
+	'Dress': "women's clothing",
+	'Shoe': 'shoes',
+	'Sneaker': 'shoes',
+	'Boot': 'shoes',
+	'Bag': 'accessories',
+	'Belt': 'accessories',
+	'Sunglasses': 'accessories',
+
+	# Appliances subcategories
+	'Refrigerator': 'refrigerators',
+	'Fridge': 'refrigerators',
+	'Washing Machine': 'washing machines',
+	'Washer': 'washing machines',
+	'Microwave': 'microwaves',
+	'Oven': 'microwaves',
+	'Air Conditioner': 'air conditioners',
+	'AC ': 'air conditioners',
+
+	# Beauty subcategories
+	'Makeup': 'makeup',
+	'Lipstick': 'makeup',
+	'Foundation': 'makeup',
+	'Mascara': 'makeup',
+	'Skincare': 'skincare',
+	'Moisturizer': 'skincare',
+	'Serum': 'skincare',
+	'Face Cream': 'skincare',
+	'Shampoo': 'haircare',
+	'Conditioner': 'haircare',
+	'Hair': 'haircare',
+	'Perfume': 'fragrances',
+	'Cologne': 'fragrances',
+	'Fragrance': 'fragrances',
+}
+
+
+class KeywordClassifier:
+	"""Map text to the value of the highest-priority keyword it contains."""
+
+	def __init__(self, mappings):
+		self.values = {}
+		priority = {}
+		for keyword, value in mappings.items():
+			keyword = keyword.lower()
+			if keyword not in priority:
+				priority[keyword] = len(priority)
+				self.values[keyword] = value
+		# The pattern reports the longest keyword starting at each position;
+		# any shorter keyword matching there is a prefix of it, so rank each
+		# keyword by its best prefix.
+		self.best_prefix = {
+			keyword: min((other for other in priority if keyword.startswith(other)), key=priority.get)
+			for keyword in priority
+		}
+		self.rank = {keyword: priority[self.best_prefix[keyword]] for keyword in priority}
+		# Keywords folded into a trie so each position costs one branch per
+		# character, inside a lookahead so overlapping keywords
+		# ('air conditioner' / 'conditioner') are all seen.
+		self.pattern = re.compile('(?=(' + trie_pattern(priority) + '))')
+
+	def classify(self, *texts):
+		# Newline-joined so no keyword can match across two fields
+		text = '\n'.join(texts).lower()
+		best = None
+		for match in self.pattern.finditer(text):
+			keyword = match.group(1)
+			if best is None or self.rank[keyword] < self.rank[best]:
+				best = keyword
+				if self.rank[best] == 0:
+					break
+		return self.values[self.best_prefix[best]] if best is not None else None
+
+
+def trie_pattern(keywords):
+	"""Regex alternation of ``keywords`` structured as a trie, longest match first."""
+	trie = {}
+	for keyword in keywords:
+		node = trie
+		for char in keyword:
+			node = node.setdefault(char, {})
+		node[None] = True
+
+	def branch(node):
+		branches = [re.escape(char) + branch(child) for char, child in node.items() if char is not None]
+		if None in node:
+			if not branches:
+				return ''
+			# Try the longer keywords before stopping here
+			branches.append('')
+		if len(branches) == 1:
+			return branches[0]
+		return '(?:' + '|'.join(branches) + ')'
+
+	return branch(trie)
+
+
+subcategory_classifier = KeywordClassifier(SUBCATEGORY_MAPPINGS)
+
+
+def classify_subcategories(queryset=None, classifier=subcategory_classifier, batch_size=1000, dry_run=False, on_batch=None):
+	"""
+	Fill in the subcategory of products that have none.
+
+	Rows are read one batch at a time and each batch of matches is written
+	with at most one UPDATE per subcategory, so neither memory nor the
+	number of queries per row grows with the catalog. Returns scanned/updated counts, counts per
+	subcategory and elapsed seconds.
+	"""
+	if queryset is None:
+		queryset = Product.objects.all()
+	# Walk product_sub_created_idx in index order, one keyset batch at a time,
+	# rather than holding a cursor open: on SQLite a cursor doesn't reliably
+	# survive updates to the rows it is reading.
+	queryset = (
+		queryset.filter(subcategory='')
+		.only('id', 'name', 'description', 'subcategory', 'created_at')
+		.order_by('-created_at', 'pk')
+	)
+
+	stats = {'scanned': 0, 'updated': 0, 'subcategories': {}, 'seconds': 0.0}
+	start = time.perf_counter()
+	page = queryset
+	try:
+		while True:
+			batch = list(page[:batch_size])
+			if not batch:
+				break
+			last = batch[-1]
+			# The redundant created_at__lte turns the keyset condition into an index range
+			page = queryset.filter(created_at__lte=last.created_at).filter(
+				Q(created_at__lt=last.created_at) | Q(created_at=last.created_at, pk__gt=last.pk)
+			)
+			stats['scanned'] += len(batch)
+
+			matched = []
+			by_subcategory = {}
+			for product in batch:
+				subcategory = classifier.classify(product.name, product.description)
+				if subcategory:
+					product.subcategory = subcategory
+					matched.append(product)
+					by_subcategory.setdefault(subcategory, []).append(product.pk)
+					stats['subcategories'][subcategory] = stats['subcategories'].get(subcategory, 0) + 1
+			if matched and not dry_run:
+				# One UPDATE per subcategory; bulk_update's per-row CASE costs
+				# more to build than the whole classification.
+				now = timezone.now()
+				with transaction.atomic():
+					for subcategory, pks in by_subcategory.items():
+						Product.objects.filter(pk__in=pks).update(subcategory=subcategory, updated_at=now)
+			stats['updated'] += len(matched)
+			stats['seconds'] = time.perf_counter() - start
+			if on_batch:
+				on_batch(stats, matched)
+	finally:
+		# Queryset updates skip the Product signals
+		if stats['updated'] and not dry_run:
+			rebuild_facets()
+			catalog_changed()
+		stats['seconds'] = time.perf_counter() - start
+	return stats
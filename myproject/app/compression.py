@@ -0,0 +1,85 @@
+"""
+Negotiated response compression: brotli when the client accepts it and the
+brotli package is installed, gzip otherwise.
+
+Unlike django.middleware.gzip, bodies under COMPRESSION_MIN_SIZE bytes are
+sent as they are, since a small body costs more to compress than it saves,
+and so are content types outside COMPRESSIBLE_TYPES (generated images are
+already compressed). Only GET and HEAD responses are compressed: they
+carry the large product and order lists, and leaving writes alone keeps
+the tokens returned by login and registration out of compressed bodies,
+where they could leak through their compressed size (BREACH).
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+
+def accepted_encodings(header):
+	"""Content codings in an Accept-Encoding header with a non-zero q-value."""
+	accepted = set()
+	for part in header.split(','):
+		coding, _, params = part.strip().partition(';')
+		quality = 1.0
+		for param in params.split(';'):
+			name, _, value = param.strip().partition('=')
+			if name == 'q':
+				try:
+					quality = float(value)
+				except ValueError:
+					quality = 0.0
+		if coding and quality > 0:
+			accepted.add(coding.strip().lower())
+	return accepted
+
+
+def negotiate(header):
+	accepted = accepted_encodings(header)
+	if brotli is not None and ('br' in accepted or '*' in accepted):
+		return 'br'
+	if 'gzip' in accepted or '*' in accepted:
+		return 'gzip'
+	return None
+
+
+def compress(content, encoding):
+	if encoding == 'br':
+		return brotli.compress(content, quality=settings.BROTLI_QUALITY)
+	# A random-length gzip header, as in GZipMiddleware, masks the body's size
+	return compress_string(content, max_random_bytes=100)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+
+	def process_response(self, request, response):
+		if (
+			request.method not in ('GET', 'HEAD')
+			or response.streaming
+			or response.has_header('Content-Encoding')
+			or response.get('Content-Type', '').split(';')[0].strip() not in settings.COMPRESSIBLE_TYPES
+		):
+			return response
+		patch_vary_headers(response, ('Accept-Encoding',))
+		if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+			return response
+
+		encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+		if encoding is None:
+			return response
+		compressed = compress(response.content, encoding)
+		if len(compressed) >= len(response.content):
+			return response
+		response.content = compressed
+		response.headers['Content-Length'] = str(len(compressed))
+		response.headers['Content-Encoding'] = encoding
+		# The body differs from the identity encoding's, so a strong ETag becomes weak
+		etag = response.get('ETag')
+		if etag and etag.startswith('"'):
+			response.headers['ETag'] = 'W/' + etag
+		return response
@@ -0,0 +1,66 @@
+"""
+Conditional GET (ETag / Last-Modified) support for API views.
+
+Validators are computed from ``updated_at`` aggregates and row counts, so a
+304 costs one small query (or a cache lookup) and never serializes the body.
+"""
+import hashlib
+from calendar import timegm
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class NotModified(Exception):
+	pass
+
+
+def make_etag(*parts):
+	return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def latest(*timestamps):
+	timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+	return max(timestamps) if timestamps else None
+
+
+class ConditionalGetMixin:
+	"""
+	Answer GET requests carrying If-None-Match / If-Modified-Since with 304.
+
+	Subclasses implement ``get_validators()`` returning ``(etag, last_modified)``
+	where either may be None. The check runs after authentication and
+	permissions, so validators may depend on ``request.user``.
+	"""
+	validators = (None, None)
+
+	def get_validators(self, request, *args, **kwargs):
+		return None, None
+
+	def initial(self, request, *args, **kwargs):
+		super().initial(request, *args, **kwargs)
+		if request.method not in ('GET', 'HEAD'):
+			return
+		self.validators = self.get_validators(request, *args, **kwargs)
+		etag, last_modified = self.validators
+		if etag is None and last_modified is None:
+			return
+		timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+		if get_conditional_response(request, etag=etag, last_modified=timestamp) is not None:
+			raise NotModified()
+
+	def handle_exception(self, exc):
+		if isinstance(exc, NotModified):
+			return HttpResponseNotModified()
+		return super().handle_exception(exc)
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		etag, last_modified = self.validators
+		if response.status_code in (200, 304):
+			if etag and not response.has_header('ETag'):
+				response['ETag'] = etag
+			if last_modified and not response.has_header('Last-Modified'):
+				response['Last-Modified'] = http_date(last_modified.timestamp())
+		return response
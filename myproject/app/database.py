@@ -0,0 +1,203 @@
+"""
+SQLite connection tuning and primary/replica routing.
+
+configure_connection() runs on every new connection and applies
+SQLITE_PRAGMAS (WAL, synchronous=NORMAL, mmap, busy timeout, ...), which
+the production profile in settings.py turns on.
+
+With a REPLICA_DATABASE, PrimaryReplicaRouter sends reads of the
+REPLICA_MODELS made while handling a request there; every write, and every
+other read, goes to 'default', as do all reads of requests with unsafe
+methods. Once a request is about to write, the rest of it reads from the
+primary too, and if it did write, ReplicaPinningMiddleware keeps the
+client on the primary for REPLICA_PIN_SECONDS, so it sees its own writes
+while the replica catches up. Clients are pinned in the shared cache by API
+token (or session), since the frontend sends its token in a header and no
+cookies; a cookie covers anonymous clients. Other clients can read
+slightly stale catalog data until then, and the catalog cache keeps what
+they read until the next product change, so keep replication lag well
+under a second. Responses stored in the catalog cache are always read from
+the primary (see use_primary()), so a lagging replica can't put stale
+prices into the cache under a newer catalog version.
+Management commands and shells always use the primary.
+
+write_transaction() is atomic() for transactions that read before they
+write, such as checkout: on SQLite it begins with BEGIN IMMEDIATE.
+"""
+import hashlib
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+PIN_COOKIE = 'db_pin'
+PIN_CACHE_PREFIX = 'db_pin:'
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE', 'REPLAC'}
+
+# Routing state of the request being handled, for the router
+current = ContextVar('database_routing', default=None)
+
+
+class RoutingState:
+	# Mutated, never replaced, so writes made in sync_to_async threads are seen
+	__slots__ = ('pinned', 'wrote')
+
+	def __init__(self, pinned=False):
+		self.pinned = pinned
+		self.wrote = False
+
+
+def use_primary():
+	"""Read from the primary for the rest of the request, e.g. to fill a shared cache."""
+	state = current.get()
+	if state is not None:
+		state.pinned = True
+
+
+def track_writes(execute, sql, params, many, context):
+	"""Execute wrapper on the primary, noting requests that change data."""
+	state = current.get()
+	if state is not None and not state.wrote and sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+		state.wrote = True
+	return execute(sql, params, many, context)
+
+
+def configure_connection(sender, connection, **kwargs):
+	"""
+	connection_created receiver: applies SQLITE_PRAGMAS, opens replicas
+	read-only and watches the primary for writes.
+	"""
+	if connection.alias == DEFAULT_DB_ALIAS and track_writes not in connection.execute_wrappers:
+		connection.execute_wrappers.append(track_writes)
+	if connection.vendor != 'sqlite':
+		return
+	with connection.cursor() as cursor:
+		for name, value in settings.SQLITE_PRAGMAS.items():
+			cursor.execute(f'PRAGMA {name} = {value}')
+		if connection.alias == settings.REPLICA_DATABASE:
+			cursor.execute('PRAGMA query_only = ON')
+
+
+class WriteTransaction(transaction.Atomic):
+	def __enter__(self):
+		connection = transaction.get_connection(self.using)
+		if connection.vendor != 'sqlite' or connection.in_atomic_block:
+			return super().__enter__()
+		# Connecting resets transaction_mode from OPTIONS, so connect first
+		connection.ensure_connection()
+		mode = connection.transaction_mode
+		connection.transaction_mode = 'IMMEDIATE'
+		try:
+			return super().__enter__()
+		finally:
+			connection.transaction_mode = mode
+
+
+def write_transaction(using=None):
+	"""
+	atomic() that takes SQLite's write lock when it begins, waiting for it
+	(busy_timeout) rather than failing with "database is locked" when the
+	transaction upgrades from a read. Inside another atomic block it is a
+	plain savepoint. Other atomic() blocks keep BEGIN DEFERRED, so read-only
+	ones don't serialize behind writers.
+	"""
+	return WriteTransaction(using, savepoint=True, durable=False)
+
+
+class PrimaryReplicaRouter:
+	def db_for_read(self, model, **hints):
+		if not settings.REPLICA_DATABASE or model._meta.label not in settings.REPLICA_MODELS:
+			return None
+		state = current.get()
+		if state is None or state.pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+			return DEFAULT_DB_ALIAS
+		return settings.REPLICA_DATABASE
+
+	def db_for_write(self, model, **hints):
+		# Also asked before reads that may lead to a write, e.g. by get_or_create()
+		state = current.get()
+		if state is not None:
+			state.pinned = True
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		# The replica holds the same rows as the primary
+		if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE}:
+			return True
+		return None
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		# The replica gets its schema through replication
+		return False if db == settings.REPLICA_DATABASE else None
+
+
+def pin_key(request):
+	"""Cache key pinning the client behind ``request``: its API token, else its session."""
+	scheme, _, credential = request.headers.get('Authorization', '').partition(' ')
+	identity = credential.strip() if scheme.lower() == 'token' else ''
+	identity = identity or request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+	if not identity:
+		return None
+	# Hashed so tokens never appear in cache keys
+	return PIN_CACHE_PREFIX + hashlib.sha256(identity.encode()).hexdigest()
+
+
+class ReplicaPinningMiddleware:
+	"""Track whether each request wrote, and keep clients that did on the primary for a while."""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+		state = self.start(request)
+		key = pin_key(request) if settings.REPLICA_DATABASE else None
+		if key and not state.pinned:
+			state.pinned = cache.get(key) is not None
+		token = current.set(state)
+		try:
+			response = self.get_response(request)
+		finally:
+			current.reset(token)
+		if key and state.wrote:
+			cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+		return self.finish(response, state)
+
+	async def __acall__(self, request):
+		state = self.start(request)
+		key = pin_key(request) if settings.REPLICA_DATABASE else None
+		if key and not state.pinned:
+			state.pinned = await cache.aget(key) is not None
+		token = current.set(state)
+		try:
+			response = await self.get_response(request)
+		finally:
+			current.reset(token)
+		if key and state.wrote:
+			await cache.aset(key, True, settings.REPLICA_PIN_SECONDS)
+		return self.finish(response, state)
+
+	def start(self, request):
+		# Writes often read the row they change first; never from a stale copy
+		if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+			return RoutingState(pinned=True)
+		try:
+			pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+		except ValueError:
+			pinned_until = 0
+		return RoutingState(pinned=pinned_until > time.time())
+
+	def finish(self, response, state):
+		if state.wrote and settings.REPLICA_DATABASE:
+			pin_seconds = settings.REPLICA_PIN_SECONDS
+			response.set_cookie(PIN_COOKIE, str(time.time() + pin_seconds), max_age=pin_seconds, httponly=True, samesite='Lax')
+		return response
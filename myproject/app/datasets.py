@@ -0,0 +1,313 @@
+"""
+Synthetic datasets at production scale.
+
+``generate_dataset`` fills the database with sellers, users, products,
+carts and orders. Products are variations on the sample catalog below, so
+categories and subcategories keep its distribution. Which products are
+ordered or carted, which sellers list them and which users order follow
+Zipf distributions, as they do in a real shop: a few products take most
+order lines. Every row derives from one seed, so the same arguments always
+produce the same data.
+"""
+import itertools
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import catalog_changed
+from .checkout import backfill_order_snapshots
+from .facets import rebuild_facets
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+
+# Sample catalog, organized by category and subcategory; also the templates
+# for generated products
+PRODUCTS = [
+	# Electronics - Smartphones
+	{'name': 'OnePlus 12', 'description': 'Flagship killer with Snapdragon 8 Gen 3', 'price': 64999, 'category': 'electronics', 'subcategory': 'smartphones', 'stock': 30, 'image': 'https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?w=400'},
+	{'name': 'Google Pixel 8', 'description': 'AI-powered smartphone with best camera', 'price': 75999, 'category': 'electronics', 'subcategory': 'smartphones', 'stock': 25, 'image': 'https://images.unsplash.com/photo-1598327105666-5b89351aff97?w=400'},
+
+	# Electronics - Laptops
+	{'name': 'Lenovo ThinkPad X1', 'description': 'Business ultrabook with Intel Core i7', 'price': 149000, 'category': 'electronics', 'subcategory': 'laptops', 'stock': 12, 'image': 'https://images.unsplash.com/photo-1588872657578-7efd1f1555ed?w=400'},
+	{'name': 'ASUS ROG Zephyrus', 'description': 'Gaming laptop with RTX 4080', 'price': 189000, 'category': 'electronics', 'subcategory': 'laptops', 'stock': 8, 'image': 'https://images.unsplash.com/photo-1603302576837-37561b2e2302?w=400'},
+
+	# Electronics - Headphones
+	{'name': 'Sony WH-1000XM5', 'description': 'Industry-leading noise cancellation', 'price': 29990, 'category': 'electronics', 'subcategory': 'headphones', 'stock': 40, 'image': 'https://images.unsplash.com/photo-1546435770-a3e426bf472b?w=400'},
+	{'name': 'Apple AirPods Pro 2', 'description': 'Active noise cancellation earbuds', 'price': 24900, 'category': 'electronics', 'subcategory': 'headphones', 'stock': 50, 'image': 'https://images.unsplash.com/photo-1606220588913-b3aacb4d2f46?w=400'},
+	{'name': 'Bose QuietComfort Ultra', 'description': 'Premium over-ear headphones', 'price': 34990, 'category': 'electronics', 'subcategory': 'headphones', 'stock': 25, 'image': 'https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=400'},
+	{'name': 'JBL Tune 770NC', 'description': 'Wireless noise-cancelling headphones', 'price': 7999, 'category': 'electronics', 'subcategory': 'headphones', 'stock': 60, 'image': 'https://images.unsplash.com/photo-1484704849700-f032a568e944?w=400'},
+
+	# Electronics - Smart Watches
+	{'name': 'Apple Watch Series 9', 'description': 'Advanced health monitoring', 'price': 41900, 'category': 'electronics', 'subcategory': 'smart watches', 'stock': 35, 'image': 'https://images.unsplash.com/photo-1434493789847-2f02dc6ca35d?w=400'},
+	{'name': 'Samsung Galaxy Watch 6', 'description': 'Wear OS smartwatch', 'price': 28999, 'category': 'electronics', 'subcategory': 'smart watches', 'stock': 30, 'image': 'https://images.unsplash.com/photo-1523275335684-37898b6baf30?w=400'},
+	{'name': 'Garmin Fenix 7', 'description': 'Premium GPS sports watch', 'price': 59990, 'category': 'electronics', 'subcategory': 'smart watches', 'stock': 15, 'image': 'https://images.unsplash.com/photo-1508685096489-7aacd43bd3b1?w=400'},
+
+	# Fashion - Men's Clothing
+	{'name': 'Allen Solly Formal Shirt', 'description': 'Cotton formal shirt for men', 'price': 1499, 'category': 'fashion', 'subcategory': "men's clothing", 'stock': 100, 'image': 'https://images.unsplash.com/photo-1596755094514-f87e34085b2c?w=400'},
+	{'name': 'Peter England Blazer', 'description': 'Slim fit blazer for men', 'price': 4999, 'category': 'fashion', 'subcategory': "men's clothing", 'stock': 40, 'image': 'https://images.unsplash.com/photo-1507679799987-c73779587ccf?w=400'},
+	{'name': 'US Polo T-Shirt', 'description': 'Casual cotton polo t-shirt', 'price': 999, 'category': 'fashion', 'subcategory': "men's clothing", 'stock': 150, 'image': 'https://images.unsplash.com/photo-1521572163474-6864f9cf17ab?w=400'},
+
+	# Fashion - Women's Clothing
+	{'name': 'Zara Summer Dress', 'description': 'Floral print maxi dress', 'price': 2999, 'category': 'fashion', 'subcategory': "women's clothing", 'stock': 60, 'image': 'https://images.unsplash.com/photo-1572804013309-59a88b7e92f1?w=400'},
+	{'name': 'H&M Denim Jacket', 'description': 'Classic denim jacket for women', 'price': 2499, 'category': 'fashion', 'subcategory': "women's clothing", 'stock': 45, 'image': 'https://images.unsplash.com/photo-1551028719-00167b16eac5?w=400'},
+	{'name': 'Forever 21 Crop Top', 'description': 'Trendy casual crop top', 'price': 799, 'category': 'fashion', 'subcategory': "women's clothing", 'stock': 80, 'image': 'https://images.unsplash.com/photo-1434389677669-e08b4cac3105?w=400'},
+
+	# Fashion - Shoes
+	{'name': 'Puma Running Shoes', 'description': 'Lightweight running shoes', 'price': 5499, 'category': 'fashion', 'subcategory': 'shoes', 'stock': 70, 'image': 'https://images.unsplash.com/photo-1542291026-7eec264c27ff?w=400'},
+	{'name': 'Clarks Formal Shoes', 'description': 'Premium leather formal shoes', 'price': 6999, 'category': 'fashion', 'subcategory': 'shoes', 'stock': 35, 'image': 'https://images.unsplash.com/photo-1449505278894-297fdb3edbc1?w=400'},
+	{'name': 'Adidas Superstar', 'description': 'Classic white sneakers', 'price': 7999, 'category': 'fashion', 'subcategory': 'shoes', 'stock': 55, 'image': 'https://images.unsplash.com/photo-1525966222134-fcfa99b8ae77?w=400'},
+
+	# Fashion - Accessories
+	{'name': 'Tommy Hilfiger Belt', 'description': 'Genuine leather belt', 'price': 2499, 'category': 'fashion', 'subcategory': 'accessories', 'stock': 90, 'image': 'https://images.unsplash.com/photo-1553062407-98eeb64c6a62?w=400'},
+	{'name': 'Ray-Ban Aviator', 'description': 'Classic aviator sunglasses', 'price': 8999, 'category': 'fashion', 'subcategory': 'accessories', 'stock': 50, 'image': 'https://images.unsplash.com/photo-1511499767150-a48a237f0083?w=400'},
+	{'name': 'Fossil Leather Wallet', 'description': 'Premium bi-fold wallet', 'price': 2999, 'category': 'fashion', 'subcategory': 'accessories', 'stock': 75, 'image': 'https://images.unsplash.com/photo-1627123424574-724758594e93?w=400'},
+
+	# Appliances - Refrigerators
+	{'name': 'LG 260L Double Door', 'description': 'Frost-free refrigerator', 'price': 28990, 'category': 'appliances', 'subcategory': 'refrigerators', 'stock': 15, 'image': 'https://images.unsplash.com/photo-1571175443880-49e1d25b2bc5?w=400'},
+	{'name': 'Whirlpool 190L Single Door', 'description': 'Direct cool refrigerator', 'price': 14990, 'category': 'appliances', 'subcategory': 'refrigerators', 'stock': 20, 'image': 'https://images.unsplash.com/photo-1584568694244-14fbdf83bd30?w=400'},
+
+	# Appliances - Washing Machines
+	{'name': 'Samsung 7kg Front Load', 'description': 'Eco bubble technology', 'price': 29990, 'category': 'appliances', 'subcategory': 'washing machines', 'stock': 18, 'image': 'https://images.unsplash.com/photo-1626806787461-102c1bb42a3b?w=400'},
+	{'name': 'IFB 6.5kg Top Load', 'description': 'Fully automatic washing machine', 'price': 18990, 'category': 'appliances', 'subcategory': 'washing machines', 'stock': 22, 'image': 'https://images.unsplash.com/photo-1610557892470-55d9e80c0bce?w=400'},
+
+	# Appliances - Microwaves
+	{'name': 'LG 28L Convection', 'description': 'Microwave with convection', 'price': 13990, 'category': 'appliances', 'subcategory': 'microwaves', 'stock': 30, 'image': 'https://images.unsplash.com/photo-1574269909862-7e1d70bb8078?w=400'},
+	{'name': 'Samsung 23L Solo', 'description': 'Solo microwave oven', 'price': 7990, 'category': 'appliances', 'subcategory': 'microwaves', 'stock': 40, 'image': 'https://images.unsplash.com/photo-1585659722983-3a675dabf23d?w=400'},
+	{'name': 'IFB 30L Convection', 'description': 'Rotisserie microwave', 'price': 16990, 'category': 'appliances', 'subcategory': 'microwaves', 'stock': 25, 'image': 'https://images.unsplash.com/photo-1574269909862-7e1d70bb8078?w=400'},
+
+	# Appliances - Air Conditioners
+	{'name': 'Daikin 1.5 Ton Split AC', 'description': '5-star inverter AC', 'price': 45990, 'category': 'appliances', 'subcategory': 'air conditioners', 'stock': 12, 'image': 'https://images.unsplash.com/photo-1631567091196-08d50e8c4e22?w=400'},
+	{'name': 'Voltas 1 Ton Window AC', 'description': '3-star window AC', 'price': 26990, 'category': 'appliances', 'subcategory': 'air conditioners', 'stock': 18, 'image': 'https://images.unsplash.com/photo-1631567091196-08d50e8c4e22?w=400'},
+	{'name': 'Blue Star 1.5 Ton', 'description': 'Inverter split AC', 'price': 42990, 'category': 'appliances', 'subcategory': 'air conditioners', 'stock': 10, 'image': 'https://images.unsplash.com/photo-1585338107529-13afc5f02586?w=400'},
+
+	# Beauty - Makeup
+	{'name': 'MAC Ruby Woo Lipstick', 'description': 'Iconic red matte lipstick', 'price': 1950, 'category': 'beauty', 'subcategory': 'makeup', 'stock': 100, 'image': 'https://images.unsplash.com/photo-1586495777744-4413f21062fa?w=400'},
+	{'name': 'Maybelline Fit Me Foundation', 'description': 'Matte + poreless foundation', 'price': 499, 'category': 'beauty', 'subcategory': 'makeup', 'stock': 80, 'image': 'https://images.unsplash.com/photo-1631214524020-7e18db7f7e5c?w=400'},
+	{'name': 'NYX Eye Shadow Palette', 'description': '16 shade eye shadow palette', 'price': 1299, 'category': 'beauty', 'subcategory': 'makeup', 'stock': 60, 'image': 'https://images.unsplash.com/photo-1512496015851-a90fb38ba796?w=400'},
+
+	# Beauty - Skincare
+	{'name': 'The Ordinary Niacinamide', 'description': 'Niacinamide 10% + Zinc serum', 'price': 599, 'category': 'beauty', 'subcategory': 'skincare', 'stock': 150, 'image': 'https://images.unsplash.com/photo-1620916566398-39f1143ab7be?w=400'},
+	{'name': 'Cetaphil Moisturizer', 'description': 'Daily hydrating lotion', 'price': 899, 'category': 'beauty', 'subcategory': 'skincare', 'stock': 120, 'image': 'https://images.unsplash.com/photo-1556228578-0d85b1a4d571?w=400'},
+	{'name': 'Neutrogena Sunscreen SPF50', 'description': 'Ultra sheer dry-touch', 'price': 599, 'category': 'beauty', 'subcategory': 'skincare', 'stock': 100, 'image': 'https://images.unsplash.com/photo-1556228720-195a672e8a03?w=400'},
+
+	# Beauty - Haircare
+	{'name': 'LOreal Paris Shampoo', 'description': 'Total repair 5 shampoo', 'price': 399, 'category': 'beauty', 'subcategory': 'haircare', 'stock': 200, 'image': 'https://images.unsplash.com/photo-1526947425960-945c6e72858f?w=400'},
+	{'name': 'Tresemme Conditioner', 'description': 'Keratin smooth conditioner', 'price': 349, 'category': 'beauty', 'subcategory': 'haircare', 'stock': 180, 'image': 'https://images.unsplash.com/photo-1535585209827-a15fcdbc4c2d?w=400'},
+	{'name': 'Moroccanoil Hair Oil', 'description': 'Argan oil treatment', 'price': 2999, 'category': 'beauty', 'subcategory': 'haircare', 'stock': 50, 'image': 'https://images.unsplash.com/photo-1608248597279-f99d160bfcbc?w=400'},
+
+	# Beauty - Fragrances
+	{'name': 'Dior Sauvage', 'description': 'Fresh and bold fragrance for men', 'price': 8500, 'category': 'beauty', 'subcategory': 'fragrances', 'stock': 40, 'image': 'https://images.unsplash.com/photo-1594035910387-fea47794261f?w=400'},
+	{'name': 'Chanel No. 5', 'description': 'Classic floral fragrance for women', 'price': 12500, 'category': 'beauty', 'subcategory': 'fragrances', 'stock': 30, 'image': 'https://images.unsplash.com/photo-1541643600914-78b084683601?w=400'},
+	{'name': 'Park Avenue Signature', 'description': 'Everyday cologne for men', 'price': 499, 'category': 'beauty', 'subcategory': 'fragrances', 'stock': 100, 'image': 'https://images.unsplash.com/photo-1523293182086-7651a899d37f?w=400'},
+]
+
+
+VARIANTS = ['Black', 'White', 'Blue', 'Red', 'Silver', 'Grey', 'Green', 'Rose Gold', 'Navy', 'Beige']
+EDITIONS = ['', 'Pro', 'Lite', 'Plus', 'Max', 'Classic', 'Limited Edition', '2024', '2025']
+# Weights of the number of lines in an order or a cart
+LINE_COUNTS = {1: 50, 2: 25, 3: 12, 4: 8, 5: 5}
+QUANTITIES = {1: 85, 2: 10, 3: 5}
+ORDER_STATUSES = {Order.STATUS_COMPLETED: 80, Order.STATUS_PENDING: 12, Order.STATUS_CANCELLED: 8}
+PAYMENT_METHODS = {Order.PAYMENT_UPI: 40, Order.PAYMENT_COD: 30, Order.PAYMENT_CARD: 25, Order.PAYMENT_EMI: 5}
+# Fixed so timestamps are as reproducible as everything else
+DEFAULT_UNTIL = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+# Users and sellers are less skewed than products
+USER_SKEW = 0.6
+SELLER_SKEW = 1.0
+
+
+class ZipfSampler:
+	"""
+	Draw indices ``0..n-1`` with probability proportional to 1 / rank ** exponent.
+
+	Ranks are shuffled over the indices, so the most popular items are
+	spread across the table rather than being the first rows inserted.
+	"""
+
+	def __init__(self, n, exponent, rng):
+		self.rng = rng
+		self.ranked = list(range(n))
+		rng.shuffle(self.ranked)
+		self.cum_weights = list(itertools.accumulate(rank ** -exponent for rank in range(1, n + 1)))
+
+	def sample(self, k):
+		return self.rng.choices(self.ranked, cum_weights=self.cum_weights, k=k)
+
+
+def weighted(rng, weights, k):
+	return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+	"""Let bulk_create keep the auto_now/auto_now_add values it is given."""
+	fields = [
+		field for model in models for field in model._meta.concrete_fields
+		if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+	]
+	saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+	for field in fields:
+		field.auto_now = field.auto_now_add = False
+	try:
+		yield
+	finally:
+		for field, auto_now, auto_now_add in saved:
+			field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def spread(rng, count, start, span):
+	"""``count`` ascending datetimes spread over ``span`` from ``start``."""
+	step = span / max(count, 1)
+	for i in range(count):
+		yield start + step * (i + rng.random())
+
+
+def batched(iterable, size):
+	iterator = iter(iterable)
+	while batch := list(itertools.islice(iterator, size)):
+		yield batch
+
+
+def insert(model, objects, batch_size, on_batch=None, total=None):
+	"""bulk_create ``objects`` a batch per transaction and return the new primary keys."""
+	pks = array('q')
+	for batch in batched(objects, batch_size):
+		with transaction.atomic():
+			model.objects.bulk_create(batch)
+		pks.extend(obj.pk for obj in batch)
+		if on_batch:
+			on_batch(model._meta.verbose_name_plural, len(pks), total)
+	return pks
+
+
+def generate_dataset(
+	products=10_000, users=1_000, orders=10_000, carts=None, sellers=20,
+	seed=0, skew=1.0, days=365, until=DEFAULT_UNTIL, prefix='dataset',
+	batch_size=5000, on_batch=None,
+):
+	"""
+	Insert a synthetic dataset with batched bulk_create.
+
+	``carts`` defaults to one user in five and ``skew`` is the Zipf exponent
+	of product popularity. Usernames and SKUs start with ``prefix``.
+	``on_batch(table, done, total)`` is called after every batch. Returns
+	rows inserted per table and elapsed seconds.
+	"""
+	start = time.perf_counter()
+	rng = random.Random(seed)
+	since = until - timedelta(days=days)
+	carts = users // 5 if carts is None else min(carts, users)
+	# One hash shared by every generated account; hashing per user would dominate
+	password = make_password(f'{prefix}-password')
+
+	def accounts(kind, count, is_staff=False):
+		for i, joined in enumerate(spread(rng, count, since, until - since)):
+			name = f'{prefix}-{kind}-{i}'
+			yield User(username=name, email=f'{name}@example.com', password=password, is_staff=is_staff, date_joined=joined)
+
+	seller_ids = insert(User, accounts('seller', sellers, is_staff=True), batch_size, on_batch, sellers)
+	user_ids = insert(User, accounts('user', users), batch_size, on_batch, users)
+
+	# Prices in paise, in step with product_ids
+	prices = array('q')
+	listed_by = ZipfSampler(len(seller_ids), SELLER_SKEW, rng)
+
+	def catalog():
+		for i, created_at in enumerate(spread(rng, products, since, until - since)):
+			template = rng.choice(PRODUCTS)
+			edition = rng.choice(EDITIONS)
+			variant = rng.choice(VARIANTS)
+			price = max(99, round(template['price'] * rng.lognormvariate(0, 0.25)))
+			prices.append(price * 100)
+			yield Product(
+				seller_id=seller_ids[listed_by.sample(1)[0]] if seller_ids else None,
+				sku=f'{prefix}-{i:08d}',
+				name=' '.join(filter(None, [template['name'], edition, f'({variant})'])),
+				description=f"{template['description']}. {variant} finish.",
+				price=Decimal(price),
+				category=template['category'],
+				subcategory=template['subcategory'],
+				# About one listing in ten is out of stock
+				stock=0 if rng.random() < 0.1 else rng.randint(1, 500),
+				image=template['image'],
+				created_at=created_at,
+				updated_at=created_at,
+			)
+
+	popular = None
+
+	def lines(count):
+		# Distinct products, mostly popular ones
+		chosen = list(dict.fromkeys(popular.sample(count)))
+		quantities = weighted(rng, QUANTITIES, len(chosen))
+		return [(product_ids[index], prices[index], quantity) for index, quantity in zip(chosen, quantities)]
+
+	def cart_items(cart_ids):
+		for cart_id, line_count in zip(cart_ids, weighted(rng, LINE_COUNTS, len(cart_ids))):
+			for product_id, price, quantity in lines(line_count):
+				yield CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+
+	stats = {'sellers': len(seller_ids), 'users': len(user_ids), 'products': 0, 'carts': 0, 'cart_items': 0, 'orders': 0, 'order_items': 0}
+	try:
+		with explicit_timestamps(Product, Order):
+			product_ids = insert(Product, catalog(), batch_size, on_batch, products)
+			stats['products'] = len(product_ids)
+			if not product_ids or not user_ids:
+				return stats
+			popular = ZipfSampler(len(product_ids), skew, rng)
+
+			carted = sorted(rng.sample(range(len(user_ids)), carts))
+			cart_ids = insert(Cart, (Cart(user_id=user_ids[index]) for index in carted), batch_size, on_batch, carts)
+			stats['carts'] = len(cart_ids)
+			stats['cart_items'] = len(insert(CartItem, cart_items(cart_ids), batch_size, on_batch))
+
+			buyers = ZipfSampler(len(user_ids), USER_SKEW, rng)
+			for created in batched(spread(rng, orders, since, until - since), batch_size):
+				count = len(created)
+				order_lines = [lines(line_count) for line_count in weighted(rng, LINE_COUNTS, count)]
+				batch = [
+					Order(
+						user_id=user_ids[buyer],
+						total_price=Decimal(sum(price * quantity for _, price, quantity in items)) / 100,
+						status=status,
+						payment_method=payment_method,
+						shipping_address=f'{rng.randint(1, 999)} Market Road',
+						created_at=created_at,
+						updated_at=created_at,
+					)
+					for buyer, status, payment_method, created_at, items in zip(
+						buyers.sample(count),
+						weighted(rng, ORDER_STATUSES, count),
+						weighted(rng, PAYMENT_METHODS, count),
+						created,
+						order_lines,
+					)
+				]
+				# An order and its lines commit together
+				with transaction.atomic():
+					Order.objects.bulk_create(batch)
+					items = OrderItem.objects.bulk_create([
+						OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity, price=Decimal(price) / 100)
+						for order, order_items in zip(batch, order_lines)
+						for product_id, price, quantity in order_items
+					], batch_size=batch_size)
+				stats['orders'] += len(batch)
+				stats['order_items'] += len(items)
+				if on_batch:
+					on_batch('orders', stats['orders'], orders)
+			# Checkout snapshots the products; copy them in one pass over the new lines
+			backfill_order_snapshots(batch_size)
+	finally:
+		# bulk_create skips the Product signals
+		if stats['products']:
+			rebuild_facets()
+			catalog_changed()
+		stats['seconds'] = time.perf_counter() - start
+	return stats
@@ -0,0 +1,145 @@
+"""
+Facet counts for the catalog filters.
+
+ProductFacet holds one row per (category, subcategory, price band) with
+the number of products in it. Product signals keep it current one row at a
+time; bulk writers that bypass signals call ``rebuild_facets()``.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .filters import canonical_choice, filter_products, parse_price
+from .models import Product, ProductFacet
+
+
+def adjust_facet(key, delta):
+	category, subcategory, price_band = key
+	facets = ProductFacet.objects.filter(category=category, subcategory=subcategory, price_band=price_band)
+	if facets.update(count=F('count') + delta) or delta < 0:
+		return
+	try:
+		with transaction.atomic():
+			ProductFacet.objects.create(category=category, subcategory=subcategory, price_band=price_band, count=delta)
+	except IntegrityError:
+		# Created concurrently
+		facets.update(count=F('count') + delta)
+
+
+def price_band_expression():
+	whens = [
+		When(price__lt=upper, then=Value(index))
+		for index, (lower, upper, label) in enumerate(Product.PRICE_BANDS)
+		if upper is not None
+	]
+	return Case(*whens, default=Value(len(Product.PRICE_BANDS) - 1), output_field=IntegerField())
+
+
+def grouped_counts(queryset):
+	"""(category, subcategory, price_band, count) rows for ``queryset``."""
+	return (
+		queryset.order_by()
+		.annotate(price_band=price_band_expression())
+		.values_list('category', 'subcategory', 'price_band')
+		.annotate(count=Count('id'))
+	)
+
+
+def rebuild_facets():
+	"""Recount every facet from scratch with a single GROUP BY."""
+	with transaction.atomic():
+		rows = list(grouped_counts(Product.objects.all()))
+		ProductFacet.objects.all().delete()
+		ProductFacet.objects.bulk_create([
+			ProductFacet(category=category, subcategory=subcategory, price_band=price_band, count=count)
+			for category, subcategory, price_band, count in rows
+		])
+
+
+def bands_in_range(min_price, max_price):
+	"""
+	Band indexes inside [min_price, max_price], or None if the range splits
+	a band, in which case the precomputed counts can't answer it.
+	"""
+	# Prices have two decimal places, so price <= max is price < max + 0.01
+	upper_bound = max_price + Decimal('0.01') if max_price is not None else None
+	selected = []
+	for index, (lower, upper, label) in enumerate(Product.PRICE_BANDS):
+		above_min = min_price is None or lower >= min_price
+		below_max = upper_bound is None or (upper is not None and upper <= upper_bound)
+		below_min = min_price is not None and upper is not None and upper <= min_price
+		above_max = max_price is not None and lower > max_price
+		if above_min and below_max:
+			selected.append(index)
+		elif not (below_min or above_max):
+			return None
+	return selected
+
+
+def facet_counts(params, search_queryset=None):
+	"""
+	Count products per category, subcategory and price band under the
+	active filters in ``params``.
+
+	Filter-only requests are answered from ProductFacet in one query.
+	``search_queryset`` (the products matching ?search=) forces a GROUP BY
+	over the matches instead, as does a price range that splits a band.
+	"""
+	return summarize(facet_rows(params, search_queryset))
+
+
+async def afacet_counts(params, search_queryset=None):
+	# Not aiterator(): for values_list() it starts the query on the event
+	# loop (SynchronousOnlyOperation), while async for fetches in a thread.
+	return summarize([row async for row in facet_rows(params, search_queryset)])
+
+
+def facet_rows(params, search_queryset=None):
+	"""(category, subcategory, price_band, count) rows for facet_counts()."""
+	bands = bands_in_range(parse_price(params, 'min_price'), parse_price(params, 'max_price'))
+	if search_queryset is not None or bands is None:
+		queryset = search_queryset if search_queryset is not None else Product.objects.all()
+		rows = grouped_counts(filter_products(queryset, params))
+	else:
+		facets = ProductFacet.objects.filter(count__gt=0, price_band__in=bands)
+		if params.get('category'):
+			facets = facets.filter(category=canonical_choice(params['category']))
+		if params.get('subcategory'):
+			facets = facets.filter(subcategory=canonical_choice(params['subcategory']))
+		rows = facets.values_list('category', 'subcategory', 'price_band', 'count')
+	return rows
+
+
+def summarize(rows):
+	categories = {}
+	subcategories = {}
+	bands = [0] * len(Product.PRICE_BANDS)
+	total = 0
+	for category, subcategory, price_band, count in rows:
+		if category:
+			categories[category] = categories.get(category, 0) + count
+		if subcategory:
+			subcategories[subcategory] = subcategories.get(subcategory, 0) + count
+		bands[price_band] += count
+		total += count
+
+	return {
+		'total': total,
+		'categories': choice_counts(categories, Product.CATEGORY_CHOICES),
+		'subcategories': choice_counts(subcategories, Product.SUBCATEGORY_CHOICES),
+		'price_bands': [
+			{'min': lower, 'max': upper, 'label': label, 'count': bands[index]}
+			for index, (lower, upper, label) in enumerate(Product.PRICE_BANDS)
+		],
+	}
+
+
+def choice_counts(counts, choices):
+	# Choices order first, then any legacy values that aren't a choice
+	order = {value: index for index, (value, label) in enumerate(choices)}
+	labels = dict(choices)
+	return [
+		{'value': value, 'label': labels.get(value, value), 'count': counts[value]}
+		for value in sorted(counts, key=lambda value: (order.get(value, len(order)), value))
+	]
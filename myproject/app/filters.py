@@ -0,0 +1,46 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+
+
+def parse_price(params, name):
+	"""Read a price query param as a Decimal, matching Product.price exactly."""
+	value = params.get(name, None)
+	if not value:
+		return None
+	try:
+		price = Decimal(value.strip())
+	except InvalidOperation:
+		price = None
+	if price is None or not price.is_finite():
+		raise ValidationError({name: 'A valid number is required.'})
+	return price
+
+
+def canonical_choice(value):
+	# Choice values are stored lowercase, so filters can use exact matches
+	# (and the indexes on them) instead of iexact.
+	return ' '.join(value.lower().split())
+
+
+def filter_products(queryset, params):
+	"""Apply the catalog's category, subcategory and price-range query params."""
+	# Filter by category
+	category = params.get('category', None)
+	if category:
+		queryset = queryset.filter(category=canonical_choice(category))
+
+	# Filter by subcategory
+	subcategory = params.get('subcategory', None)
+	if subcategory:
+		queryset = queryset.filter(subcategory=canonical_choice(subcategory))
+
+	# Filter by price range
+	min_price = parse_price(params, 'min_price')
+	max_price = parse_price(params, 'max_price')
+	if min_price is not None:
+		queryset = queryset.filter(price__gte=min_price)
+	if max_price is not None:
+		queryset = queryset.filter(price__lte=max_price)
+
+	return queryset
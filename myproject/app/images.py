@@ -0,0 +1,258 @@
+"""
+Product images.
+
+``remap_product_images`` re-points products to new image URLs by name.
+Names are resolved a chunk at a time with ``name__in`` and only rows whose
+URL actually changes are written, each chunk as one prepared UPDATE run
+with executemany.
+
+``ingest_images`` turns local source images into resized WebP/JPEG
+variants. Variants live under IMAGE_CACHE_DIR in a directory named after
+the hash of the source bytes, so a URL never changes meaning (it can be
+cached forever) and re-ingesting an unchanged image is a cache hit.
+Encoding runs in a process pool; Pillow is only needed by the workers.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import catalog_changed
+from .models import Product
+
+
+# Format -> file extension / content type of its variants
+IMAGE_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SOURCE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff'}
+
+
+def load_image_mapping(stream, format):
+	"""Read ``{product name: image URL}`` from a CSV (name,image columns) or JSON object."""
+	if format == 'csv':
+		return {row['name'].strip(): row['image'].strip() for row in csv.DictReader(stream)}
+	mapping = json.load(stream)
+	if not isinstance(mapping, dict):
+		raise ValueError('Expected a JSON object of name -> image URL')
+	return mapping
+
+
+def write_columns(fields, rows, using):
+	"""
+	Set ``fields`` and updated_at per row, from ``[(*values, updated_at, pk), ...]``,
+	with one prepared statement.
+	"""
+	connection = connections[using]
+	quote = connection.ops.quote_name
+	opts = Product._meta
+	# bulk_update builds a CASE over every row, which is far slower when
+	# every row gets its own value.
+	assignments = ', '.join(f'{quote(opts.get_field(name).column)} = %s' for name in [*fields, 'updated_at'])
+	sql = f'UPDATE {quote(opts.db_table)} SET {assignments} WHERE {quote(opts.pk.column)} = %s'
+	with connection.cursor() as cursor:
+		cursor.executemany(sql, rows)
+
+
+def remap_product_images(mapping, batch_size=500, dry_run=False):
+	"""
+	Point every product named in ``mapping`` at its new image URL.
+
+	Products with several rows of the same name are all updated. Returns
+	counts, the names that matched no product, invalid URLs by name and
+	elapsed seconds.
+	"""
+	start = time.perf_counter()
+	field = Product._meta.get_field('image')
+	using = router.db_for_write(Product)
+	stats = {'mappings': len(mapping), 'updated': 0, 'unchanged': 0, 'missing': [], 'invalid': {}, 'seconds': 0.0}
+
+	names = list(mapping)
+	updated_at = Product._meta.get_field('updated_at')
+	checked = {}
+	try:
+		for offset in range(0, len(names), batch_size):
+			chunk = names[offset:offset + batch_size]
+			found = set()
+			changes = []
+			# Raw parameters skip the field's own conversion (e.g. naive UTC on SQLite)
+			now = updated_at.get_db_prep_value(timezone.now(), connections[using])
+			for pk, name, image in Product.objects.using(using).filter(name__in=chunk).values_list('pk', 'name', 'image'):
+				found.add(name)
+				url = mapping[name]
+				if image == url:
+					stats['unchanged'] += 1
+					continue
+				# Validate only URLs that are about to be written, once each
+				if name not in checked:
+					try:
+						checked[name] = field.clean(url, None)
+					except ValidationError as exc:
+						checked[name] = None
+						stats['invalid'][name] = exc.messages
+				if checked[name] is not None:
+					# updated_at still moves for changed rows so ETags change with the image
+					changes.append((checked[name], now, pk))
+			stats['missing'].extend(name for name in chunk if name not in found)
+			if changes and not dry_run:
+				with transaction.atomic(using=using):
+					write_columns(['image'], changes, using)
+			stats['updated'] += len(changes)
+	finally:
+		if stats['updated'] and not dry_run:
+			catalog_changed()
+		stats['seconds'] = time.perf_counter() - start
+	return stats
+
+
+def content_hash(data):
+	return hashlib.sha256(data).hexdigest()[:32]
+
+
+def variant_widths(source_width, widths=None):
+	"""Widths generated for a source ``source_width`` pixels wide; never upscaled."""
+	return sorted({min(width, source_width) for width in (widths or settings.IMAGE_WIDTHS)})
+
+
+def variant_path(image_hash, width, extension, cache_dir=None):
+	return Path(cache_dir or settings.IMAGE_CACHE_DIR) / image_hash[:2] / image_hash / f'{width}.{extension}'
+
+
+def variant_urls(image_hash, source_width, request=None):
+	"""``[{'width': ..., 'webp': url, 'jpeg': url}, ...]`` from narrowest to widest."""
+	variants = []
+	for width in variant_widths(source_width):
+		variant = {'width': width}
+		for image_format, extension in IMAGE_EXTENSIONS.items():
+			url = reverse('product-image', kwargs={'image_hash': image_hash, 'width': width, 'extension': extension})
+			variant[image_format] = request.build_absolute_uri(url) if request is not None else url
+		variants.append(variant)
+	return variants
+
+
+def generate_variants(source, cache_dir, widths, quality):
+	"""
+	Process-pool worker: write every variant of ``source`` that isn't cached.
+
+	Needs no Django setup. Returns the content hash, source width and the
+	byte sizes of the source and of each ``(width, format)`` variant.
+	"""
+	from PIL import Image, ImageOps
+
+	data = Path(source).read_bytes()
+	image_hash = content_hash(data)
+	with Image.open(source) as image:
+		width, height = image.size
+		# EXIF orientations 5-8 are rotated by 90 degrees
+		rotated = image.getexif().get(0x0112) in (5, 6, 7, 8)
+		if rotated:
+			width, height = height, width
+		targets = variant_widths(width, widths)
+		paths = {
+			(target, image_format): variant_path(image_hash, target, extension, cache_dir)
+			for target in targets
+			for image_format, extension in IMAGE_EXTENSIONS.items()
+		}
+		cached = all(path.exists() for path in paths.values())
+		if not cached:
+			# Let the JPEG decoder downscale while decoding when it can
+			box = (targets[-1], max(1, round(height * targets[-1] / width)))
+			image.draft('RGB', box[::-1] if rotated else box)
+			image = ImageOps.exif_transpose(image)
+			image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+			# Widest first, each step resized from the previous one
+			for target in reversed(targets):
+				size = (target, max(1, round(height * target / width)))
+				if image.size != size:
+					image = image.resize(size, Image.Resampling.LANCZOS)
+				flat = image
+				if image.mode == 'RGBA':
+					flat = Image.new('RGB', image.size, 'white')
+					flat.paste(image, mask=image.getchannel('A'))
+				save_atomic(image, paths[(target, 'webp')], 'WEBP', quality=quality, method=4)
+				save_atomic(flat, paths[(target, 'jpeg')], 'JPEG', quality=quality, optimize=True, progressive=True)
+
+	return {
+		'source': str(source),
+		'hash': image_hash,
+		'width': width,
+		'bytes': len(data),
+		'variants': {key: path.stat().st_size for key, path in paths.items()},
+		'cached': cached,
+	}
+
+
+def save_atomic(image, path, image_format, **options):
+	# Concurrent ingests of the same image each write a temp file and rename
+	path.parent.mkdir(parents=True, exist_ok=True)
+	temporary = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+	image.save(temporary, image_format, **options)
+	os.replace(temporary, path)
+
+
+def find_sources(paths):
+	"""Expand files and directories into the image files to ingest."""
+	for path in map(Path, paths):
+		if path.is_dir():
+			yield from sorted(child for child in path.rglob('*') if child.suffix.lower() in SOURCE_SUFFIXES)
+		else:
+			yield path
+
+
+def generate_all(sources, workers=None, cache_dir=None, widths=None, quality=None):
+	"""Yield generate_variants() results for ``sources``, in order, across ``workers`` processes."""
+	arguments = (
+		str(cache_dir or settings.IMAGE_CACHE_DIR),
+		list(widths or settings.IMAGE_WIDTHS),
+		quality or settings.IMAGE_QUALITY,
+	)
+	sources = [str(source) for source in sources]
+	if workers == 1:
+		for source in sources:
+			yield generate_variants(source, *arguments)
+		return
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		futures = [executor.submit(generate_variants, source, *arguments) for source in sources]
+		for future in futures:
+			yield future.result()
+
+
+def attach_images(results, key='sku', batch_size=500):
+	"""
+	Point products at their ingested images, matching each source file's
+	name (without extension) against ``key``. Returns the unmatched stems.
+	"""
+	using = router.db_for_write(Product)
+	updated_at = Product._meta.get_field('updated_at')
+	by_stem = {Path(result['source']).stem: result for result in results}
+	stems = list(by_stem)
+	missing = []
+	changed = False
+	for offset in range(0, len(stems), batch_size):
+		chunk = stems[offset:offset + batch_size]
+		lookup = {f'{key}__in': [int(stem) for stem in chunk if stem.isdigit()] if key == 'id' else chunk}
+		now = updated_at.get_db_prep_value(timezone.now(), connections[using])
+		rows = []
+		found = set()
+		for pk, value, image_hash, image_width in Product.objects.using(using).filter(**lookup).values_list('pk', key, 'image_hash', 'image_width'):
+			result = by_stem[str(value)]
+			found.add(str(value))
+			if (image_hash, image_width) != (result['hash'], result['width']):
+				rows.append((result['hash'], result['width'], now, pk))
+		missing.extend(stem for stem in chunk if stem not in found)
+		if rows:
+			with transaction.atomic(using=using):
+				write_columns(['image_hash', 'image_width'], rows, using)
+			changed = True
+	if changed:
+		catalog_changed()
+	return missing
@@ -0,0 +1,101 @@
+"""
+Stock reservation for checkout.
+
+Stock is only ever changed with a single conditional UPDATE, never with a
+read-modify-write in Python, so concurrent checkouts of the same product
+cannot oversell: the database evaluates ``stock >= quantity`` and the
+decrement atomically for every row.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import catalog_changed
+from .models import Order, Product
+
+
+class OutOfStock(APIException):
+	status_code = status.HTTP_409_CONFLICT
+	default_code = 'out_of_stock'
+
+	def __init__(self, shortages):
+		super().__init__()
+		# Set directly so product ids and quantities stay numbers in the response
+		self.detail = {'error': 'Out of stock', 'items': shortages}
+		self.shortages = shortages
+
+
+def reserve_stock(quantities):
+	"""
+	Decrement stock for ``{product_id: quantity}`` all-or-nothing.
+
+	Raises OutOfStock (and changes nothing) if any product is short.
+	"""
+	if not quantities:
+		return
+	enough = Q()
+	for product_id, quantity in quantities.items():
+		enough |= Q(pk=product_id, stock__gte=quantity)
+
+	# No savepoint: if the reservation fails the enclosing checkout must roll back too
+	with transaction.atomic(savepoint=False):
+		updated = Product.objects.filter(enough).update(
+			stock=_adjusted_stock(quantities, -1),
+			updated_at=timezone.now(),
+		)
+		if updated != len(quantities):
+			raise OutOfStock(find_shortages(quantities))
+	# Queryset updates skip post_save, so invalidate cached stock explicitly
+	catalog_changed()
+
+
+def release_stock(quantities):
+	"""Return previously reserved stock for ``{product_id: quantity}``."""
+	if not quantities:
+		return
+	Product.objects.filter(pk__in=quantities).update(
+		stock=_adjusted_stock(quantities, 1),
+		updated_at=timezone.now(),
+	)
+	catalog_changed()
+
+
+def find_shortages(quantities):
+	available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'stock'))
+	return [
+		{'product_id': product_id, 'requested': quantity, 'available': max(available.get(product_id, 0), 0)}
+		for product_id, quantity in quantities.items()
+		if available.get(product_id, 0) < quantity
+	]
+
+
+def cancel_order(order):
+	"""
+	Cancel ``order`` and put its items back in stock.
+
+	The status change is itself a conditional UPDATE so that two concurrent
+	cancellations release the stock only once. Returns False if the order
+	was already cancelled.
+	"""
+	with transaction.atomic():
+		cancelled = Order.objects.filter(pk=order.pk).exclude(status=Order.STATUS_CANCELLED).update(
+			status=Order.STATUS_CANCELLED,
+			updated_at=timezone.now(),
+		)
+		if not cancelled:
+			return False
+		quantities = {}
+		for product_id, quantity in order.items.filter(product__isnull=False).values_list('product_id', 'quantity'):
+			quantities[product_id] = quantities.get(product_id, 0) + quantity
+		release_stock(quantities)
+	order.status = Order.STATUS_CANCELLED
+	return True
+
+
+def _adjusted_stock(quantities, sign):
+	return Case(
+		*[When(pk=product_id, then=F('stock') + sign * quantity) for product_id, quantity in quantities.items()],
+		default=F('stock'),
+	)
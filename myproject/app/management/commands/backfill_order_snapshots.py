@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app.checkout import backfill_order_snapshots
+
+
+class Command(BaseCommand):
+	help = 'Copy product details onto order lines placed before checkout snapshotted them'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help='Lines per query and per transaction')
+
+	def handle(self, *args, **options):
+		def report_batch(updated, skipped):
+			if options['verbosity'] > 1:
+				self.stdout.write(f'{updated} lines updated')
+
+		updated, skipped = backfill_order_snapshots(options['batch_size'], on_batch=report_batch)
+		self.stdout.write(f'{updated} order lines updated')
+		if skipped:
+			self.stdout.write(f'{skipped} lines skipped: their products no longer exist')
@@ -0,0 +1,284 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app.benchmarks import benchmark_database, seed_products, summarize
+from app.checkout import checkout_cart
+from app.facets import rebuild_facets
+from app.images import variant_path
+from app.models import Cart, CartItem, Order, Product
+
+
+PASSWORD = 'bench-password'
+METRICS_TOKEN = 'bench-metrics-token'
+IMAGE_HASH = '0' * 32
+
+
+class Endpoint:
+	"""One request shape to benchmark. ``path``, ``data`` and ``prepare`` take the worker state."""
+
+	def __init__(self, name, method, path, expect=200, auth=True, data=None, prepare=None, max_requests=None):
+		self.name = name
+		self.method = method
+		self.path = path
+		self.expect = expect
+		self.auth = auth
+		self.data = data
+		self.prepare = prepare
+		self.max_requests = max_requests
+
+
+def add_to_cart(state, lines=3):
+	cart = Cart.objects.get(user=state['user'])
+	CartItem.objects.bulk_create(
+		[CartItem(cart=cart, product_id=product_id, quantity=1) for product_id in state['products'][:lines]],
+		update_conflicts=True,
+		unique_fields=['cart', 'product'],
+		update_fields=['quantity'],
+	)
+
+
+def login(state):
+	token, _ = Token.objects.get_or_create(user=state['user'])
+	state['client'].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+def scraper(state):
+	# As Prometheus would, with the METRICS_TOKEN set for the run
+	state['client'].credentials(HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}')
+
+
+ENDPOINTS = [
+	Endpoint('api-root', 'get', lambda s: reverse('api-root'), auth=False),
+	# Password hashing is slow by design; a few samples are enough
+	Endpoint('register', 'post', lambda s: reverse('register'), expect=201, auth=False, max_requests=20,
+		data=lambda s: {'username': f"{s['user'].username}-new-{next(s['counter'])}", 'password': PASSWORD}),
+	Endpoint('login', 'post', lambda s: reverse('login'), auth=False, max_requests=20,
+		data=lambda s: {'username': s['user'].username, 'password': PASSWORD}),
+	Endpoint('logout', 'post', lambda s: reverse('logout'), prepare=login),
+	Endpoint('profile', 'get', lambda s: reverse('profile')),
+	Endpoint('products', 'get', lambda s: reverse('products'), auth=False),
+	Endpoint('products:search', 'get', lambda s: reverse('products') + '?search=wireless', auth=False),
+	Endpoint('products:filter', 'get', lambda s: reverse('products') + '?category=electronics&min_price=100&max_price=5000', auth=False),
+	Endpoint('product-facets', 'get', lambda s: reverse('product-facets'), auth=False),
+	Endpoint('product-detail', 'get', lambda s: reverse('product-detail', args=[s['products'][0]]), auth=False),
+	Endpoint('product-suggest', 'get', lambda s: reverse('product-suggest') + '?q=wire', auth=False),
+	Endpoint('product-batch', 'get', lambda s: reverse('product-batch') + '?ids=' + ','.join(map(str, s['products'][:20])), auth=False),
+	Endpoint('async-products', 'get', lambda s: reverse('async-products'), auth=False),
+	Endpoint('async-product-facets', 'get', lambda s: reverse('async-product-facets'), auth=False),
+	Endpoint('async-product-detail', 'get', lambda s: reverse('async-product-detail', args=[s['products'][0]]), auth=False),
+	Endpoint('product-image', 'get',
+		lambda s: reverse('product-image', kwargs={'image_hash': IMAGE_HASH, 'width': 320, 'extension': 'webp'}), auth=False),
+	Endpoint('cart', 'get', lambda s: reverse('cart'), prepare=add_to_cart),
+	Endpoint('cart:add', 'post', lambda s: reverse('cart'),
+		data=lambda s: {'product_id': s['products'][-1], 'quantity': 1}),
+	Endpoint('cart:update', 'patch', lambda s: reverse('cart'), prepare=add_to_cart,
+		data=lambda s: {'product_id': s['products'][0], 'quantity': 2}),
+	Endpoint('cart:remove', 'delete', lambda s: reverse('cart'), prepare=add_to_cart,
+		data=lambda s: {'product_id': s['products'][0]}),
+	Endpoint('cart-batch', 'post', lambda s: reverse('cart-batch'), prepare=add_to_cart,
+		data=lambda s: {'operations': [
+			{'op': 'update', 'product_id': s['products'][0], 'quantity': 2},
+			*({'op': 'add', 'product_id': product_id} for product_id in s['products'][1:20]),
+		]}),
+	Endpoint('orders', 'get', lambda s: reverse('orders')),
+	Endpoint('orders:checkout', 'post', lambda s: reverse('orders'), expect=201, prepare=add_to_cart,
+		data=lambda s: {'payment_method': 'cod', 'shipping_address': '1 Bench Street'}),
+	Endpoint('order-detail', 'get', lambda s: reverse('order-detail', args=[s['order']])),
+	Endpoint('order-detail:update', 'patch', lambda s: reverse('order-detail', args=[s['order']]),
+		data=lambda s: {'shipping_address': f"{next(s['counter'])} Bench Street"}),
+	Endpoint('metrics', 'get', lambda s: reverse('metrics'), auth=False, prepare=scraper),
+]
+
+
+class Command(BaseCommand):
+	help = 'Load-test every API route in-process and report latency, throughput, queries and memory'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--products', type=int, default=10_000)
+		parser.add_argument('--concurrency', type=int, default=4, help='Client threads, each with its own user')
+		parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+		parser.add_argument('--orders', type=int, default=5, help='Orders seeded per user')
+		parser.add_argument('--endpoints', nargs='+', help='Only these endpoints (default: all)')
+		parser.add_argument('--no-cache', action='store_true', help='Run with a dummy cache backend')
+		parser.add_argument('--json', help='Write results to this file')
+		parser.add_argument('--baseline', help='Compare against results from an earlier --json run')
+		parser.add_argument('--max-regression', type=float, help='Fail if any p95 is this many percent above the baseline')
+
+	def handle(self, *args, **options):
+		endpoints = ENDPOINTS
+		if options['endpoints']:
+			endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name in options['endpoints']]
+		self.warn_uncovered()
+
+		# Client threads share one database, so use a file rather than :memory:
+		sqlite_options = {'transaction_mode': 'IMMEDIATE', 'timeout': 30} if connection.vendor == 'sqlite' else {}
+		overrides = {}
+		if options['no_cache']:
+			overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+		with tempfile.TemporaryDirectory() as tmp, override_settings(IMAGE_CACHE_DIR=tmp, METRICS_TOKEN=METRICS_TOKEN, **overrides):
+			with benchmark_database(name=os.path.join(tmp, 'bench_api.sqlite3'), options=sqlite_options):
+				states = self.seed(options)
+				results = {endpoint.name: self.run_endpoint(endpoint, states, options['requests']) for endpoint in endpoints}
+
+		report = {
+			'meta': {
+				'products': options['products'],
+				'concurrency': options['concurrency'],
+				'requests': options['requests'],
+				'cache': not options['no_cache'],
+				'django': django.get_version(),
+				'vendor': connection.vendor,
+				'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			},
+			'endpoints': results,
+		}
+		self.print_results(results)
+		if options['json']:
+			with open(options['json'], 'w') as output:
+				json.dump(report, output, indent=2)
+		if options['baseline']:
+			self.compare(results, options['baseline'], options['max_regression'])
+
+	def warn_uncovered(self):
+		covered = {endpoint.name.split(':')[0] for endpoint in ENDPOINTS}
+		routes = {pattern.name for pattern in get_resolver('app.urls').url_patterns if pattern.name}
+		uncovered = sorted(routes - covered)
+		if uncovered:
+			self.stderr.write(f'No benchmark for: {", ".join(uncovered)}')
+
+	def seed(self, options):
+		seller = User.objects.create_user('bench-seller', is_staff=True)
+		seed_products(options['products'], seller=seller)
+		# Keep order totals inside max_digits and never run out of stock
+		Product.objects.update(price=Decimal('499.00'), stock=1_000_000)
+		rebuild_facets()
+		product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:5])
+		Product.objects.filter(pk=product_ids[0]).update(image_hash=IMAGE_HASH, image_width=640)
+		path = variant_path(IMAGE_HASH, 320, 'webp')
+		path.parent.mkdir(parents=True)
+		path.write_bytes(os.urandom(12_000))
+
+		# One password hash shared by every bench user; hashing per user would dominate seeding
+		password = make_password(PASSWORD)
+		users = User.objects.bulk_create([User(username=f'bench-{i}', password=password) for i in range(options['concurrency'])])
+		Cart.objects.bulk_create([Cart(user=user) for user in users])
+		states = []
+		for user in users:
+			state = {'user': user, 'products': product_ids, 'counter': itertools.count(), 'client': APIClient()}
+			for _ in range(options['orders']):
+				add_to_cart(state)
+				checkout_cart(user)
+			state['order'] = Order.objects.filter(user=user).latest('id').pk
+			states.append(state)
+		return states
+
+	def run_endpoint(self, endpoint, states, total):
+		samples = []
+		query_counts = []
+		errors = []
+		lock = threading.Lock()
+
+		def request(state):
+			client = state['client']
+			if endpoint.auth:
+				login(state)
+			else:
+				client.credentials()
+			if endpoint.prepare:
+				endpoint.prepare(state)
+			data = endpoint.data(state) if endpoint.data else None
+			with CaptureQueriesContext(connection) as queries:
+				start = time.perf_counter()
+				response = getattr(client, endpoint.method)(endpoint.path(state), data, format='json')
+				elapsed = time.perf_counter() - start
+			return response, elapsed, len(queries)
+
+		def worker(state, count):
+			try:
+				for _ in range(count):
+					response, elapsed, queries = request(state)
+					with lock:
+						samples.append(elapsed)
+						query_counts.append(queries)
+						if response.status_code != endpoint.expect:
+							errors.append(response.status_code)
+			finally:
+				connections.close_all()
+
+		if endpoint.max_requests:
+			total = min(total, endpoint.max_requests)
+		share, extra = divmod(total, len(states))
+		start = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=len(states)) as executor:
+			futures = [executor.submit(worker, state, share + (index < extra)) for index, state in enumerate(states)]
+			for future in futures:
+				future.result()
+		wall = time.perf_counter() - start
+
+		# Memory is sampled separately: tracing would distort the timings above
+		tracemalloc.start()
+		try:
+			for _ in range(5):
+				request(states[0])
+			peak = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+
+		stats = summarize(samples)
+		stats.update({
+			'rps': len(samples) / wall if wall else 0.0,
+			'queries': sum(query_counts) / len(query_counts) if query_counts else 0.0,
+			'peak_kb': peak / 1024,
+			'errors': len(errors),
+		})
+		if errors:
+			self.stderr.write(f'{endpoint.name}: {len(errors)} unexpected responses, e.g. {errors[0]}')
+		return stats
+
+	def print_results(self, results):
+		self.stdout.write(f'{"endpoint":<22}{"p50":>11}{"p95":>11}{"p99":>11}{"req/s":>9}{"queries":>9}{"peak KB":>9}{"errors":>8}')
+		for name, stats in results.items():
+			self.stdout.write(
+				f'{name:<22}{stats["p50_ms"]:>9.2f}ms{stats["p95_ms"]:>9.2f}ms{stats["p99_ms"]:>9.2f}ms'
+				f'{stats["rps"]:>9.0f}{stats["queries"]:>9.1f}{stats["peak_kb"]:>9.0f}{stats["errors"]:>8}'
+			)
+
+	def compare(self, results, path, max_regression):
+		with open(path) as baseline_file:
+			baseline = json.load(baseline_file)['endpoints']
+		self.stdout.write(f'\n{"vs baseline":<22}{"p95":>10}{"req/s":>10}{"queries":>10}')
+		regressions = []
+		for name, stats in results.items():
+			before = baseline.get(name)
+			if not before:
+				continue
+			p95 = change(before['p95_ms'], stats['p95_ms'])
+			rps = change(before['rps'], stats['rps'])
+			queries = stats['queries'] - before['queries']
+			self.stdout.write(f'{name:<22}{p95:>+9.1f}%{rps:>+9.1f}%{queries:>+10.1f}')
+			if max_regression is not None and p95 > max_regression:
+				regressions.append(name)
+		if regressions:
+			raise CommandError(f'p95 regressed by more than {max_regression}%: {", ".join(regressions)}')
+
+
+def change(before, after):
+	return (after - before) / before * 100 if before else 0.0
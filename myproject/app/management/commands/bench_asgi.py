@@ -0,0 +1,196 @@
+import asyncio
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import reverse
+
+from app.benchmarks import benchmark_database, seed_products, summarize
+from app.facets import rebuild_facets
+from app.models import Product
+
+
+# (label, URL name of the product list to derive paths from, server)
+MODES = [
+	('wsgi, threads', 'products', 'wsgi'),
+	('asgi, sync views', 'products', 'asgi'),
+	('asgi, async views', 'async-products', 'asgi'),
+]
+
+
+def request_paths(prefix, product_ids, count, seed):
+	"""A reproducible mix of catalog reads: pages, filters, facets and product details."""
+	rng = random.Random(seed)
+	base = reverse(prefix)
+	facets = reverse('product-facets' if prefix == 'products' else 'async-product-facets')
+	detail = 'product-detail' if prefix == 'products' else 'async-product-detail'
+	choices = [
+		lambda: (base, ''),
+		lambda: (base, f'category={rng.choice(["electronics", "fashion", "beauty", "appliances"])}'),
+		lambda: (facets, ''),
+		lambda: (reverse(detail, args=[rng.choice(product_ids)]), ''),
+		lambda: (reverse(detail, args=[rng.choice(product_ids)]), ''),
+	]
+	return [rng.choice(choices)() for _ in range(count)]
+
+
+def wsgi_get(application, path, query):
+	environ = {
+		'REQUEST_METHOD': 'GET',
+		'PATH_INFO': path,
+		'QUERY_STRING': query,
+		'SERVER_NAME': 'testserver',
+		'SERVER_PORT': '80',
+		'SERVER_PROTOCOL': 'HTTP/1.1',
+		'HTTP_HOST': 'testserver',
+		'wsgi.input': io.BytesIO(),
+		'wsgi.errors': io.StringIO(),
+		'wsgi.url_scheme': 'http',
+		'wsgi.multithread': True,
+		'wsgi.multiprocess': False,
+		'wsgi.run_once': False,
+		'wsgi.version': (1, 0),
+	}
+	status = []
+	body = application(environ, lambda code, headers, exc_info=None: status.append(int(code.split()[0])))
+	try:
+		for _ in body:
+			pass
+	finally:
+		# Sends request_finished, which closes the thread's database connection
+		body.close()
+	return status[0]
+
+
+async def asgi_get(application, path, query):
+	scope = {
+		'type': 'http',
+		'asgi': {'version': '3.0'},
+		'http_version': '1.1',
+		'method': 'GET',
+		'scheme': 'http',
+		'path': path,
+		'raw_path': path.encode(),
+		'query_string': query.encode(),
+		'root_path': '',
+		'headers': [(b'host', b'testserver')],
+		'client': ('127.0.0.1', 0),
+		'server': ('testserver', 80),
+	}
+	received = asyncio.Event()
+
+	async def receive():
+		if not received.is_set():
+			received.set()
+			return {'type': 'http.request', 'body': b'', 'more_body': False}
+		# The client stays connected; Django cancels this once it has responded
+		await asyncio.Event().wait()
+
+	status = []
+
+	async def send(message):
+		if message['type'] == 'http.response.start':
+			status.append(message['status'])
+
+	await application(scope, receive, send)
+	return status[0]
+
+
+class Command(BaseCommand):
+	help = 'Compare catalog read throughput under WSGI with a thread pool and under ASGI with sync and async views'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--products', type=int, default=10_000)
+		parser.add_argument('--requests', type=int, default=2000, help='Requests per run')
+		parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 64, 256], help='Concurrent clients per run')
+		parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads, e.g. gunicorn --threads')
+		parser.add_argument('--cache-latency', type=float, default=1.0, help='Milliseconds per cache call, as for a cache server')
+
+	def handle(self, *args, **options):
+		caches = {'default': {
+			'BACKEND': 'app.benchmarks.LatencyCache',
+			'LATENCY': options['cache_latency'] / 1000,
+			'OPTIONS': {'MAX_ENTRIES': 100_000},
+		}}
+		# Clients share one database from many threads, so use a file rather than :memory:
+		sqlite_options = {'timeout': 30} if connection.vendor == 'sqlite' else {}
+		with tempfile.TemporaryDirectory() as tmp, override_settings(CACHES=caches, METRICS_DIR=None):
+			with benchmark_database(name=os.path.join(tmp, 'bench_asgi.sqlite3'), options=sqlite_options):
+				seed_products(options['products'])
+				rebuild_facets()
+				product_ids = list(Product.objects.values_list('id', flat=True)[:2000])
+				connections.close_all()
+
+				wsgi = get_wsgi_application()
+				asgi = get_asgi_application()
+				self.stdout.write(
+					f'{options["requests"]} requests per run, {options["threads"]} WSGI threads, '
+					f'{options["cache_latency"]:g}ms per cache call'
+				)
+				self.stdout.write(f'{"mode":<20}{"clients":>8}{"req/s":>10}{"p50":>11}{"p99":>11}{"errors":>8}')
+				for concurrency in options['concurrency']:
+					for label, prefix, server in MODES:
+						paths = request_paths(prefix, product_ids, options['requests'], seed=concurrency)
+						if server == 'wsgi':
+							samples, errors, wall = self.run_wsgi(wsgi, paths, concurrency, options['threads'])
+						else:
+							samples, errors, wall = asyncio.run(self.run_asgi(asgi, paths, concurrency))
+						stats = summarize(samples)
+						self.stdout.write(
+							f'{label:<20}{concurrency:>8}{len(samples) / wall:>10.0f}'
+							f'{stats["p50_ms"]:>9.1f}ms{stats["p99_ms"]:>9.1f}ms{errors:>8}'
+						)
+
+	def run_wsgi(self, application, paths, concurrency, threads):
+		# Clients beyond the worker's thread count queue for a free thread
+		workers = threading.Semaphore(threads)
+		queue = iter(paths)
+		lock = threading.Lock()
+		samples = []
+		errors = []
+
+		def client():
+			while True:
+				with lock:
+					path = next(queue, None)
+				if path is None:
+					return
+				start = time.perf_counter()
+				with workers:
+					status = wsgi_get(application, *path)
+				with lock:
+					samples.append(time.perf_counter() - start)
+					if status != 200:
+						errors.append(status)
+
+		start = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=concurrency) as executor:
+			for future in [executor.submit(client) for _ in range(concurrency)]:
+				future.result()
+		return samples, len(errors), time.perf_counter() - start
+
+	async def run_asgi(self, application, paths, concurrency):
+		queue = iter(paths)
+		samples = []
+		errors = []
+
+		async def client():
+			for path in queue:
+				start = time.perf_counter()
+				status = await asgi_get(application, *path)
+				samples.append(time.perf_counter() - start)
+				if status != 200:
+					errors.append(status)
+
+		start = time.perf_counter()
+		await asyncio.gather(*[client() for _ in range(concurrency)])
+		return samples, len(errors), time.perf_counter() - start
@@ -0,0 +1,71 @@
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from app.authentication import CachedTokenAuthentication, clear_token_cache
+from app.benchmarks import benchmark_database, summarize
+
+
+@contextmanager
+def authentication(*classes):
+	# Views read authentication_classes from APIView unless they override it
+	previous = APIView.authentication_classes
+	APIView.authentication_classes = list(classes)
+	try:
+		yield
+	finally:
+		APIView.authentication_classes = previous
+
+
+class Command(BaseCommand):
+	help = 'Compare queries and latency of token-authenticated requests with and without the token cache'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--repeat', type=int, default=500)
+
+	def handle(self, *args, **options):
+		scenarios = [
+			('TokenAuthentication', TokenAuthentication, lambda: None),
+			('cached, cold', CachedTokenAuthentication, lambda: (cache.clear(), clear_token_cache())),
+			('cached, shared cache', CachedTokenAuthentication, clear_token_cache),
+			('cached, in-process', CachedTokenAuthentication, lambda: None),
+		]
+		with benchmark_database():
+			user = User.objects.create_user('bench-auth')
+			token = Token.objects.create(user=user)
+			client = APIClient()
+			client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+			url = reverse('profile')
+
+			self.stdout.write(f'{"scenario":<24}{"queries":>10}{"p50":>12}{"p95":>12}')
+			for label, auth_class, before in scenarios:
+				cache.clear()
+				clear_token_cache()
+				samples = []
+				query_counts = set()
+				with authentication(auth_class):
+					# Warm up, so the cached scenarios start from a populated cache
+					client.get(url)
+					for _ in range(options['repeat']):
+						before()
+						with CaptureQueriesContext(connection) as queries:
+							start = time.perf_counter()
+							response = client.get(url)
+							samples.append(time.perf_counter() - start)
+						if response.status_code != 200:
+							self.stderr.write(f'{label}: request failed with {response.status_code}')
+							return
+						query_counts.add(len(queries))
+				stats = summarize(samples)
+				counts = '/'.join(str(c) for c in sorted(query_counts))
+				self.stdout.write(f'{label:<24}{counts:>10}{stats["p50_ms"]:>10.3f}ms{stats["p95_ms"]:>10.3f}ms')
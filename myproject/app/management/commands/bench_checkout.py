@@ -0,0 +1,54 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.benchmarks import benchmark_database, seed_products, summarize
+from app.models import Cart, CartItem, Product
+
+
+class Command(BaseCommand):
+	help = 'Measure queries and latency of POST /api/orders/ across cart sizes'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--sizes', nargs='+', type=int, default=[1, 10, 50, 100, 500])
+		parser.add_argument('--repeat', type=int, default=10)
+
+	def handle(self, *args, **options):
+		sizes = sorted(options['sizes'])
+		with benchmark_database():
+			seed_products(max(sizes))
+			# Keep a 500-line total inside Order.total_price's max_digits, and
+			# never run out of stock mid-benchmark
+			Product.objects.update(price=Decimal('499.00'), stock=1_000_000)
+			products = list(Product.objects.order_by('id'))
+			user = User.objects.create_user('bench-buyer')
+			cart = Cart.objects.create(user=user)
+			client = APIClient()
+			client.force_authenticate(user)
+			url = reverse('orders')
+
+			self.stdout.write(f'{"lines":>6}{"queries":>10}{"p50":>12}{"p95":>12}')
+			for size in sizes:
+				samples = []
+				query_counts = set()
+				for _ in range(options['repeat']):
+					CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=2) for p in products[:size]])
+					with CaptureQueriesContext(connection) as queries:
+						start = time.perf_counter()
+						response = client.post(url, {'payment_method': 'cod'}, format='json')
+						samples.append(time.perf_counter() - start)
+					if options['verbosity'] > 1:
+						self.stdout.write('\n'.join(q['sql'][:120] for q in queries.captured_queries))
+					if response.status_code != 201:
+						self.stderr.write(f'Checkout failed: {response.status_code} {response.data}')
+						return
+					query_counts.add(len(queries))
+				stats = summarize(samples)
+				counts = '/'.join(str(c) for c in sorted(query_counts))
+				self.stdout.write(f'{size:>6}{counts:>10}{stats["p50_ms"]:>10.2f}ms{stats["p95_ms"]:>10.2f}ms')
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.images import find_sources, generate_all
+
+
+class Command(BaseCommand):
+	help = 'Measure image variant generation (images/s) and bytes saved against full-size sources'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--count', type=int, default=48)
+		parser.add_argument('--size', type=int, nargs=2, default=[2400, 1800], metavar=('WIDTH', 'HEIGHT'))
+		parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+		parser.add_argument('--card-width', type=int, default=320, help='Variant a product card downloads')
+		parser.add_argument('--sources', help='Directory of real images to use instead of synthetic ones')
+
+	def handle(self, *args, **options):
+		try:
+			from PIL import Image
+		except ImportError:
+			raise CommandError('bench_images needs Pillow (pip install Pillow)')
+
+		with tempfile.TemporaryDirectory() as tmp:
+			if options['sources']:
+				sources = list(find_sources([options['sources']]))
+			else:
+				sources = self.make_sources(Image, Path(tmp) / 'sources', options['count'], options['size'])
+			self.stdout.write(f'{"workers":>8}{"run":>8}{"images/s":>12}')
+			for workers in sorted(set(options['workers'])):
+				cache_dir = Path(tmp) / f'cache-{workers}'
+				for run in ('cold', 'cached'):
+					start = time.perf_counter()
+					results = list(generate_all(sources, workers=workers, cache_dir=cache_dir))
+					elapsed = time.perf_counter() - start
+					self.stdout.write(f'{workers:>8}{run:>8}{len(results) / elapsed:>12.1f}')
+
+		source_bytes = sum(result['bytes'] for result in results)
+		# The card downloads the narrowest variant at least card-width wide
+		card = {}
+		for result in results:
+			widths = sorted({width for width, image_format in result['variants']})
+			width = next((width for width in widths if width >= options['card_width']), widths[-1])
+			for image_format in ('webp', 'jpeg'):
+				card[image_format] = card.get(image_format, 0) + result['variants'][(width, image_format)]
+		self.stdout.write(f'{len(results)} sources:        {source_bytes / 1e6:8.2f} MB')
+		for image_format, size in card.items():
+			label = f"{options['card_width']}w {image_format}:"
+			self.stdout.write(f'{label:<20}{size / 1e6:8.2f} MB  ({1 - size / source_bytes:.1%} fewer bytes per card)')
+
+	def make_sources(self, Image, directory, count, size):
+		# Upscaled coarse noise plus a little grain: smooth shapes and texture
+		# that survive downscaling, roughly like a product photo
+		directory.mkdir()
+		sources = []
+		for index in range(count):
+			coarse = Image.effect_noise((size[0] // 24, size[1] // 24), 64).resize(tuple(size), Image.Resampling.BICUBIC)
+			grain = Image.effect_noise(tuple(size), 8 + index % 8)
+			channels = [Image.blend(coarse.rotate(90 * channel, expand=False), grain, 0.2) for channel in range(3)]
+			path = directory / f'{index}.jpg'
+			Image.merge('RGB', channels).save(path, 'JPEG', quality=90)
+			sources.append(path)
+		return sources
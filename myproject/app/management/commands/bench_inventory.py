@@ -0,0 +1,83 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from app.benchmarks import benchmark_database
+from app.checkout import checkout_cart
+from app.inventory import OutOfStock
+from app.models import Cart, CartItem, OrderItem, Product
+
+
+class Command(BaseCommand):
+	help = 'Hammer one product with concurrent checkouts and verify nothing is oversold'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--threads', type=int, default=16)
+		parser.add_argument('--stock', type=int, default=500)
+		parser.add_argument('--attempts', type=int, default=100, help='Checkouts attempted per thread')
+		parser.add_argument('--quantity', type=int, default=1, help='Units per checkout')
+
+	def handle(self, *args, **options):
+		# Threads need to share one database, so use a file rather than :memory:
+		sqlite_options = {'transaction_mode': 'IMMEDIATE', 'timeout': 30} if connection.vendor == 'sqlite' else {}
+		with tempfile.TemporaryDirectory() as tmp:
+			with benchmark_database(name=os.path.join(tmp, 'bench_inventory.sqlite3'), options=sqlite_options):
+				self.run_benchmark(options)
+
+	def run_benchmark(self, options):
+		product = Product.objects.create(name='Hot SKU', price=Decimal('999.00'), stock=options['stock'])
+		users = [User.objects.create_user(f'bench-{i}') for i in range(options['threads'])]
+		Cart.objects.bulk_create([Cart(user=user) for user in users])
+
+		results = {'ok': 0, 'out_of_stock': 0, 'errors': 0}
+		lock = threading.Lock()
+
+		def worker(user):
+			cart = Cart.objects.get(user=user)
+			try:
+				for _ in range(options['attempts']):
+					CartItem.objects.update_or_create(cart=cart, product=product, defaults={'quantity': options['quantity']})
+					try:
+						checkout_cart(user)
+						outcome = 'ok'
+					except OutOfStock:
+						outcome = 'out_of_stock'
+					except OperationalError:
+						outcome = 'errors'
+					with lock:
+						results[outcome] += 1
+			finally:
+				connection.close()
+
+		threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+		start = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - start
+
+		product.refresh_from_db()
+		sold = OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+		oversold = max(sold - options['stock'], 0)
+		consistent = product.stock == options['stock'] - sold
+
+		self.stdout.write(f"threads:          {options['threads']}")
+		self.stdout.write(f"initial stock:    {options['stock']}")
+		self.stdout.write(f"units sold:       {sold}")
+		self.stdout.write(f"final stock:      {product.stock}")
+		self.stdout.write(f"checkouts ok:     {results['ok']}")
+		self.stdout.write(f"out of stock:     {results['out_of_stock']}")
+		self.stdout.write(f"db errors:        {results['errors']}")
+		self.stdout.write(f"throughput:       {results['ok'] / elapsed:.1f} checkouts/s")
+		if oversold or not consistent or product.stock < 0:
+			self.stderr.write(self.style.ERROR(f'OVERSOLD by {oversold} (stock consistent: {consistent})'))
+		else:
+			self.stdout.write(self.style.SUCCESS('No oversells'))
@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from app.benchmarks import benchmark_database, seed_products, summarize, timed
+from app.compression import brotli, compress
+from app.models import Product
+from app.renderers import ORJSONRenderer
+from app.serializers import ProductSerializer
+
+
+RENDERERS = [('drf json', JSONRenderer()), ('orjson', ORJSONRenderer())]
+
+
+class Command(BaseCommand):
+	help = 'Compare JSON render time and compressed response size for product lists of several lengths'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10_000], help='Products per list')
+		parser.add_argument('--repeat', type=int, default=20, help='Timed renders per list and renderer (median reported)')
+
+	def handle(self, *args, **options):
+		sizes = options['sizes']
+		request = Request(APIRequestFactory().get('/api/products/'))
+		with tempfile.TemporaryDirectory() as tmp:
+			with benchmark_database(name=os.path.join(tmp, 'bench_render.sqlite3')):
+				seed_products(max(sizes), seller=User.objects.create_user('bench-seller', is_staff=True))
+				# Variant URLs for every product, like ingested images
+				Product.objects.update(image_hash='0' * 32, image_width=1280)
+				lists = {}
+				for size in sizes:
+					products = list(Product.objects.select_related('seller').order_by('-created_at', 'id')[:size])
+					serialize = lambda: ProductSerializer(products, many=True, context={'request': request}).data
+					lists[size] = serialize(), summarize(timed(serialize, max(1, options['repeat'] // 4)))['p50_ms']
+
+		self.stdout.write(f'{"items":>7}{"serialize":>12}' + ''.join(f'{name:>12}' for name, _ in RENDERERS) + f'{"speedup":>9}')
+		for size, (data, serialize_ms) in lists.items():
+			medians = [summarize(timed(lambda: renderer.render(data), options['repeat']))['p50_ms'] for _, renderer in RENDERERS]
+			self.stdout.write(
+				f'{size:>7}{serialize_ms:>10.1f}ms' + ''.join(f'{median:>10.2f}ms' for median in medians)
+				+ f'{medians[0] / medians[1]:>8.1f}x'
+			)
+
+		encodings = ['identity', 'gzip'] + (['br'] if brotli else [])
+		self.stdout.write('\n' + f'{"items":>7}' + ''.join(f'{encoding:>12}{"time":>9}' for encoding in encodings))
+		for size, (data, _) in lists.items():
+			body = ORJSONRenderer().render(data)
+			row = f'{size:>7}{len(body) / 1024:>10.1f}KB{"":>9}'
+			for encoding in encodings[1:]:
+				compressed = compress(body, encoding)
+				seconds = summarize(timed(lambda: compress(body, encoding), max(1, options['repeat'] // 4)))['p50_ms']
+				row += f'{len(compressed) / 1024:>10.1f}KB{seconds:>7.1f}ms'
+			self.stdout.write(row)
+		if not brotli:
+			self.stdout.write('brotli is not installed; pip install brotli to compare it')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from app.benchmarks import benchmark_database, seed_products, summarize, timed
+from app.models import Product
+from app.search import icontains_search, search_index_available, search_products
+
+
+DEFAULT_QUERIES = ['phone', 'wireless headphones', 'samsung', 'cotton shirt', 'noresultsforthis']
+
+
+class Command(BaseCommand):
+	help = 'Compare ?search= latency for the full-text index against the icontains scan'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+		parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES)
+		parser.add_argument('--repeat', type=int, default=20)
+		parser.add_argument('--page-size', type=int, default=24)
+
+	def handle(self, *args, **options):
+		page_size = options['page_size']
+		with benchmark_database() as connection:
+			if not search_index_available(connection):
+				self.stderr.write('No full-text index on this database; both paths will use icontains.')
+			seeded = 0
+			for size in sorted(options['sizes']):
+				self.stdout.write(f'Seeding {size - seeded} products...')
+				seed_products(size - seeded, start=seeded)
+				seeded = size
+
+				self.stdout.write(f'\n{size} products')
+				self.stdout.write(f'{"query":<24}{"icontains p50":>16}{"fts p50":>12}{"icontains p95":>16}{"fts p95":>12}{"speedup":>10}')
+				for query in options['queries']:
+					base = Product.objects.all()
+					scan = summarize(timed(
+						lambda: list(icontains_search(base, query).order_by('-created_at')[:page_size]),
+						options['repeat'],
+					))
+					fts = summarize(timed(
+						lambda: list(search_products(base, query)[:page_size]),
+						options['repeat'],
+					))
+					speedup = scan['p50_ms'] / fts['p50_ms'] if fts['p50_ms'] else 0
+					self.stdout.write(
+						f'{query:<24}{scan["p50_ms"]:>14.2f}ms{fts["p50_ms"]:>10.2f}ms'
+						f'{scan["p95_ms"]:>14.2f}ms{fts["p95_ms"]:>10.2f}ms{speedup:>9.1f}x'
+					)
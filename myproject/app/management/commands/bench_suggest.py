@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarks import benchmark_database, seed_products, summarize, timed
+from app.models import Product
+from app.search import search_products
+from app.suggest import build_index, load_snapshot, save_snapshot
+
+
+DEFAULT_QUERIES = ['samsung wireless', 'phone', 'wireless headphones', 'leather jacket', 'noresultsforthis']
+
+
+class Command(BaseCommand):
+	help = 'Time typeahead lookups in the suggest index against a ?search= query per keystroke'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--products', type=int, default=100_000)
+		parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES)
+		parser.add_argument('--repeat', type=int, default=200, help='Timed lookups per keystroke (search runs a tenth as many)')
+		parser.add_argument('--limit', type=int, default=10)
+
+	def handle(self, *args, **options):
+		limit = options['limit']
+		with benchmark_database():
+			self.stdout.write(f'Seeding {options["products"]} products...')
+			seed_products(options['products'])
+			start = time.perf_counter()
+			index = build_index()
+			self.stdout.write(f'Built the index ({len(index.keys)} keys) in {time.perf_counter() - start:.2f}s')
+			with tempfile.TemporaryDirectory() as tmp:
+				path = os.path.join(tmp, 'suggest_index.bin')
+				size = save_snapshot(index, path)
+				load = summarize(timed(lambda: load_snapshot(path), 3))
+				self.stdout.write(f'Snapshot {size / 1024:.0f}KB, loaded in {load["p50_ms"]:.0f}ms\n')
+
+				self.stdout.write(f'{"keystrokes":<24}{"first":>10}{"p50":>10}{"p99":>10}{"search p50":>13}')
+				for query in options['queries']:
+					prefixes = [query[:end] for end in range(1, len(query) + 1) if query[end - 1] != ' ']
+					# As a worker sees them after start-up, before anything is memoized on demand
+					index = load_snapshot(path)
+					first = summarize(timed(lambda: [index.suggest(prefix, limit) for prefix in prefixes], 1))['p50_ms'] / len(prefixes)
+					samples = []
+					for prefix in prefixes:
+						samples += timed(lambda: index.suggest(prefix, limit), options['repeat'])
+					lookups = summarize(samples)
+					searches = []
+					for prefix in prefixes:
+						searches += timed(lambda: list(search_products(Product.objects.all(), prefix)[:limit]), max(1, options['repeat'] // 10))
+					self.stdout.write(
+						f'{query:<24}{first:>8.3f}ms{lookups["p50_ms"]:>8.3f}ms{lookups["p99_ms"]:>8.3f}ms'
+						f'{summarize(searches)["p50_ms"]:>11.2f}ms'
+					)
@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.suggest import build_index, save_snapshot
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the typeahead index from the database, recounting popularity, and write the snapshot workers load at start-up'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--output', help=f'Snapshot file (default: SUGGEST_INDEX_PATH, {settings.SUGGEST_INDEX_PATH})')
+
+	def handle(self, *args, **options):
+		start = time.perf_counter()
+		index = build_index()
+		size = save_snapshot(index, options['output'])
+		self.stdout.write(
+			f'Indexed {len(index.products)} products under {len(index.keys)} keys '
+			f'in {time.perf_counter() - start:.1f}s; snapshot {size / 1024:.0f}KB'
+		)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.cache import cache_stats, catalog_version, reset_cache_stats
+
+
+class Command(BaseCommand):
+	help = 'Show hit/miss counts of the catalog response cache (shared cache backends only)'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+	def handle(self, *args, **options):
+		stats = cache_stats()
+		self.stdout.write(f"version:  {catalog_version()}")
+		self.stdout.write(f"hits:     {stats['hits']}")
+		self.stdout.write(f"misses:   {stats['misses']}")
+		self.stdout.write(f"hit rate: {stats['hit_rate']:.1%}")
+		if options['reset']:
+			reset_cache_stats()
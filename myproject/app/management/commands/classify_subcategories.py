@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from app.classifier import classify_subcategories
+
+
+class Command(BaseCommand):
+	help = 'Assign subcategories to products that have none, from keywords in their name and description'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help='Products read and written per batch')
+		parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+
+	def handle(self, *args, **options):
+		def report_batch(stats, matched):
+			if options['verbosity'] > 1:
+				for product in matched:
+					self.stdout.write(f'{product.name} -> {product.subcategory}')
+
+		stats = classify_subcategories(
+			batch_size=options['batch_size'],
+			dry_run=options['dry_run'],
+			on_batch=report_batch,
+		)
+
+		for subcategory, count in sorted(stats['subcategories'].items()):
+			self.stdout.write(f'{subcategory:<20}{count:>8}')
+		rate = stats['scanned'] / stats['seconds'] if stats['seconds'] else 0
+		verb = 'would be updated' if options['dry_run'] else 'updated'
+		self.stdout.write(
+			f"{stats['updated']} of {stats['scanned']} products {verb} "
+			f"in {stats['seconds']:.2f}s ({rate:.0f} products/s)"
+		)
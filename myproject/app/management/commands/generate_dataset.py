@@ -0,0 +1,56 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app.datasets import DEFAULT_UNTIL, generate_dataset
+
+
+class Command(BaseCommand):
+	help = 'Fill the database with a large, reproducible synthetic dataset of users, products, carts and orders'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--products', type=int, default=10_000)
+		parser.add_argument('--users', type=int, default=1_000)
+		parser.add_argument('--orders', type=int, default=10_000)
+		parser.add_argument('--carts', type=int, help='Users with a non-empty cart (default: one in five)')
+		parser.add_argument('--sellers', type=int, default=20)
+		parser.add_argument('--seed', type=int, default=0, help='Same seed and arguments, same rows')
+		parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of product popularity')
+		parser.add_argument('--days', type=int, default=365, help='History covered by the timestamps')
+		parser.add_argument('--until', type=datetime.fromisoformat, default=DEFAULT_UNTIL, help='Latest timestamp (ISO date)')
+		parser.add_argument('--prefix', default='dataset', help='Prefix of generated usernames and SKUs')
+		parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT and per transaction')
+
+	def handle(self, *args, **options):
+		prefix = options['prefix']
+		if User.objects.filter(username__startswith=f'{prefix}-').exists():
+			raise CommandError(f'Users named {prefix}-* already exist; pass another --prefix')
+		until = options['until']
+		if until.tzinfo is None:
+			until = until.replace(tzinfo=dt_timezone.utc)
+
+		def report_batch(table, done, total):
+			if options['verbosity'] > 1:
+				self.stdout.write(f'{table}: {done}' + (f' of {total}' if total else ''))
+
+		stats = generate_dataset(
+			products=options['products'],
+			users=options['users'],
+			orders=options['orders'],
+			carts=options['carts'],
+			sellers=options['sellers'],
+			seed=options['seed'],
+			skew=options['skew'],
+			days=options['days'],
+			until=until,
+			prefix=prefix,
+			batch_size=options['batch_size'],
+			on_batch=report_batch,
+		)
+
+		seconds = stats.pop('seconds')
+		for table, count in stats.items():
+			self.stdout.write(f'{table:<14}{count:>12}')
+		rate = sum(stats.values()) / seconds if seconds else 0
+		self.stdout.write(f'{sum(stats.values())} rows in {seconds:.1f}s ({rate:.0f} rows/s)')
@@ -0,0 +1,63 @@
+import os
+import sys
+from contextlib import nullcontext
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog_import import import_products, read_rows
+
+
+class Command(BaseCommand):
+	help = 'Stream a CSV or JSONL product feed into the catalog, upserting by (seller, sku)'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help="Feed file, or '-' for stdin")
+		parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+		parser.add_argument('--seller', default='seller', help='Username that owns the imported products')
+		parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT and per transaction')
+		parser.add_argument('--dry-run', action='store_true', help='Validate the feed without writing')
+		parser.add_argument('--show-errors', type=int, default=20, help='Invalid rows to print before going quiet')
+
+	def handle(self, *args, **options):
+		path = options['path']
+		feed_format = options['format']
+		if feed_format is None:
+			extension = os.path.splitext(path)[1].lstrip('.').lower()
+			if extension not in ('csv', 'jsonl'):
+				raise CommandError('Pass --format csv or --format jsonl')
+			feed_format = extension
+		try:
+			seller = User.objects.get(username=options['seller'])
+		except User.DoesNotExist:
+			raise CommandError(f"Seller {options['seller']!r} does not exist")
+
+		shown = []
+
+		def report_error(line, error):
+			if len(shown) < options['show_errors']:
+				shown.append(line)
+				self.stderr.write(f'line {line}: {"; ".join(error.messages)}')
+
+		def report_batch(stats):
+			if options['verbosity'] > 1:
+				self.stdout.write(f"{stats['imported']} rows ({stats['imported'] / stats['seconds']:.0f} rows/s)")
+
+		# utf-8-sig drops the BOM spreadsheet exports put in front of the header
+		stream = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig')
+		with stream as feed:
+			stats = import_products(
+				read_rows(feed, feed_format),
+				seller,
+				batch_size=options['batch_size'],
+				dry_run=options['dry_run'],
+				on_error=report_error,
+				on_batch=report_batch,
+			)
+
+		rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+		verb = 'validated' if options['dry_run'] else 'imported'
+		self.stdout.write(
+			f"{stats['imported']} rows {verb}, {stats['invalid']} invalid "
+			f"in {stats['seconds']:.2f}s ({rate:.0f} rows/s)"
+		)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.images import attach_images, find_sources, generate_all
+
+
+class Command(BaseCommand):
+	help = 'Generate WebP/JPEG variants of local product images and attach them to products'
+
+	def add_arguments(self, parser):
+		parser.add_argument('paths', nargs='+', help='Image files or directories of images')
+		parser.add_argument('--key', choices=['sku', 'id', 'name'], default='sku', help='Product field each file name (without extension) matches')
+		parser.add_argument('--workers', type=int, default=None, help='Encoder processes (default: one per CPU)')
+		parser.add_argument('--no-attach', action='store_true', help='Only generate variants')
+
+	def handle(self, *args, **options):
+		try:
+			import PIL  # noqa: F401
+		except ImportError:
+			raise CommandError('ingest_images needs Pillow (pip install Pillow)')
+
+		sources = list(find_sources(options['paths']))
+		if not sources:
+			raise CommandError('No images found')
+
+		start = time.perf_counter()
+		results = []
+		for result in generate_all(sources, workers=options['workers']):
+			results.append(result)
+			if options['verbosity'] > 1:
+				state = 'cached' if result['cached'] else 'generated'
+				self.stdout.write(f"{result['source']} -> {result['hash']} ({state})")
+		elapsed = time.perf_counter() - start
+
+		generated = sum(1 for result in results if not result['cached'])
+		source_bytes = sum(result['bytes'] for result in results)
+		variant_bytes = sum(sum(result['variants'].values()) for result in results)
+		self.stdout.write(
+			f'{len(results)} images ({generated} generated, {len(results) - generated} cached) '
+			f'in {elapsed:.2f}s ({len(results) / elapsed:.1f} images/s); '
+			f'{source_bytes / 1e6:.1f} MB of sources, {variant_bytes / 1e6:.1f} MB of variants'
+		)
+
+		if not options['no_attach']:
+			missing = attach_images(results, key=options['key'])
+			if missing:
+				self.stderr.write(f"{len(missing)} files matched no product by {options['key']}: {', '.join(missing[:20])}")
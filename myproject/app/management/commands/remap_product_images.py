@@ -0,0 +1,52 @@
+import os
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.images import load_image_mapping, remap_product_images
+
+
+class Command(BaseCommand):
+	help = 'Re-point product images to new URLs from a name -> URL mapping file (CSV or JSON)'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help="Mapping file, or '-' for stdin")
+		parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension')
+		parser.add_argument('--batch-size', type=int, default=500, help='Names resolved and rows written per query')
+		parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+		parser.add_argument('--show-missing', type=int, default=20, help='Unmatched names to list')
+
+	def handle(self, *args, **options):
+		path = options['path']
+		mapping_format = options['format']
+		if mapping_format is None:
+			extension = os.path.splitext(path)[1].lstrip('.').lower()
+			if extension not in ('csv', 'json'):
+				raise CommandError('Pass --format csv or --format json')
+			mapping_format = extension
+
+		stream = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig')
+		with stream as source:
+			try:
+				mapping = load_image_mapping(source, mapping_format)
+			except (KeyError, ValueError) as exc:
+				raise CommandError(f'Could not read mapping: {exc}')
+
+		stats = remap_product_images(mapping, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+		for name, errors in list(stats['invalid'].items())[:options['show_missing']]:
+			self.stderr.write(f'invalid URL for {name!r}: {"; ".join(errors)}')
+		missing = stats['missing']
+		if missing:
+			shown = ', '.join(repr(name) for name in missing[:options['show_missing']])
+			more = f' and {len(missing) - options["show_missing"]} more' if len(missing) > options['show_missing'] else ''
+			self.stderr.write(f'{len(missing)} names matched no product: {shown}{more}')
+
+		rate = stats['mappings'] / stats['seconds'] if stats['seconds'] else 0
+		verb = 'would be updated' if options['dry_run'] else 'updated'
+		self.stdout.write(
+			f"{stats['updated']} products {verb}, {stats['unchanged']} already current, "
+			f"{len(missing)} names missing, {len(stats['invalid'])} invalid URLs "
+			f"in {stats['seconds']:.2f}s ({rate:.0f} mappings/s)"
+		)
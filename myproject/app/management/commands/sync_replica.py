@@ -0,0 +1,33 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+	help = "Copy the SQLite database to the replica with SQLite's online backup, standing in for replication locally"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--interval', type=float, help='Keep copying every this many seconds, to simulate replication lag')
+
+	def handle(self, *args, **options):
+		if not settings.REPLICA_DATABASE:
+			raise CommandError('No replica database; set DJANGO_DB_REPLICA to its file name')
+		primary = connections[DEFAULT_DB_ALIAS]
+		if primary.vendor != 'sqlite':
+			raise CommandError(f'Use the replication built into {primary.display_name}')
+
+		while True:
+			start = time.perf_counter()
+			primary.ensure_connection()
+			target = sqlite3.connect(connections[settings.REPLICA_DATABASE].settings_dict['NAME'])
+			try:
+				primary.connection.backup(target)
+			finally:
+				target.close()
+			self.stdout.write(f'Copied to the replica in {(time.perf_counter() - start) * 1000:.0f}ms')
+			if not options['interval']:
+				return
+			time.sleep(options['interval'])
@@ -0,0 +1,313 @@
+"""
+Per-endpoint request metrics in the Prometheus text format.
+
+MetricsMiddleware labels every request with its resolved URL name and
+records latency, status, database queries and query time, serializer time
+and response size, under WSGI and ASGI alike. Each
+process keeps its numbers in memory and, when METRICS_DIR is set, writes a
+snapshot to its own file there at most every METRICS_FLUSH_INTERVAL
+seconds; /api/metrics/ adds up the snapshots of every worker, so whichever
+worker answers the scrape reports the whole server. Recording a request is
+a handful of dictionary updates.
+
+Snapshots of exited workers are kept so counters never go backwards, so
+METRICS_DIR must belong to one deploy of the server: tests and benchmarks
+run with it unset, and a process that served nothing writes no file.
+"""
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import cache_stats
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+	'api_request_duration_seconds': ('histogram', 'Request latency by URL name and method'),
+	'api_requests_total': ('counter', 'Requests by URL name, method and status'),
+	'api_db_queries_total': ('counter', 'Database queries run by requests'),
+	'api_db_query_seconds_total': ('counter', 'Time spent in database queries'),
+	'api_serializer_seconds_total': ('counter', 'Time spent producing serializer data'),
+	'api_response_bytes_total': ('counter', 'Response body bytes'),
+	'catalog_cache_hits_total': ('counter', 'Catalog response cache hits'),
+	'catalog_cache_misses_total': ('counter', 'Catalog response cache misses'),
+}
+
+# Metrics of the request being handled, for the query and serializer hooks
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+	__slots__ = ('queries', 'query_seconds', 'serializer_seconds')
+
+	def __init__(self):
+		self.queries = 0
+		self.query_seconds = 0.0
+		self.serializer_seconds = 0.0
+
+
+def count_queries(execute, sql, params, many, context):
+	"""Execute wrapper on every connection, charging queries to the current request."""
+	# The context is copied into sync_to_async threads, so async ORM queries count too
+	metrics = current.get()
+	if metrics is None:
+		return execute(sql, params, many, context)
+	start = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		metrics.queries += 1
+		metrics.query_seconds += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+	# connection_created receiver. First in the list, so that
+	# connection.execute_wrapper() blocks, which pop the last wrapper, leave it alone.
+	if count_queries not in connection.execute_wrappers:
+		connection.execute_wrappers.insert(0, count_queries)
+
+
+class Registry:
+	"""This process's counters and histograms, keyed by ``(name, labels)``."""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.flush_lock = threading.Lock()
+		self.path = None
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.counters = {}
+			# (name, labels) -> [count per bucket (the last is +Inf), sum]
+			self.histograms = {}
+			self.flushed = time.monotonic()
+
+	def record(self, view, method, status, seconds, metrics, response_bytes):
+		labels = (('view', view),)
+		key = ('api_request_duration_seconds', labels + (('method', method),))
+		with self.lock:
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+			histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+			histogram[-1] += seconds
+			for name, series, amount in (
+				('api_requests_total', labels + (('method', method), ('status', str(status))), 1),
+				('api_db_queries_total', labels, metrics.queries),
+				('api_db_query_seconds_total', labels, metrics.query_seconds),
+				('api_serializer_seconds_total', labels, metrics.serializer_seconds),
+				('api_response_bytes_total', labels, response_bytes),
+			):
+				self.counters[(name, series)] = self.counters.get((name, series), 0) + amount
+			due = time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL
+		if due:
+			self.flush()
+
+	def snapshot(self):
+		with self.lock:
+			return {
+				'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+				'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+			}
+
+	def flush(self):
+		"""Write this process's snapshot to METRICS_DIR, replacing the previous one."""
+		directory = settings.METRICS_DIR
+		# Nothing recorded (e.g. a management command): leave no file behind
+		if not directory or not (self.counters or self.histograms):
+			return
+		# Another thread flushing now writes the same data
+		if not self.flush_lock.acquire(blocking=False):
+			return
+		try:
+			self.flushed = time.monotonic()
+			if self.path is None or self.path.parent != Path(directory):
+				# pid plus start time, so a recycled pid never overwrites a dead worker's file
+				self.path = Path(directory) / f'{os.getpid()}-{time.time_ns()}.json'
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			temporary = self.path.with_suffix('.tmp')
+			temporary.write_text(json.dumps(self.snapshot()))
+			os.replace(temporary, self.path)
+		finally:
+			self.flush_lock.release()
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def read_snapshots(directory):
+	for path in sorted(Path(directory).glob('*.json')):
+		try:
+			yield json.loads(path.read_text())
+		except (OSError, ValueError):
+			# Removed while being listed
+			continue
+
+
+def collect():
+	"""Every worker's counters and histograms, summed."""
+	if settings.METRICS_DIR:
+		registry.flush()
+		snapshots = read_snapshots(settings.METRICS_DIR)
+	else:
+		snapshots = [registry.snapshot()]
+
+	counters = {}
+	histograms = {}
+	for snapshot in snapshots:
+		for name, labels, value in snapshot['counters']:
+			key = (name, tuple(map(tuple, labels)))
+			counters[key] = counters.get(key, 0) + value
+		for name, labels, values in snapshot['histograms']:
+			key = (name, tuple(map(tuple, labels)))
+			total = histograms.setdefault(key, [0] * len(values))
+			for index, value in enumerate(values):
+				total[index] += value
+
+	stats = cache_stats()
+	counters[('catalog_cache_hits_total', ())] = stats['hits']
+	counters[('catalog_cache_misses_total', ())] = stats['misses']
+	return counters, histograms
+
+
+def format_labels(labels):
+	if not labels:
+		return ''
+	escaped = (
+		(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+		for name, value in labels
+	)
+	return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render_metrics():
+	"""All metrics in the Prometheus text exposition format (version 0.0.4)."""
+	counters, histograms = collect()
+	by_name = {}
+	for (name, labels), value in itertools.chain(counters.items(), histograms.items()):
+		by_name.setdefault(name, []).append((labels, value))
+
+	lines = []
+	for name, (kind, help_text) in METRICS.items():
+		lines.append(f'# HELP {name} {help_text}')
+		lines.append(f'# TYPE {name} {kind}')
+		for labels, value in sorted(by_name.get(name, [])):
+			if kind == 'histogram':
+				cumulative = 0
+				for bound, count in zip([*LATENCY_BUCKETS, '+Inf'], value[:-1]):
+					cumulative += count
+					lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+				lines.append(f'{name}_sum{format_labels(labels)} {value[-1]}')
+				lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+			else:
+				lines.append(f'{name}{format_labels(labels)} {value}')
+	return '\n'.join(lines) + '\n'
+
+
+def serializer_data(serializer):
+	"""
+	``serializer.data``, charged to the current request's serializer time.
+	Views call it for the top-level serializer of their response; nested
+	serializers run inside it and are counted with their parent.
+	"""
+	metrics = current.get()
+	if metrics is None:
+		return serializer.data
+	start = time.perf_counter()
+	try:
+		return serializer.data
+	finally:
+		metrics.serializer_seconds += time.perf_counter() - start
+
+
+class SerializerTimingMixin:
+	"""
+	DRF's generic list, retrieve, create and update, with the response's
+	``serializer.data`` timed by serializer_data().
+	"""
+
+	def list(self, request, *args, **kwargs):
+		queryset = self.filter_queryset(self.get_queryset())
+		page = self.paginate_queryset(queryset)
+		if page is not None:
+			return self.get_paginated_response(serializer_data(self.get_serializer(page, many=True)))
+		return Response(serializer_data(self.get_serializer(queryset, many=True)))
+
+	def retrieve(self, request, *args, **kwargs):
+		return Response(serializer_data(self.get_serializer(self.get_object())))
+
+	def create(self, request, *args, **kwargs):
+		serializer = self.get_serializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		self.perform_create(serializer)
+		data = serializer_data(serializer)
+		return Response(data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(data))
+
+	def update(self, request, *args, **kwargs):
+		partial = kwargs.pop('partial', False)
+		instance = self.get_object()
+		serializer = self.get_serializer(instance, data=request.data, partial=partial)
+		serializer.is_valid(raise_exception=True)
+		self.perform_update(serializer)
+		if getattr(instance, '_prefetched_objects_cache', None):
+			# Like DRF: prefetched relations may be stale after the update
+			instance._prefetched_objects_cache = {}
+		return Response(serializer_data(serializer))
+
+
+class MetricsMiddleware:
+	"""Record every request under the name of the URL pattern it resolved to."""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+		metrics = RequestMetrics()
+		token = current.set(metrics)
+		start = time.perf_counter()
+		try:
+			response = self.get_response(request)
+		finally:
+			current.reset(token)
+		self.record(request, response, time.perf_counter() - start, metrics)
+		return response
+
+	async def __acall__(self, request):
+		metrics = RequestMetrics()
+		token = current.set(metrics)
+		start = time.perf_counter()
+		try:
+			response = await self.get_response(request)
+		finally:
+			current.reset(token)
+		self.record(request, response, time.perf_counter() - start, metrics)
+		return response
+
+	def record(self, request, response, seconds, metrics):
+		match = request.resolver_match
+		if response.streaming:
+			response_bytes = int(response.get('Content-Length') or 0)
+		else:
+			response_bytes = len(response.content)
+		registry.record(match.view_name if match else 'unmatched', request.method, response.status_code, seconds, metrics, response_bytes)
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:01
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+
+
+# Upper bounds of Product.PRICE_BANDS at the time; inlined so the
+# migration doesn't change with app.facets
+PRICE_BAND_BOUNDS = [1000, 5000, 20000, 50000]
+
+
+def rebuild_facets(Product, ProductFacet):
+    price_band = Case(
+        *[When(price__lt=upper, then=Value(index)) for index, upper in enumerate(PRICE_BAND_BOUNDS)],
+        default=Value(len(PRICE_BAND_BOUNDS)),
+        output_field=models.IntegerField(),
+    )
+    rows = (
+        Product.objects.order_by()
+        .annotate(price_band=price_band)
+        .values_list('category', 'subcategory', 'price_band')
+        .annotate(count=Count('id'))
+    )
+    ProductFacet.objects.all().delete()
+    ProductFacet.objects.bulk_create([
+        ProductFacet(category=category, subcategory=subcategory, price_band=price_band, count=count)
+        for category, subcategory, price_band, count in rows
+    ])
+
+
+def count_existing_products(apps, schema_editor):
+    rebuild_facets(apps.get_model('app', 'Product'), apps.get_model('app', 'ProductFacet'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('subcategory', models.CharField(blank=True, max_length=50)),
+                ('price_band', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'subcategory', 'price_band'), name='unique_product_facet')],
+            },
+        ),
+        migrations.RunPython(count_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+from django.db.models.functions import Lower, Trim
+
+
+# Upper bounds of Product.PRICE_BANDS at the time; inlined so the
+# migration doesn't change with app.facets
+PRICE_BAND_BOUNDS = [1000, 5000, 20000, 50000]
+
+
+def rebuild_facets(Product, ProductFacet):
+    price_band = Case(
+        *[When(price__lt=upper, then=Value(index)) for index, upper in enumerate(PRICE_BAND_BOUNDS)],
+        default=Value(len(PRICE_BAND_BOUNDS)),
+        output_field=models.IntegerField(),
+    )
+    rows = (
+        Product.objects.order_by()
+        .annotate(price_band=price_band)
+        .values_list('category', 'subcategory', 'price_band')
+        .annotate(count=Count('id'))
+    )
+    ProductFacet.objects.all().delete()
+    ProductFacet.objects.bulk_create([
+        ProductFacet(category=category, subcategory=subcategory, price_band=price_band, count=count)
+        for category, subcategory, price_band, count in rows
+    ])
+
+
+def canonicalize_choices(apps, schema_editor):
+    # Filters now match category/subcategory exactly, so fold legacy mixed-case values
+    Product = apps.get_model('app', 'Product')
+    Product.objects.update(category=Lower(Trim('category')), subcategory=Lower(Trim('subcategory')))
+    rebuild_facets(Product, apps.get_model('app', 'ProductFacet'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_product_facets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_choices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['subcategory', '-created_at'], name='product_sub_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'subcategory', 'price'], name='product_cat_sub_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+    ]
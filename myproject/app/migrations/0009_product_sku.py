@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+# The search index triggers as created by 0005, inlined so this migration
+# doesn't change with app.search
+FTS_TABLE = 'app_product_fts'
+SEARCH_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON app_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON app_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON app_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+
+def backfill_skus(apps, schema_editor):
+    # The old seed scripts identified products by name; key existing rows the
+    # same way so re-running them through import_products updates in place.
+    Product = apps.get_model('app', 'Product')
+    seen = set()
+    products = []
+    for product in Product.objects.order_by('id').only('id', 'seller_id', 'name'):
+        sku = slugify(product.name)[:64]
+        if sku and (product.seller_id, sku) not in seen:
+            seen.add((product.seller_id, sku))
+            product.sku = sku
+            products.append(product)
+    Product.objects.bulk_update(products, ['sku'], batch_size=500)
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # Adding the constraint rebuilds app_product on SQLite, dropping its triggers
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        for statement in SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_product_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_skus, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('seller', 'sku'), name='unique_product_seller_sku'),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
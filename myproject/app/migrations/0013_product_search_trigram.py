@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+# The search index of 0005 matched whole words and word prefixes only, so
+# ?search=phone stopped finding "Headphones". The trigram tokenizer (SQLite
+# 3.34+) indexes every three characters, so any substring of three or more
+# matches again. Inlined so the migration doesn't change with app.search.
+FTS_TABLE = 'app_product_fts'
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON app_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON app_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON app_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+TRIGRAM = "tokenize='trigram'"
+WORDS = "tokenize='unicode61 remove_diacritics 2'"
+
+
+def supports(schema_editor, tokenize):
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(f'CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, {tokenize})')
+            cursor.execute('DROP TABLE temp._fts5_probe')
+            return True
+        except Exception:
+            return False
+
+
+def recreate_index(schema_editor, tokenize):
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    # Without a usable tokenizer search falls back to a substring scan
+    if not supports(schema_editor, tokenize):
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, description, content='app_product', content_rowid='id', {tokenize})"
+    )
+    for statement in TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        recreate_index(schema_editor, TRIGRAM)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        recreate_index(schema_editor, WORDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_order_item_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -1,6 +1,11 @@
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
 
+from .filters import canonical_choice
+
+
 class Product(models.Model):
 	CATEGORY_ELECTRONICS = 'electronics'
 	CATEGORY_FASHION = 'fashion'
@@ -38,7 +43,18 @@ class Product(models.Model):
 		('fragrances', 'Fragrances'),
 	]
 
+	# Price bands for facet counts: (lower bound inclusive, upper bound exclusive, label)
+	PRICE_BANDS = [
+		(0, 1000, 'Under ₹1,000'),
+		(1000, 5000, '₹1,000 - ₹5,000'),
+		(5000, 20000, '₹5,000 - ₹20,000'),
+		(20000, 50000, '₹20,000 - ₹50,000'),
+		(50000, None, '₹50,000 and above'),
+	]
+
 	seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products', null=True, blank=True)
+	# Seller's own identifier; the natural key for catalog imports
+	sku = models.CharField(max_length=64, null=True, blank=True)
 	name = models.CharField(max_length=200)
 	description = models.TextField(blank=True)
 	price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -46,12 +62,94 @@ class Product(models.Model):
 	subcategory = models.CharField(max_length=50, choices=SUBCATEGORY_CHOICES, blank=True)
 	stock = models.IntegerField(default=0)
 	image = models.URLField(blank=True)
+	# Locally generated variants (see app/images.py): content hash and width of the source
+	image_hash = models.CharField(max_length=32, blank=True, default='')
+	image_width = models.PositiveIntegerField(null=True, blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	class Meta:
+		indexes = [
+			# Keyset pagination order for the product list
+			models.Index(fields=['-created_at', 'id'], name='product_created_id_idx'),
+			# Filter shapes used by ProductListCreateView (see app/filters.py)
+			models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+			models.Index(fields=['subcategory', '-created_at'], name='product_sub_created_idx'),
+			models.Index(fields=['category', 'subcategory', 'price'], name='product_cat_sub_price_idx'),
+			models.Index(fields=['price'], name='product_price_idx'),
+			# Name lookups from the catalog maintenance commands
+			models.Index(fields=['name'], name='product_name_idx'),
+		]
+		constraints = [
+			models.UniqueConstraint(fields=['seller', 'sku'], name='unique_product_seller_sku'),
+		]
+
 	def __str__(self):
 		return f"{self.name} ({self.seller.username})"
 
+	def save(self, *args, **kwargs):
+		# Store choice values in canonical lowercase so lookups can be exact
+		self.category = canonical_choice(self.category)
+		self.subcategory = canonical_choice(self.subcategory)
+		super().save(*args, **kwargs)
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# Keep the stored facet fields for the save/delete signals (see
+		# app/signals.py); the band is only worked out there, not per row read.
+		loaded = instance.__dict__
+		if 'category' in loaded and 'subcategory' in loaded and 'price' in loaded:
+			instance._stored_facet = (loaded['category'], loaded['subcategory'], loaded['price'])
+		return instance
+
+	@classmethod
+	def band_of(cls, price):
+		price = Decimal(str(price))
+		for index, (lower, upper, label) in enumerate(cls.PRICE_BANDS):
+			if upper is None or price < upper:
+				return index
+
+	@property
+	def price_band(self):
+		return self.band_of(self.price)
+
+	def facet_key(self):
+		return (self.category, self.subcategory, self.price_band)
+
+	def remember_facet(self):
+		self._stored_facet = (self.category, self.subcategory, self.price)
+
+	def stored_facet_key(self):
+		"""The facet the stored row is counted under, if known."""
+		stored = getattr(self, '_stored_facet', None)
+		if stored is None:
+			return None
+		category, subcategory, price = stored
+		return (category, subcategory, self.band_of(price))
+
+
+class ProductFacet(models.Model):
+	"""
+	Number of products per (category, subcategory, price band).
+
+	Maintained incrementally by signals on Product (see app/facets.py) so
+	facet counts are read from a few hundred rows instead of a GROUP BY
+	over the catalog.
+	"""
+	category = models.CharField(max_length=50, blank=True)
+	subcategory = models.CharField(max_length=50, blank=True)
+	price_band = models.PositiveSmallIntegerField()
+	count = models.IntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['category', 'subcategory', 'price_band'], name='unique_product_facet'),
+		]
+
+	def __str__(self):
+		return f"{self.category}/{self.subcategory}/{self.price_band}: {self.count}"
+
 
 class Cart(models.Model):
 	user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
@@ -107,16 +205,42 @@ class Order(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	class Meta:
+		indexes = [
+			# Keyset pagination order for a user's order history
+			models.Index(fields=['user', '-created_at', 'id'], name='order_user_created_id_idx'),
+		]
+
 	def __str__(self):
 		return f"Order #{self.id} by {self.user.username}"
 
 
 class OrderItem(models.Model):
+	# Product fields copied at checkout, so order history renders without
+	# joining products or sellers and survives their deletion
+	SNAPSHOT_FIELDS = ['product_name', 'product_category', 'product_image', 'product_image_hash', 'product_image_width', 'seller_id']
+
 	order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
 	product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
 	quantity = models.IntegerField(default=1)
 	price = models.DecimalField(max_digits=10, decimal_places=2)
+	product_name = models.CharField(max_length=200, blank=True, default='')
+	product_category = models.CharField(max_length=50, blank=True, default='')
+	product_image = models.URLField(blank=True, default='')
+	product_image_hash = models.CharField(max_length=32, blank=True, default='')
+	product_image_width = models.PositiveIntegerField(null=True, blank=True)
+	# Plain id rather than a foreign key: history outlives sellers too
+	seller_id = models.IntegerField(null=True, blank=True)
 
 	def __str__(self):
-		return f"{self.product.name} x {self.quantity} in Order #{self.order.id}"
+		return f"{self.product_name} x {self.quantity} in Order #{self.order_id}"
+
+	def capture(self, product):
+		"""Copy ``product``'s snapshot fields onto this line."""
+		self.product_name = product.name
+		self.product_category = product.category
+		self.product_image = product.image
+		self.product_image_hash = product.image_hash
+		self.product_image_width = product.image_width
+		self.seller_id = product.seller_id
 
@@ -0,0 +1,171 @@
+import base64
+import datetime
+import decimal
+import json
+import math
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+	"""
+	Cursor pagination that seeks on the queryset's full ORDER BY.
+
+	Unlike offset pagination (and DRF's CursorPagination, which falls back to
+	offsets for ties) every page is a single index range scan, so page 1000
+	costs the same as page 1. The queryset ordering must end in a unique
+	column; ``id`` is appended when it doesn't.
+	"""
+	page_size = 24
+	max_page_size = 100
+	page_size_query_param = 'page_size'
+	cursor_query_param = 'cursor'
+	default_ordering = ('-created_at', 'id')
+	invalid_cursor_message = 'Invalid cursor'
+
+	def paginate_queryset(self, queryset, request, view=None):
+		return self.set_page(list(self.page_queryset(queryset, request)))
+
+	async def apaginate_queryset(self, queryset, request, view=None):
+		return self.set_page([instance async for instance in self.page_queryset(queryset, request).aiterator()])
+
+	def page_queryset(self, queryset, request):
+		"""The query for the requested page, plus one row to tell if there is more."""
+		self.request = request
+		self.page_size = self.get_page_size(request)
+		self.model = queryset.model
+		self.ordering = self.get_ordering(queryset)
+
+		self.values, self.reverse = self.decode_cursor(request)
+		if self.values is not None:
+			queryset = queryset.filter(self.keyset_filter(self.values, self.reverse))
+		if self.reverse:
+			queryset = queryset.order_by(*[self.invert(field) for field in self.ordering])
+		else:
+			queryset = queryset.order_by(*self.ordering)
+		return queryset[:self.page_size + 1]
+
+	def set_page(self, page):
+		has_more = len(page) > self.page_size
+		page = page[:self.page_size]
+		if self.reverse:
+			page.reverse()
+
+		self.has_next = has_more if not self.reverse else self.values is not None
+		self.has_previous = self.values is not None if not self.reverse else has_more
+		self.page = page
+		return page
+
+	def get_paginated_response(self, data):
+		return Response(self.get_paginated_data(data))
+
+	def get_paginated_data(self, data):
+		return {
+			'next': self.get_next_link(),
+			'previous': self.get_previous_link(),
+			'results': data,
+		}
+
+	def get_paginated_response_schema(self, schema):
+		return {
+			'type': 'object',
+			'properties': {
+				'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+				'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+				'results': schema,
+			},
+		}
+
+	def get_page_size(self, request):
+		try:
+			size = int(request.query_params[self.page_size_query_param])
+		except (KeyError, ValueError):
+			return self.page_size
+		return max(1, min(size, self.max_page_size))
+
+	def get_ordering(self, queryset):
+		ordering = list(queryset.query.order_by or self.default_ordering)
+		if ordering[-1].lstrip('-') not in ('id', 'pk'):
+			ordering.append('id')
+		return tuple(ordering)
+
+	@staticmethod
+	def invert(field):
+		return field[1:] if field.startswith('-') else '-' + field
+
+	def keyset_filter(self, values, reverse):
+		# (a, b, c) after (x, y, z) == a > x OR (a = x AND b > y) OR ...
+		condition = Q()
+		for index, field in enumerate(self.ordering):
+			name = field.lstrip('-')
+			descending = field.startswith('-') != reverse
+			lookup = 'lt' if descending else 'gt'
+			term = Q(**{f'{name}__{lookup}': values[index]})
+			for prior, value in zip(self.ordering[:index], values):
+				term &= Q(**{prior.lstrip('-'): value})
+			condition |= term
+		return condition
+
+	def get_next_link(self):
+		if not self.has_next or not self.page:
+			return None
+		return self.encode_cursor(self.page[-1], reverse=False)
+
+	def get_previous_link(self):
+		if not self.has_previous or not self.page:
+			return None
+		return self.encode_cursor(self.page[0], reverse=True)
+
+	def position(self, instance):
+		return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+	def encode_cursor(self, instance, reverse):
+		payload = json.dumps({'p': self.position(instance), 'r': int(reverse)}, default=self.encode_value, separators=(',', ':'))
+		cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+		url = self.request.build_absolute_uri()
+		return replace_query_param(url, self.cursor_query_param, cursor)
+
+	@staticmethod
+	def encode_value(value):
+		# Full precision: DjangoJSONEncoder would truncate datetimes to
+		# milliseconds and the seek would skip or repeat rows.
+		if isinstance(value, (datetime.datetime, datetime.date)):
+			return value.isoformat()
+		if isinstance(value, decimal.Decimal):
+			return str(value)
+		raise TypeError(type(value).__name__)
+
+	def decode_cursor(self, request):
+		encoded = request.query_params.get(self.cursor_query_param)
+		if not encoded:
+			return None, False
+		try:
+			payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+			values = payload['p']
+			reverse = bool(payload['r'])
+			if len(values) != len(self.ordering):
+				raise ValueError
+			values = [self.to_python(field.lstrip('-'), value) for field, value in zip(self.ordering, values)]
+		except (TypeError, ValueError, KeyError):
+			raise NotFound(self.invalid_cursor_message)
+		return values, reverse
+
+	def to_python(self, name, value):
+		try:
+			field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+		except FieldDoesNotExist:
+			field = None
+		try:
+			if field is None:
+				# Annotations such as search_rank, which are all floats
+				if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+					raise ValueError(value)
+				return float(value)
+			return field.to_python(value)
+		except Exception:
+			raise ValueError(value)
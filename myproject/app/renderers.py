@@ -0,0 +1,50 @@
+"""
+orjson-backed JSON renderer and parser for the REST API.
+
+Drop-in replacements for DRF's JSONRenderer and JSONParser: responses are
+byte-for-byte what DRF would send. orjson serializes dicts, lists, strings
+and numbers itself and hands everything else, including datetimes and
+Decimals, to DRF's encoder, so timestamps keep their "Z" suffix and raw
+Decimals render as DRF renders them (serializer fields already turn prices
+into strings).
+"""
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		# Pretty printing (e.g. the browsable API) and ASCII output stay with DRF
+		if self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+			return super().render(data, accepted_media_type, renderer_context)
+		rendered = orjson.dumps(data, default=default, option=OPTIONS)
+		# Like DRF, keep the output a strict JavaScript subset
+		if b'\xe2\x80\xa8' in rendered or b'\xe2\x80\xa9' in rendered:
+			rendered = rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+		return rendered
+
+
+class ORJSONParser(JSONParser):
+	renderer_class = ORJSONRenderer
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+		body = stream.read()
+		if encoding.lower().replace('-', '') != 'utf8':
+			body = body.decode(encoding)
+		try:
+			# Rejects NaN and Infinity, like DRF's STRICT_JSON
+			return orjson.loads(body)
+		except ValueError as exc:
+			raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,139 @@
+"""
+Full-text product search.
+
+SQLite uses an external-content FTS5 table with the trigram tokenizer, kept
+in sync with app_product by triggers, so any part of a word matches as it
+did with icontains; PostgreSQL uses a GIN index over a tsvector expression
+(whole words and word prefixes). Any other backend (or an SQLite build
+without FTS5 trigrams) falls back to icontains.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'app_product_fts'
+PRODUCT_TABLE = 'app_product'
+
+# Must match the expression indexed by migration 0005 so PostgreSQL can use it.
+PG_DOCUMENT = "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, ''))"
+
+# The FTS table and these triggers are created by migration 0013. The
+# triggers live on app_product, so SQLite drops them whenever a migration
+# rebuilds that table (ALTERs are table copies); reinstall_search_triggers
+# puts them back after every migrate.
+SQLITE_TRIGGERS = [
+	f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+		INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+		INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON {PRODUCT_TABLE} BEGIN
+		INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+		INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+	END""",
+]
+
+SEARCH_TRIGGER_NAMES = [f'{FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au')]
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Trigrams can't match anything shorter
+MIN_TRIGRAM_LENGTH = 3
+
+_fts_available = {}
+
+
+def reinstall_search_triggers(using, **kwargs):
+	"""
+	post_migrate handler: recreate the SQLite sync triggers a migration
+	dropped, and rebuild the index from app_product since rows written
+	without them weren't indexed.
+	"""
+	connection = connections[using]
+	_fts_available.pop(using, None)
+	if connection.vendor != 'sqlite' or not search_index_available(connection):
+		return
+	with connection.cursor() as cursor:
+		cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [PRODUCT_TABLE])
+		if {name for name, in cursor.fetchall()} >= set(SEARCH_TRIGGER_NAMES):
+			return
+		for statement in SQLITE_TRIGGERS:
+			cursor.execute(statement)
+		cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_index_available(connection):
+	if connection.alias not in _fts_available:
+		if connection.vendor == 'sqlite':
+			available = FTS_TABLE in connection.introspection.table_names()
+		else:
+			available = connection.vendor == 'postgresql'
+		_fts_available[connection.alias] = available
+	return _fts_available[connection.alias]
+
+
+def tokenize(query):
+	return TOKEN_RE.findall(query.lower())
+
+
+def fts5_query(tokens):
+	# Every token is quoted, so FTS5 operators in user input are inert, and
+	# matches anywhere in the text, so partially typed words still hit.
+	return ' '.join('"%s"' % token.replace('"', '""') for token in tokens)
+
+
+def search_products(queryset, query):
+	"""
+	Filter ``queryset`` to products matching ``query``.
+
+	When a full-text index is available the queryset is annotated with
+	``search_rank`` (lower is more relevant) and ordered by it.
+	"""
+	tokens = tokenize(query)
+	connection = connections[queryset.db]
+	if not tokens or not search_index_available(connection):
+		return icontains_search(queryset, query)
+
+	if connection.vendor == 'sqlite':
+		indexed = [token for token in tokens if len(token) >= MIN_TRIGRAM_LENGTH]
+		if not indexed:
+			return icontains_search(queryset, query)
+		# Join the FTS table so bm25 is computed once per match rather than
+		# re-running MATCH in a correlated subquery for every row.
+		queryset = queryset.extra(
+			tables=[FTS_TABLE],
+			where=[f'{FTS_TABLE}.rowid = {PRODUCT_TABLE}.id', f'{FTS_TABLE} MATCH %s'],
+			params=[fts5_query(indexed)],
+		).annotate(
+			search_rank=RawSQL(f'{FTS_TABLE}.rank', [], output_field=FloatField())
+		)
+		# Shorter words (e.g. the "c" of "usb c") are checked on the matches only
+		for token in tokens:
+			if len(token) < MIN_TRIGRAM_LENGTH:
+				queryset = icontains_search(queryset, token)
+	else:
+		tsquery = ' & '.join(f'{token}:*' for token in tokens)
+		queryset = queryset.annotate(
+			search_rank=RawSQL(
+				f"-ts_rank({PG_DOCUMENT}, to_tsquery('english', %s))",
+				[tsquery],
+				output_field=FloatField(),
+			)
+		).filter(
+			id__in=RawSQL(
+				f"SELECT id FROM {PRODUCT_TABLE} WHERE {PG_DOCUMENT} @@ to_tsquery('english', %s)",
+				[tsquery],
+			)
+		)
+	return queryset.order_by('search_rank', 'id')
+
+
+def icontains_search(queryset, query):
+	return queryset.filter(
+		Q(name__icontains=query) |
+		Q(description__icontains=query)
+	)
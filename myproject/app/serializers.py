@@ -1,10 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Product, Cart, CartItem, Order, OrderItem
+from .images import variant_urls
+from .sparse import SparseFieldsMixin
 
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 	class Meta:
 		model = User
 		fields = ('id', 'username', 'email', 'first_name', 'last_name')
@@ -24,15 +26,24 @@ class RegisterSerializer(serializers.ModelSerializer):
 		return user
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 	seller = UserSerializer(read_only=True)
+	images = serializers.SerializerMethodField()
 
 	class Meta:
 		model = Product
-		fields = ('id', 'seller', 'name', 'description', 'price', 'category', 'subcategory', 'stock', 'image', 'created_at', 'updated_at')
+		fields = ('id', 'seller', 'name', 'description', 'price', 'category', 'subcategory', 'stock', 'image', 'images', 'created_at', 'updated_at')
+		# Model fields read by method fields (see app/sparse.py)
+		sparse_sources = {'images': ['image_hash', 'image_width']}
 
+	def get_images(self, obj):
+		# Responsive variants generated by ingest_images, narrowest first
+		if not obj.image_hash:
+			return None
+		return variant_urls(obj.image_hash, obj.image_width, self.context.get('request'))
 
-class CartItemSerializer(serializers.ModelSerializer):
+
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 	product = ProductSerializer(read_only=True)
 	product_id = serializers.IntegerField(write_only=True)
 
@@ -41,7 +52,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 		fields = ('id', 'product', 'product_id', 'quantity', 'created_at', 'updated_at')
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 	items = CartItemSerializer(many=True, read_only=True)
 
 	class Meta:
@@ -49,19 +60,65 @@ class CartSerializer(serializers.ModelSerializer):
 		fields = ('id', 'user', 'items', 'created_at', 'updated_at')
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
-	product = ProductSerializer(read_only=True)
+class CartOperationSerializer(serializers.Serializer):
+	OPERATIONS = ('add', 'update', 'remove')
+
+	op = serializers.ChoiceField(choices=OPERATIONS, default='add')
+	product_id = serializers.IntegerField()
+	quantity = serializers.IntegerField(default=1)
+
+	def validate(self, attrs):
+		if attrs['op'] == 'add' and attrs['quantity'] < 1:
+			raise serializers.ValidationError({'quantity': 'Add at least one.'})
+		if attrs['op'] == 'update' and attrs['quantity'] < 0:
+			# Zero removes the item
+			raise serializers.ValidationError({'quantity': 'Quantity cannot be negative.'})
+		return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+	operations = CartOperationSerializer(many=True, allow_empty=False, max_length=500)
+
+	def validate_operations(self, operations):
+		# One operation per product keeps the result independent of their order
+		product_ids = [operation['product_id'] for operation in operations]
+		if len(set(product_ids)) != len(product_ids):
+			raise serializers.ValidationError('Each product may appear in only one operation.')
+		return operations
+
+
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+	product = serializers.SerializerMethodField()
 
 	class Meta:
 		model = OrderItem
 		fields = ('id', 'product', 'quantity', 'price')
+		sparse_sources = {'product': ['product', *OrderItem.SNAPSHOT_FIELDS]}
 
+	def get_product(self, obj):
+		# The snapshot taken at checkout; id is None once the product is deleted
+		return {
+			'id': obj.product_id,
+			'name': obj.product_name,
+			'category': obj.product_category,
+			'image': obj.product_image,
+			'images': variant_urls(obj.product_image_hash, obj.product_image_width, self.context.get('request')) if obj.product_image_hash else None,
+			'seller': {'id': obj.seller_id} if obj.seller_id is not None else None,
+		}
 
-class OrderSerializer(serializers.ModelSerializer):
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 	items = OrderItemSerializer(many=True, read_only=True)
-	user = UserSerializer(read_only=True)
+	user = serializers.SerializerMethodField()
 
 	class Meta:
 		model = Order
 		fields = ('id', 'user', 'total_price', 'status', 'payment_method', 'shipping_address', 'items', 'created_at', 'updated_at')
+		sparse_sources = {'user': ['user']}
+
+	def get_user(self, obj):
+		# Orders are served to their owner, who is already loaded
+		request = self.context.get('request')
+		user = request.user if request and request.user.pk == obj.user_id else obj.user
+		return UserSerializer(user).data
 
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token
+from .cache import catalog_changed
+from .facets import adjust_facet
+from .models import Product
+from .suggest import product_deleted, product_saved
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, **kwargs):
+	catalog_changed()
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_facet(sender, instance, **kwargs):
+	if not instance._state.adding and not hasattr(instance, '_stored_facet'):
+		# Loaded with deferred facet fields; read what the row is counted under
+		stored = Product.objects.filter(pk=instance.pk).only('category', 'subcategory', 'price').first()
+		instance._stored_facet = (stored.category, stored.subcategory, stored.price) if stored else None
+
+
+@receiver(post_save, sender=Product)
+def update_product_facet(sender, instance, created, **kwargs):
+	previous = None if created else instance.stored_facet_key()
+	current = instance.facet_key()
+	if previous != current:
+		if previous is not None:
+			adjust_facet(previous, -1)
+		adjust_facet(current, 1)
+	instance.remember_facet()
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_facet(sender, instance, **kwargs):
+	adjust_facet(instance.stored_facet_key() or instance.facet_key(), -1)
+
+
+@receiver(post_save, sender=Product)
+def update_suggestions(sender, instance, **kwargs):
+	pk, name, subcategory = instance.pk, instance.name, instance.subcategory
+	transaction.on_commit(lambda: product_saved(pk, name, subcategory))
+
+
+@receiver(post_delete, sender=Product)
+def remove_suggestions(sender, instance, **kwargs):
+	pk = instance.pk
+	transaction.on_commit(lambda: product_deleted(pk))
+
+
+@receiver(post_save, sender=User)
+def seller_changed(sender, instance, update_fields=None, **kwargs):
+	# Product payloads embed the seller; logins only touch last_login
+	if instance.is_staff and update_fields != frozenset({'last_login'}):
+		catalog_changed()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+	forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+	# Cached tokens carry a snapshot of the user; a stale last_login in it is harmless
+	if not created and update_fields != frozenset({'last_login'}):
+		for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+			forget_token(key)
@@ -0,0 +1,178 @@
+"""
+Sparse fieldsets for the product, cart and order endpoints.
+
+``?fields=`` lists the fields to render, comma separated, with dots
+reaching into nested objects: ``?fields=id,name,price,images`` for product
+cards, ``?fields=id,items.quantity,items.product.name`` for a cart. Inside
+a sparse fieldset a nested object named on its own renders as its primary
+key; ``?expand=`` names nested objects to render in full (``?fields=id,
+seller&expand=seller``). Without ``fields`` everything is rendered, as
+before.
+
+SparseFieldsMixin drops the other fields from serializers, and
+sparse_queryset() loads only the columns they need, so a product card
+query skips the description and the seller join.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELDSET_PARAMS = ('fields', 'expand')
+
+# Fieldset tree node rendering every field
+ALL = None
+
+
+def split_param(value):
+	"""Sorted, de-duplicated names in a comma separated parameter."""
+	return sorted({name.strip() for name in value.split(',') if name.strip()})
+
+
+def fieldset_params(query_params):
+	"""Normalized ?fields= and ?expand=, for cache keys and ETags."""
+	params = []
+	for name in FIELDSET_PARAMS:
+		names = split_param(query_params.get(name, ''))
+		if names:
+			params.append((name, ','.join(names)))
+	return params
+
+
+def parse_fieldset(query_params):
+	"""
+	The requested fields as a tree of ``{name: subtree}``, where ``{}`` is
+	a field on its own and ALL renders everything. ALL without ?fields=.
+	"""
+	fields = query_params.get('fields', '')
+	if not fields.strip():
+		return ALL
+	tree = {}
+	for path in split_param(fields):
+		node = tree
+		for name in path.split('.'):
+			node = node.setdefault(name, {})
+	for path in split_param(query_params.get('expand', '')):
+		*parents, name = path.split('.')
+		node = tree
+		for parent in parents:
+			node = node.get(parent) if node else None
+		# Only objects named on their own; "seller.username" is already explicit
+		if node and node.get(name) == {}:
+			node[name] = ALL
+	return tree
+
+
+def request_fieldset(request):
+	if request is None or request.method not in SAFE_METHODS:
+		return ALL
+	return parse_fieldset(getattr(request, 'query_params', request.GET))
+
+
+def subtree(tree, path):
+	for name in path:
+		if tree is ALL:
+			return ALL
+		tree = tree.get(name, {})
+	return tree
+
+
+def field_path(field):
+	"""Field names from the root serializer down to ``field``."""
+	path = []
+	while field.parent is not None:
+		# List children are bound with an empty name
+		if field.field_name:
+			path.append(field.field_name)
+		field = field.parent
+	return path[::-1]
+
+
+def nested_serializer(field):
+	return field.child if isinstance(field, serializers.ListSerializer) else field
+
+
+class SparseFieldsMixin:
+	"""Render only the fields selected by the request's ?fields= and ?expand=."""
+
+	def get_fields(self):
+		fields = super().get_fields()
+		root = self.root
+		if not hasattr(root, '_fieldset'):
+			root._fieldset = request_fieldset(self.context.get('request'))
+		selected = subtree(root._fieldset, field_path(self))
+		if selected is ALL:
+			return fields
+
+		sparse = {}
+		for name, field in fields.items():
+			if field.write_only:
+				sparse[name] = field
+			elif name not in selected:
+				continue
+			elif selected[name] == {} and isinstance(nested_serializer(field), serializers.BaseSerializer):
+				# Collapsed to primary keys
+				many = isinstance(field, serializers.ListSerializer)
+				sparse[name] = serializers.PrimaryKeyRelatedField(source=field.source, many=many, read_only=True)
+			else:
+				sparse[name] = field
+		return sparse
+
+
+def model_fields(serializer_class, tree, prefix=''):
+	"""
+	``(only, select_related)`` paths for rendering ``tree`` with
+	``serializer_class``. Method fields read the model fields listed in
+	its Meta.sparse_sources; reverse relations are left to their prefetch.
+	"""
+	serializer = serializer_class()
+	if tree is ALL:
+		tree = dict.fromkeys(serializer.fields, ALL)
+	model = serializer_class.Meta.model
+	sources = getattr(serializer_class.Meta, 'sparse_sources', {})
+	only = [prefix + model._meta.pk.name]
+	related = []
+	for name, field in serializer.fields.items():
+		if field.write_only or name not in tree:
+			continue
+		if name in sources:
+			only.extend(prefix + source for source in sources[name])
+			continue
+		try:
+			model_field = model._meta.get_field(field.source)
+		except FieldDoesNotExist:
+			continue
+		if not model_field.concrete:
+			continue
+		only.append(prefix + field.source)
+		nested = nested_serializer(field)
+		if isinstance(nested, serializers.BaseSerializer) and tree[name] != {}:
+			related.append(prefix + field.source)
+			nested_only, nested_related = model_fields(type(nested), tree[name], f'{prefix}{field.source}__')
+			only.extend(nested_only)
+			related.extend(nested_related)
+	return only, related
+
+
+def sparse_queryset(queryset, serializer_class, request, path=(), keep=()):
+	"""
+	Load only the columns that ``serializer_class``, at ``path`` below the
+	view's serializer, renders for ``request``'s fieldset, plus ``keep``
+	(e.g. the foreign key a prefetch joins on).
+	"""
+	tree = subtree(request_fieldset(request), path)
+	if tree is ALL:
+		return queryset
+	only, related = model_fields(serializer_class, tree)
+	only.extend(keep)
+	# Keyset pagination reads the ordering columns back from the rows
+	for name in queryset.query.order_by:
+		if isinstance(name, str):
+			try:
+				only.append(queryset.model._meta.get_field(name.lstrip('-')).name)
+			except FieldDoesNotExist:
+				pass
+	queryset = queryset.select_related(None)
+	if related:
+		queryset = queryset.select_related(*related)
+	return queryset.only(*only)
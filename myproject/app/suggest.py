@@ -0,0 +1,410 @@
+"""
+Typeahead suggestions for the search box.
+
+SuggestIndex holds product names, brands and subcategory labels in memory
+as one sorted array of lowercased keys, one key per word start ("galaxy
+s23" and "s23" for "Samsung Galaxy S23"), so the keys matching a prefix are
+found with two bisects. Suggestions are ranked by units ordered. Rankings
+for prefixes matching many keys ("s", "sam") are computed when the index
+is built and kept until a product change can alter them, so a keystroke
+costs a dictionary lookup or a scan of at most PRECOMPUTE_MIN_KEYS keys.
+
+There is no brand field; catalog names lead with the brand, so a name's
+first word stands in for it.
+
+Each worker holds its own index. It is loaded at start-up from the snapshot
+written by ``manage.py build_suggest_index`` (or built from the database
+when there is none), updated in place by Product signals, and catches up
+with other workers' changes, seen as a new catalog version, at most every
+SUGGEST_REFRESH_SECONDS. Popularity is only recounted when the index is
+rebuilt.
+"""
+import bisect
+import heapq
+import itertools
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+import orjson
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from .cache import catalog_version
+from .models import OrderItem, Product
+
+
+SNAPSHOT_FORMAT = 1
+SUBCATEGORY_LABELS = dict(Product.SUBCATEGORY_CHOICES)
+
+# Prefixes matching at least this many keys have their suggestions memoized
+MEMOIZE_MIN_KEYS = 64
+# Prefixes matching at least this many keys are ranked when the index is
+# built, so ranking on request never scans more keys than this
+PRECOMPUTE_MIN_KEYS = 1024
+
+# How far before the newest timestamp seen refresh() looks for changed
+# rows, and how many missing rows it reads per query when resyncing
+WATERMARK_SLACK = timedelta(minutes=5)
+RESYNC_BATCH_SIZE = 500
+
+# Sorts after every key that starts with the prefix it is appended to
+PREFIX_END = '\U0010ffff'
+
+
+def normalize(text):
+	return ' '.join(text.lower().split())
+
+
+def word_starts(text):
+	"""``text`` from each word on: 'apple watch 9', 'watch 9', '9'."""
+	words = text.split(' ')
+	return [' '.join(words[start:]) for start in range(len(words))]
+
+
+def brand_of(name):
+	words = name.split()
+	return words[0] if len(words) > 1 else ''
+
+
+def related_entries(pk, name, subcategory):
+	"""``(entry, label, keys)`` for each suggestion a product contributes to."""
+	yield pk, name, word_starts(normalize(name))
+	brand = brand_of(name)
+	if brand:
+		yield ('brand', normalize(brand)), brand, [normalize(brand)]
+	if subcategory:
+		label = SUBCATEGORY_LABELS.get(subcategory, subcategory)
+		yield ('subcategory', subcategory), label, word_starts(normalize(label))
+
+
+class SuggestIndex:
+	"""
+	Entries are product ids, or ``(kind, value)`` for brands and
+	subcategories, which count the popularity of all their products.
+	Reads and writes both hold ``lock``: an update changes ``keys`` and
+	``entries`` in separate steps, and lookups take microseconds.
+	"""
+
+	def __init__(self, watermark=None, version=None):
+		# pk -> (name, subcategory, popularity)
+		self.products = {}
+		self.popularity = Counter()
+		self.members = Counter()
+		self.labels = {}
+		# entry -> sort key, so ranking a range is a dictionary lookup per key
+		self.ranks = {}
+		# Sorted keys, and the entry each belongs to
+		self.keys = []
+		self.entries = []
+		self.memo = {}
+		self.lock = threading.Lock()
+		self.refresh_lock = threading.Lock()
+		self.watermark = watermark
+		self.version = version
+		# Never checked, so the first refresh() catches up at once
+		self.checked_at = float('-inf')
+
+	@classmethod
+	def build(cls, products, watermark=None, version=None):
+		"""Index ``(pk, name, subcategory, popularity)`` rows, sorting once."""
+		index = cls(watermark, version)
+		pairs = []
+		for pk, name, subcategory, popularity in products:
+			index.products[pk] = (name, subcategory, popularity)
+			for entry, label, keys in related_entries(pk, name, subcategory):
+				if index._count(entry, label, popularity, 1):
+					pairs.extend((key, entry) for key in keys)
+		pairs.sort(key=lambda pair: pair[0])
+		index.keys = [key for key, entry in pairs]
+		index.entries = [entry for key, entry in pairs]
+		index._rank_all()
+		index._precompute('', 0, len(index.keys))
+		return index
+
+	def _precompute(self, prefix, start, end):
+		"""Memoize every prefix longer than ``prefix`` matching many keys in ``start:end``."""
+		position = start
+		while position < end:
+			if len(self.keys[position]) == len(prefix):
+				position += 1
+				continue
+			child = self.keys[position][:len(prefix) + 1]
+			child_end = bisect.bisect_left(self.keys, child + PREFIX_END, position, end)
+			if child_end - position >= PRECOMPUTE_MIN_KEYS:
+				# Queries never end in a space, but longer prefixes go through it
+				if not child.endswith(' '):
+					self.memo[child] = self._best(self.entries[position:child_end], settings.SUGGEST_LIMIT)
+				self._precompute(child, position, child_end)
+			position = child_end
+
+	def _count(self, entry, label, popularity, delta):
+		"""Adjust a brand or subcategory total; True if the entry appeared or went."""
+		if not isinstance(entry, tuple):
+			return True
+		self.popularity[entry] += popularity * delta
+		self.members[entry] += delta
+		if self.members[entry] == delta == 1:
+			self.labels[entry] = label
+			return True
+		if self.members[entry] == 0:
+			del self.popularity[entry], self.members[entry], self.labels[entry]
+			return True
+		return False
+
+	def _forget(self, keys, entry):
+		"""Drop memoized rankings through ``keys`` that ``entry``'s change can alter."""
+		rank = self.ranks.get(entry)
+		for key in keys:
+			for end in range(1, len(key) + 1):
+				best = self.memo.get(key[:end])
+				if best is not None and (
+					entry in best
+					or rank is not None and (len(best) < settings.SUGGEST_LIMIT or rank < self.ranks[best[-1]])
+				):
+					del self.memo[key[:end]]
+
+	def _apply(self, pk, name, subcategory, popularity, delta):
+		for entry, label, keys in related_entries(pk, name, subcategory):
+			if self._count(entry, label, popularity, delta):
+				for key in keys:
+					if delta > 0:
+						index = bisect.bisect_right(self.keys, key)
+						self.keys.insert(index, key)
+						self.entries.insert(index, entry)
+					else:
+						index = bisect.bisect_left(self.keys, key)
+						while self.entries[index] != entry:
+							index += 1
+						del self.keys[index], self.entries[index]
+			if entry in self.products or entry in self.labels:
+				self.ranks[entry] = self._rank(entry)
+			else:
+				self.ranks.pop(entry, None)
+			self._forget(keys, entry)
+
+	def update(self, pk, name, subcategory):
+		"""Add or change a product, keeping its popularity."""
+		with self.lock:
+			previous = self.products.get(pk)
+			if previous is not None and previous[:2] == (name, subcategory):
+				return
+			popularity = previous[2] if previous is not None else 0
+			if previous is not None:
+				self._apply(pk, *previous, -1)
+			self.products[pk] = (name, subcategory, popularity)
+			self._apply(pk, name, subcategory, popularity, 1)
+
+	def remove(self, pk):
+		with self.lock:
+			previous = self.products.pop(pk, None)
+			if previous is not None:
+				self._apply(pk, *previous, -1)
+
+	def _rank(self, entry):
+		# Brands and subcategories cover their products, so win ties with them
+		if isinstance(entry, tuple):
+			return -self.popularity[entry], 0, self.labels[entry].lower()
+		name, subcategory, popularity = self.products[entry]
+		return -popularity, 1, name.lower()
+
+	def _rank_all(self):
+		self.ranks = {entry: self._rank(entry) for entry in itertools.chain(self.products, self.labels)}
+
+	def _describe(self, entry):
+		if not isinstance(entry, tuple):
+			return {'kind': 'product', 'text': self.products[entry][0], 'id': entry}
+		kind, value = entry
+		suggestion = {'kind': kind, 'text': self.labels[entry]}
+		if kind == 'subcategory':
+			suggestion['subcategory'] = value
+		return suggestion
+
+	def _best(self, entries, limit):
+		"""The ``limit`` best ``entries``, once per kind and text."""
+		# Usually enough to fill ``limit`` after dropping repeats: entries
+		# matched by several keys and products with the same name
+		for count in (limit * 2, len(entries)):
+			best, seen = [], set()
+			for entry in heapq.nsmallest(count, entries, key=self.ranks.__getitem__):
+				text = (entry[0] if isinstance(entry, tuple) else 'product', self.ranks[entry][2])
+				if text not in seen:
+					seen.add(text)
+					best.append(entry)
+					if len(best) == limit:
+						return best
+			if count >= len(entries):
+				break
+		return best
+
+	def suggest(self, query, limit):
+		prefix = normalize(query)
+		if not prefix:
+			return []
+		with self.lock:
+			best = self.memo.get(prefix)
+			if best is None:
+				start = bisect.bisect_left(self.keys, prefix)
+				end = bisect.bisect_left(self.keys, prefix + PREFIX_END, start)
+				best = self._best(self.entries[start:end], settings.SUGGEST_LIMIT)
+				if end - start >= MEMOIZE_MIN_KEYS:
+					self.memo[prefix] = best
+			return [self._describe(entry) for entry in best[:limit]]
+
+	def refresh(self):
+		"""Catch up with product changes made by other workers."""
+		if time.monotonic() - self.checked_at < settings.SUGGEST_REFRESH_SECONDS:
+			return
+		# One thread catches up; the others keep serving the index as it is
+		if not self.refresh_lock.acquire(blocking=False):
+			return
+		try:
+			now = time.monotonic()
+			if now - self.checked_at < settings.SUGGEST_REFRESH_SECONDS:
+				return
+			self.checked_at = now
+			version = catalog_version()
+			if version == self.version:
+				return
+
+			changed = Product.objects.order_by()
+			if self.watermark is not None:
+				# Rows committed late carry timestamps from before the watermark
+				changed = changed.filter(updated_at__gte=self.watermark - WATERMARK_SLACK)
+			for pk, name, subcategory, updated_at in changed.values_list('pk', 'name', 'subcategory', 'updated_at'):
+				self.update(pk, name, subcategory)
+				self.watermark = max(self.watermark or updated_at, updated_at)
+
+			# Deletions and rows written with older timestamps (generate_dataset)
+			# slip past the watermark; resync ids both ways when the id count
+			# or sum differs; an insert and a deletion rarely leave both unchanged
+			with self.lock:
+				indexed = set(self.products)
+			stats = Product.objects.aggregate(count=Count('pk'), total=Sum('pk'))
+			if (stats['count'], stats['total'] or 0) != (len(indexed), sum(indexed)):
+				stored = set(Product.objects.values_list('pk', flat=True))
+				for pk in indexed - stored:
+					self.remove(pk)
+				missing = list(stored - indexed)
+				for start in range(0, len(missing), RESYNC_BATCH_SIZE):
+					rows = Product.objects.filter(pk__in=missing[start:start + RESYNC_BATCH_SIZE])
+					for pk, name, subcategory in rows.values_list('pk', 'name', 'subcategory'):
+						self.update(pk, name, subcategory)
+			self.version = version
+		finally:
+			self.refresh_lock.release()
+
+	def snapshot(self):
+		"""
+		The index as compressed JSON, keys already sorted and short prefixes
+		ranked, so loading it is mostly parsing. Brand and subcategory
+		entries are stored once, referred to from ``entries`` by -(position + 1).
+		"""
+		with self.lock:
+			groups = list(self.labels)
+			positions = {entry: -position - 1 for position, entry in enumerate(groups)}
+			encode = lambda entries: [positions[entry] if isinstance(entry, tuple) else entry for entry in entries]
+			data = orjson.dumps({
+				'format': SNAPSHOT_FORMAT,
+				'watermark': self.watermark.isoformat() if self.watermark else None,
+				'products': [[pk, *product] for pk, product in self.products.items()],
+				'groups': [[*entry, self.labels[entry], self.popularity[entry], self.members[entry]] for entry in groups],
+				'keys': self.keys,
+				'entries': encode(self.entries),
+				'memo': {prefix: encode(best) for prefix, best in self.memo.items()},
+			})
+		return zlib.compress(data)
+
+	@classmethod
+	def from_snapshot(cls, data):
+		data = orjson.loads(zlib.decompress(data))
+		if data.get('format') != SNAPSHOT_FORMAT:
+			return None
+		index = cls(watermark=datetime.fromisoformat(data['watermark']) if data['watermark'] else None)
+		index.products = {pk: (name, subcategory, popularity) for pk, name, subcategory, popularity in data['products']}
+		groups = []
+		for kind, value, label, popularity, members in data['groups']:
+			entry = (kind, value)
+			groups.append(entry)
+			index.labels[entry] = label
+			index.popularity[entry] = popularity
+			index.members[entry] = members
+		index.keys = data['keys']
+		decode = lambda entries: [entry if entry > 0 else groups[-entry - 1] for entry in entries]
+		index.entries = decode(data['entries'])
+		index.memo = {prefix: decode(best) for prefix, best in data['memo'].items()}
+		index._rank_all()
+		return index
+
+
+def build_index():
+	"""A fresh index of every product, ranked by units ordered."""
+	version = catalog_version()
+	units = dict(
+		OrderItem.objects.filter(product__isnull=False).order_by()
+		.values_list('product').annotate(units=Sum('quantity'))
+	)
+	watermark = Product.objects.aggregate(watermark=Max('updated_at'))['watermark']
+	products = (
+		(pk, name, subcategory, units.get(pk, 0))
+		for pk, name, subcategory in Product.objects.order_by().values_list('pk', 'name', 'subcategory').iterator()
+	)
+	return SuggestIndex.build(products, watermark=watermark, version=version)
+
+
+def save_snapshot(index, path=None):
+	path = str(path or settings.SUGGEST_INDEX_PATH)
+	data = index.snapshot()
+	# Replace atomically so a worker starting meanwhile never reads half a file
+	with open(path + '.tmp', 'wb') as file:
+		file.write(data)
+	os.replace(path + '.tmp', path)
+	return len(data)
+
+
+def load_snapshot(path=None):
+	try:
+		with open(path or settings.SUGGEST_INDEX_PATH, 'rb') as file:
+			return SuggestIndex.from_snapshot(file.read())
+	except (FileNotFoundError, zlib.error, orjson.JSONDecodeError):
+		return None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def warm_index():
+	"""Load the snapshot, if there is one, before the first request needs it."""
+	global _index
+	with _index_lock:
+		if _index is None:
+			_index = load_snapshot()
+
+
+def get_index():
+	global _index
+	if _index is None:
+		with _index_lock:
+			if _index is None:
+				_index = load_snapshot() or build_index()
+	_index.refresh()
+	return _index
+
+
+def reset_index(index=None):
+	global _index
+	_index = index
+
+
+def product_saved(pk, name, subcategory):
+	if _index is not None:
+		_index.update(pk, name, subcategory)
+
+
+def product_deleted(pk):
+	if _index is not None:
+		_index.remove(pk)
@@ -0,0 +1,20 @@
+"""Test runner for the project (settings.TEST_RUNNER)."""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .metrics import registry
+
+
+class TestRunner(DiscoverRunner):
+	"""Django's runner, with test requests kept out of the server's metrics."""
+
+	def setup_test_environment(self, **kwargs):
+		super().setup_test_environment(**kwargs)
+		self.metrics = override_settings(METRICS_DIR=None)
+		self.metrics.enable()
+
+	def teardown_test_environment(self, **kwargs):
+		self.metrics.disable()
+		# Or the exit-time flush would write the test requests after all
+		registry.reset()
+		super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1106 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlsplit
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+
+from .authentication import clear_token_cache
+from .cache import CATALOG_VERSION_KEY, bump_catalog_version, cached_many
+from .checkout import backfill_order_snapshots
+from .classifier import subcategory_classifier
+from .compression import CompressionMiddleware
+from .database import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware, RoutingState, current, write_transaction
+from .datasets import generate_dataset
+from .facets import rebuild_facets
+from .filters import filter_products
+from .metrics import registry
+from .models import Product, ProductFacet, Cart, CartItem, Order, OrderItem
+from .pagination import KeysetPagination
+from .renderers import ORJSONParser, ORJSONRenderer
+from .search import reinstall_search_triggers
+from .suggest import get_index, load_snapshot, reset_index, save_snapshot
+
+
+# Maximum queries per request, independent of how many rows are returned.
+# Requests are force-authenticated, so token lookups are not counted. Views
+# with conditional GET support spend one of these on their ETag validators.
+QUERY_BUDGETS = {
+	'products': 2,
+	'product-detail': 2,
+	'cart': 3,
+	'orders': 2,
+	'order-detail': 3,
+}
+
+
+class QueryBudgetTests(APITestCase):
+	"""Fail when an endpoint's query count grows with its result size."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user('buyer', password='buyer123')
+		cls.sellers = [User.objects.create_user(f'seller{i}', is_staff=True) for i in range(3)]
+
+	def setUp(self):
+		# Budgets are about the database work behind a cache miss
+		cache.clear()
+
+	def seed(self, size):
+		products = Product.objects.bulk_create([
+			Product(
+				seller=self.sellers[i % len(self.sellers)],
+				name=f'Product {i}',
+				price=Decimal('10.00') + i,
+				category=Product.CATEGORY_ELECTRONICS,
+				stock=10,
+			)
+			for i in range(size)
+		])
+		cart, _ = Cart.objects.get_or_create(user=self.user)
+		CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for product in products])
+		orders = Order.objects.bulk_create([Order(user=self.user) for _ in range(size)])
+		OrderItem.objects.bulk_create([
+			OrderItem(order=order, product=product, price=product.price)
+			for order in orders
+			for product in products[:3]
+		])
+		return products, orders
+
+	def assertWithinBudget(self, name, **kwargs):
+		self.client.force_authenticate(self.user)
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse(name, kwargs=kwargs or None))
+		self.assertEqual(response.status_code, 200)
+		self.assertLessEqual(
+			len(queries), QUERY_BUDGETS[name],
+			f"{name} ran {len(queries)} queries:\n" + '\n'.join(q['sql'] for q in queries.captured_queries),
+		)
+
+	def test_small_result_sets(self):
+		products, orders = self.seed(1)
+		self.assertWithinBudget('products')
+		self.assertWithinBudget('product-detail', pk=products[0].pk)
+		self.assertWithinBudget('cart')
+		self.assertWithinBudget('orders')
+		self.assertWithinBudget('order-detail', pk=orders[0].pk)
+
+	def test_large_result_sets(self):
+		products, orders = self.seed(30)
+		self.assertWithinBudget('products')
+		self.assertWithinBudget('product-detail', pk=products[0].pk)
+		self.assertWithinBudget('cart')
+		self.assertWithinBudget('orders')
+		self.assertWithinBudget('order-detail', pk=orders[0].pk)
+
+	def test_checkout_is_constant(self):
+		products, _ = self.seed(30)
+		cart = Cart.objects.get(user=self.user)
+		self.client.force_authenticate(self.user)
+		counts = []
+		for size in (1, 30):
+			CartItem.objects.filter(cart=cart).delete()
+			CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for product in products[:size]])
+			with CaptureQueriesContext(connection) as queries:
+				response = self.client.post(reverse('orders'), {'payment_method': 'upi'}, format='json')
+			self.assertEqual(response.status_code, 201)
+			self.assertEqual(len(response.data['items']), size)
+			counts.append(len(queries))
+		self.assertEqual(counts[0], counts[1])
+		self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+	def test_checkout_empty_cart(self):
+		self.client.force_authenticate(self.user)
+		response = self.client.post(reverse('orders'), {}, format='json')
+		self.assertEqual(response.status_code, 400)
+		self.assertFalse(Order.objects.exists())
+
+
+class InventoryTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user('buyer', password='buyer123')
+		self.product = Product.objects.create(name='Phone', price=Decimal('100.00'), stock=3)
+		self.cart = Cart.objects.create(user=self.user)
+		self.client.force_authenticate(self.user)
+
+	def test_checkout_reserves_and_cancel_releases(self):
+		CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+		response = self.client.post(reverse('orders'), {}, format='json')
+		self.assertEqual(response.status_code, 201)
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.stock, 1)
+
+		url = reverse('order-detail', kwargs={'pk': response.data['id']})
+		for _ in range(2):
+			self.assertEqual(self.client.patch(url, {'status': 'cancelled'}, format='json').status_code, 200)
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.stock, 3)
+		self.assertEqual(self.client.patch(url, {'status': 'pending'}, format='json').status_code, 400)
+
+	def test_out_of_stock_fails_without_side_effects(self):
+		CartItem.objects.create(cart=self.cart, product=self.product, quantity=5)
+		response = self.client.post(reverse('orders'), {}, format='json')
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(response.data['items'], [{'product_id': self.product.pk, 'requested': 5, 'available': 3}])
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.stock, 3)
+		self.assertFalse(Order.objects.exists())
+		self.assertTrue(CartItem.objects.filter(cart=self.cart).exists())
+
+
+class CartWriteTests(APITestCase):
+
+	def setUp(self):
+		self.user = User.objects.create_user('buyer', password='buyer123')
+		self.phone, self.case, self.cable = Product.objects.bulk_create([
+			Product(name=name, price=Decimal('10.00'), stock=10) for name in ('Phone', 'Case', 'Cable')
+		])
+		self.client.force_authenticate(self.user)
+
+	def quantities(self):
+		return dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+
+	def test_add_accumulates_in_one_upsert(self):
+		self.client.post(reverse('cart'), {'product_id': self.phone.pk, 'quantity': 2}, format='json')
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.post(reverse('cart'), {'product_id': self.phone.pk, 'quantity': 3}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['quantity'], 5)
+		self.assertEqual(sum(q['sql'].startswith('INSERT') for q in queries.captured_queries), 1)
+		self.assertFalse(any(q['sql'].startswith('UPDATE') for q in queries.captured_queries))
+		self.assertEqual(self.client.post(reverse('cart'), {'product_id': 0}, format='json').status_code, 404)
+		self.assertEqual(self.client.post(reverse('cart'), {'product_id': self.phone.pk, 'quantity': 0}, format='json').status_code, 400)
+
+	def test_patch_validates_quantity(self):
+		self.client.post(reverse('cart'), {'product_id': self.phone.pk}, format='json')
+		for quantity in (-1, 'two', None, 1.5):
+			with self.subTest(quantity=quantity):
+				response = self.client.patch(reverse('cart'), {'product_id': self.phone.pk, 'quantity': quantity}, format='json')
+				self.assertEqual(response.status_code, 400)
+		self.assertEqual(self.quantities(), {self.phone.pk: 1})
+
+		response = self.client.patch(reverse('cart'), {'product_id': self.phone.pk, 'quantity': 3}, format='json')
+		self.assertEqual(response.data['quantity'], 3)
+		self.assertEqual(self.client.patch(reverse('cart'), {'product_id': self.case.pk, 'quantity': 3}, format='json').status_code, 404)
+		self.assertEqual(self.client.patch(reverse('cart'), {'product_id': self.phone.pk, 'quantity': 0}, format='json').status_code, 200)
+		self.assertEqual(self.quantities(), {})
+
+	def test_batch(self):
+		cart = Cart.objects.create(user=self.user)
+		CartItem.objects.create(cart=cart, product=self.phone, quantity=1)
+		CartItem.objects.create(cart=cart, product=self.case, quantity=1)
+		operations = [
+			{'op': 'update', 'product_id': self.phone.pk, 'quantity': 4},
+			{'op': 'remove', 'product_id': self.case.pk},
+			{'op': 'add', 'product_id': self.cable.pk, 'quantity': 2},
+		]
+		response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.quantities(), {self.phone.pk: 4, self.cable.pk: 2})
+		self.assertEqual({item['product']['id']: item['quantity'] for item in response.data['items']}, self.quantities())
+
+	def test_batch_is_all_or_nothing(self):
+		self.client.post(reverse('cart'), {'product_id': self.phone.pk}, format='json')
+		operations = [
+			{'op': 'update', 'product_id': self.phone.pk, 'quantity': 4},
+			{'op': 'add', 'product_id': self.cable.pk},
+			{'op': 'add', 'product_id': 0},
+		]
+		response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+		self.assertEqual(response.status_code, 404)
+		self.assertEqual(response.data['items'], [0])
+		self.assertEqual(self.quantities(), {self.phone.pk: 1})
+
+		response = self.client.post(reverse('cart-batch'), {'operations': [{'op': 'remove', 'product_id': self.case.pk}]}, format='json')
+		self.assertEqual(response.status_code, 404)
+		duplicate = [{'product_id': self.phone.pk}, {'op': 'remove', 'product_id': self.phone.pk}]
+		self.assertEqual(self.client.post(reverse('cart-batch'), {'operations': duplicate}, format='json').status_code, 400)
+
+
+class OrderSnapshotTests(APITestCase):
+
+	def setUp(self):
+		self.user = User.objects.create_user('buyer')
+		self.seller = User.objects.create_user('seller', is_staff=True)
+		self.product = Product.objects.create(seller=self.seller, name='Kettle', price=Decimal('899.00'), category='appliances', stock=5)
+		self.client.force_authenticate(self.user)
+
+	def test_history_renders_from_snapshots(self):
+		cart = Cart.objects.create(user=self.user)
+		CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+		order = self.client.post(reverse('orders'), {}, format='json').data
+		seller_id = self.seller.pk
+		# Takes the product with it
+		self.seller.delete()
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse('order-detail', kwargs={'pk': order['id']}))
+		item = response.data['items'][0]
+		self.assertEqual(item['product'], {
+			'id': None, 'name': 'Kettle', 'category': 'appliances', 'image': '', 'images': None, 'seller': {'id': seller_id},
+		})
+		self.assertEqual(response.data['user']['username'], 'buyer')
+		sql = ' '.join(query['sql'] for query in queries.captured_queries)
+		self.assertNotIn('app_product', sql)
+		self.assertNotIn('auth_user', sql)
+
+	def test_backfill(self):
+		order = Order.objects.create(user=self.user)
+		gone = Product.objects.create(name='Gone', price=Decimal('1.00'))
+		OrderItem.objects.bulk_create([
+			OrderItem(order=order, product=self.product, price=self.product.price),
+			OrderItem(order=order, product=gone, price=gone.price),
+		])
+		gone.delete()
+		self.assertEqual(backfill_order_snapshots(batch_size=1), (1, 1))
+		item = OrderItem.objects.get(product=self.product)
+		self.assertEqual((item.product_name, item.product_category, item.seller_id), ('Kettle', 'appliances', self.seller.pk))
+		self.assertEqual(backfill_order_snapshots(), (0, 1))
+
+
+class CatalogCacheTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		self.product = Product.objects.create(name='Phone', price=Decimal('100.00'), stock=3, category='electronics')
+
+	def test_product_change_invalidates(self):
+		url = reverse('product-detail', kwargs={'pk': self.product.pk})
+		self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+		self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+		self.assertEqual(self.client.get(reverse('products'), {'category': 'electronics'})['X-Cache'], 'MISS')
+		self.assertEqual(self.client.get(reverse('products'), {'category': ' Electronics'})['X-Cache'], 'HIT')
+
+		self.product.price = Decimal('90.00')
+		with self.captureOnCommitCallbacks(execute=True):
+			self.product.save()
+		response = self.client.get(url)
+		self.assertEqual(response['X-Cache'], 'MISS')
+		self.assertEqual(response.data['price'], '90.00')
+		response = self.client.get(reverse('products'), {'category': 'electronics'})
+		self.assertEqual(response.data['results'][0]['price'], '90.00')
+
+
+class ProductBatchTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		seller = User.objects.create_user('seller', is_staff=True)
+		self.products = Product.objects.bulk_create([
+			Product(seller=seller, name=f'Product {i}', price=Decimal('10.00')) for i in range(3)
+		])
+
+	def get(self, ids, **params):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse('product-batch'), {'ids': ids, **params})
+		return response, len(queries)
+
+	def test_order_missing_and_cache(self):
+		first, second, third = (product.pk for product in self.products)
+		detail = self.client.get(reverse('product-detail', kwargs={'pk': second})).data
+
+		response, queries = self.get(f'{third},{second},0,{third}')
+		self.assertEqual([product['id'] for product in response.data['results']], [third, second])
+		self.assertEqual(response.data['missing'], [0])
+		self.assertEqual(response.data['results'][1], detail)
+		self.assertEqual(queries, 1)
+
+		# Only the product neither view has served yet is loaded
+		self.assertEqual(self.get(f'{first},{second},{third}')[1], 1)
+		self.assertEqual(self.get(f'{second},{third}')[1], 0)
+		self.assertEqual(self.client.get(reverse('product-detail', kwargs={'pk': third}))['X-Cache'], 'HIT')
+		self.assertEqual(list(self.get(third, fields='name')[0].data['results'][0]), ['name'])
+
+	def test_invalid_ids(self):
+		for ids in ('', '1,x', ','.join(map(str, range(1, 102)))):
+			self.assertEqual(self.get(ids)[0].status_code, 400, ids)
+
+
+class KeysetPaginationTests(APITestCase):
+
+	@classmethod
+	def setUpTestData(cls):
+		Product.objects.bulk_create([Product(name=f'Product {i}', price=Decimal('10.00')) for i in range(50)])
+		# Ten products per timestamp, so pages have to break ties by id
+		start = timezone.now()
+		for index, pk in enumerate(Product.objects.order_by('id').values_list('pk', flat=True)):
+			Product.objects.filter(pk=pk).update(created_at=start - timedelta(minutes=index // 10))
+		cls.expected = list(Product.objects.order_by('-created_at', 'id').values_list('pk', flat=True))
+
+	def paginate(self, query='?page_size=7'):
+		paginator = KeysetPagination()
+		request = Request(RequestFactory().get('/api/products/' + query))
+		page = paginator.paginate_queryset(Product.objects.order_by('-created_at', 'id'), request)
+		links = [paginator.get_next_link(), paginator.get_previous_link()]
+		# Links are absolute; keep their query string
+		links = [link and '?' + urlsplit(link).query for link in links]
+		return [product.pk for product in page], *links
+
+	def test_next_and_previous_round_trip(self):
+		pages = []
+		query, previous = '?page_size=7', None
+		while query:
+			page, query, previous = self.paginate(query)
+			pages.append(page)
+		self.assertEqual(sum(pages, []), self.expected)
+		self.assertEqual(len(pages), 8)
+
+		# Back from the last page, through the ties, to the first
+		backwards = [pages[-1]]
+		while previous:
+			page, _, previous = self.paginate(previous)
+			backwards.append(page)
+		self.assertEqual(backwards[::-1], pages)
+
+	def test_deep_page(self):
+		query = '?page_size=3'
+		for _ in range(12):
+			page, query, _ = self.paginate(query)
+		page, next_query, previous = self.paginate(query)
+		self.assertEqual(page, self.expected[36:39])
+		self.assertEqual(self.paginate(previous)[0], self.expected[33:36])
+		self.assertEqual(self.paginate(next_query)[0], self.expected[39:42])
+
+	def test_tampered_cursor(self):
+		_, query, _ = self.paginate()
+		cursor = query.split('cursor=')[1].split('&')[0]
+		payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+		forged = [
+			cursor[:-3],
+			'not base64!',
+			{'p': payload['p'][:1], 'r': 0},
+			{'p': ['yesterday', payload['p'][1]], 'r': 0},
+			{'p': [payload['p'][0], 'x'], 'r': 0},
+			{'p': payload['p']},
+		]
+		for value in forged:
+			if isinstance(value, dict):
+				value = base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+			with self.subTest(cursor=value), self.assertRaises(NotFound):
+				self.paginate(f'?cursor={value}')
+
+
+class ConditionalGetTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user('buyer', password='buyer123')
+		self.product = Product.objects.create(name='Phone', price=Decimal('100.00'), stock=3)
+		self.client.force_authenticate(self.user)
+
+	def assertRevalidates(self, url, change):
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		etag = response['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		if response.has_header('Last-Modified'):
+			self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+		with self.captureOnCommitCallbacks(execute=True):
+			change()
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+
+	def test_product_endpoints(self):
+		def rename():
+			self.product.name = 'Smartphone'
+			self.product.save()
+		self.assertRevalidates(reverse('products'), rename)
+		self.assertRevalidates(reverse('product-detail', kwargs={'pk': self.product.pk}), rename)
+
+	def test_changes_no_timestamp_shows(self):
+		self.product.seller = User.objects.create_user('seller', is_staff=True)
+		self.product.save()
+		cart = Cart.objects.create(user=self.user)
+		CartItem.objects.create(cart=cart, product=self.product)
+		other = Product.objects.create(name='Case', price=Decimal('10.00'))
+		urls = [reverse('products'), reverse('product-detail', kwargs={'pk': self.product.pk}), reverse('cart')]
+		for url in urls:
+			# If-Modified-Since alone would answer 304 for all of these
+			self.assertFalse(self.client.get(url).has_header('Last-Modified'))
+
+		def rename_seller():
+			User.objects.filter(pk=self.product.seller_id).update(first_name='Renamed')
+			User.objects.get(pk=self.product.seller_id).save()
+		for url in urls:
+			self.assertRevalidates(url, rename_seller)
+		self.assertRevalidates(reverse('products'), other.delete)
+
+	def test_cart(self):
+		cart = Cart.objects.create(user=self.user)
+		item = CartItem.objects.create(cart=cart, product=self.product)
+		self.assertRevalidates(reverse('cart'), item.delete)
+
+	def test_order_detail(self):
+		order = Order.objects.create(user=self.user, total_price=Decimal('100.00'))
+		# Placed before checkout took snapshots
+		OrderItem.objects.create(order=order, product=self.product, price=self.product.price)
+		url = reverse('order-detail', kwargs={'pk': order.pk})
+		self.assertRevalidates(url, backfill_order_snapshots)
+		# Lines are snapshots, so later product changes leave the order as it was
+		etag = self.client.get(url)['ETag']
+		self.product.price = Decimal('120.00')
+		self.product.save()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class SparseFieldsetTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user('buyer')
+		self.seller = User.objects.create_user('seller', is_staff=True)
+		self.product = Product.objects.create(seller=self.seller, name='Lamp', description='Brass desk lamp', price=Decimal('499.00'), stock=5)
+		self.client.force_authenticate(self.user)
+
+	def get(self, url, **params):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(url, params)
+		self.assertEqual(response.status_code, 200)
+		return response.data, ' '.join(query['sql'] for query in queries.captured_queries)
+
+	def test_product_list(self):
+		data, sql = self.get(reverse('products'), fields='id,name,price,images,seller')
+		self.assertEqual(data['results'], [{'id': self.product.pk, 'seller': self.seller.pk, 'name': 'Lamp', 'price': '499.00', 'images': None}])
+		self.assertNotIn('description', sql)
+		self.assertNotIn('auth_user', sql)
+		data, _ = self.get(reverse('products'), fields='name,seller', expand='seller')
+		self.assertEqual(data['results'][0]['seller']['username'], 'seller')
+		data, _ = self.get(reverse('products'), fields='seller.username')
+		self.assertEqual(data['results'], [{'seller': {'username': 'seller'}}])
+		# Cached per fieldset
+		data, _ = self.get(reverse('products'))
+		self.assertEqual(data['results'][0]['description'], 'Brass desk lamp')
+
+	def test_nested_cart_and_orders(self):
+		cart = Cart.objects.create(user=self.user)
+		CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+		data, sql = self.get(reverse('cart'), fields='items.quantity,items.product.name')
+		self.assertEqual(data, {'items': [{'product': {'name': 'Lamp'}, 'quantity': 2}]})
+		self.assertNotIn('description', sql)
+		self.assertLessEqual(sql.count('SELECT'), QUERY_BUDGETS['cart'])
+
+		self.client.post(reverse('orders'), {}, format='json')
+		data, sql = self.get(reverse('orders'), fields='id,items.quantity')
+		self.assertEqual(list(data['results'][0]), ['id', 'items'])
+		self.assertEqual(data['results'][0]['items'], [{'quantity': 2}])
+		self.assertNotIn('product_name', sql)
+		self.assertLessEqual(sql.count('SELECT'), QUERY_BUDGETS['orders'])
+
+
+class RenderingTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		seller = User.objects.create_user('seller', is_staff=True)
+		Product.objects.bulk_create([
+			Product(seller=seller, name=f'Lamp \u2028{i} ünïcode', description='Brass desk lamp ' * 20, price=Decimal('499.99') + i, stock=5)
+			for i in range(20)
+		])
+
+	def test_renderer_matches_drf(self):
+		data = self.client.get(reverse('products')).data
+		raw = {'price': Decimal('1.10'), 'at': Product.objects.first().created_at, 1: None}
+		for value in (data, raw):
+			self.assertEqual(ORJSONRenderer().render(value), JSONRenderer().render(value))
+		self.assertEqual(ORJSONParser().parse(io.BytesIO(ORJSONRenderer().render(data))), json.loads(JSONRenderer().render(data)))
+
+	def test_compression(self):
+		url = reverse('products')
+		plain = self.client.get(url)
+		self.assertFalse(plain.has_header('Content-Encoding'))
+		self.assertIn('Accept-Encoding', plain['Vary'])
+
+		response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		self.assertEqual(gzip.decompress(response.content), plain.content)
+		self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+		# Below the size threshold, or for writes, bodies go out as they are
+		small = self.client.get(url, {'page_size': 1, 'fields': 'id'}, HTTP_ACCEPT_ENCODING='gzip')
+		self.assertFalse(small.has_header('Content-Encoding'))
+		middleware = CompressionMiddleware(lambda request: HttpResponse(b'{}' * 1000, content_type='application/json'))
+		response = middleware(RequestFactory().post('/', HTTP_ACCEPT_ENCODING='gzip'))
+		self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(SUGGEST_INDEX_PATH='/nonexistent/suggest_index.bin')
+class SuggestTests(APITestCase):
+
+	def setUp(self):
+		reset_index()
+		self.addCleanup(reset_index)
+		cache.clear()
+		self.phone = Product.objects.create(name='Samsung Galaxy S23', price=Decimal('100.00'), subcategory='smartphones')
+		self.watch = Product.objects.create(name='Samsung Galaxy Watch', price=Decimal('50.00'), subcategory='smart watches')
+		self.shirt = Product.objects.create(name='Allen Solly Formal Shirt', price=Decimal('20.00'))
+		order = Order.objects.create(user=User.objects.create_user('buyer'))
+		OrderItem.objects.create(order=order, product=self.watch, quantity=3, price=self.watch.price)
+
+	def suggest(self, q, **params):
+		response = self.client.get(reverse('product-suggest'), {'q': q, **params})
+		self.assertEqual(response.status_code, 200)
+		return [(item['kind'], item['text']) for item in response.data['suggestions']]
+
+	def test_prefixes_rank_by_units_ordered(self):
+		self.assertEqual(self.suggest('sam'), [
+			('brand', 'Samsung'), ('product', 'Samsung Galaxy Watch'), ('product', 'Samsung Galaxy S23'),
+		])
+		# Any word start matches: names and subcategory labels alike
+		self.assertEqual(self.suggest(' GALAXY  w'), [('product', 'Samsung Galaxy Watch')])
+		self.assertEqual(self.suggest('watch'), [('subcategory', 'Smart Watches'), ('product', 'Samsung Galaxy Watch')])
+		self.assertEqual(self.suggest('sam', limit=1), [('brand', 'Samsung')])
+		self.assertEqual(self.suggest(''), [])
+
+	def test_follows_product_changes(self):
+		self.suggest('s')
+		with self.captureOnCommitCallbacks(execute=True):
+			Product.objects.create(name='Sony Bravia', price=Decimal('10.00'))
+			self.shirt.name = 'Allen Solly Linen Shirt'
+			self.shirt.save()
+			self.phone.delete()
+		self.assertEqual(self.suggest('son'), [('brand', 'Sony'), ('product', 'Sony Bravia')])
+		self.assertEqual(self.suggest('shirt'), [('product', 'Allen Solly Linen Shirt')])
+		self.assertEqual(self.suggest('smartp'), [])
+
+		# Changes made by other workers arrive with the next catalog version
+		Product.objects.filter(pk=self.watch.pk).update(name='Samsung Gear', updated_at=timezone.now())
+		bump_catalog_version()
+		get_index().checked_at = float('-inf')
+		self.assertEqual(self.suggest('gear'), [('product', 'Samsung Gear')])
+
+	def test_refresh_resyncs_rows_behind_the_watermark(self):
+		index = get_index()
+		# Written by another worker with an old explicit timestamp, and a deletion
+		Product.objects.bulk_create([Product(name='Sony Bravia', price=Decimal('10.00'))])
+		Product.objects.filter(name='Sony Bravia').update(updated_at=timezone.now() - timedelta(days=30))
+		Product.objects.filter(pk=self.phone.pk).delete()
+		bump_catalog_version()
+		index.checked_at = float('-inf')
+		self.assertEqual(self.suggest('sony'), [('brand', 'Sony'), ('product', 'Sony Bravia')])
+		self.assertEqual(self.suggest('smartp'), [])
+
+	def test_concurrent_updates_and_lookups(self):
+		index = get_index()
+		errors = []
+
+		def look_up():
+			try:
+				for _ in range(2000):
+					index.suggest('samsung', 10)
+			except Exception as exc:
+				errors.append(exc)
+
+		# Switch threads often enough to land inside an update
+		self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+		sys.setswitchinterval(1e-6)
+		reader = threading.Thread(target=look_up)
+		reader.start()
+		for pk in range(10_000, 10_500):
+			index.update(pk, f'Samsung Thing {pk}', 'smartphones')
+			index.remove(pk)
+		reader.join()
+		self.assertEqual(errors, [])
+
+	def test_snapshot(self):
+		index = get_index()
+		with tempfile.TemporaryDirectory() as tmp:
+			save_snapshot(index, f'{tmp}/suggest_index.bin')
+			loaded = load_snapshot(f'{tmp}/suggest_index.bin')
+		for prefix in ('s', 'sam', 'galaxy', 'smart', 'allen'):
+			self.assertEqual(loaded.suggest(prefix, 10), index.suggest(prefix, 10))
+
+		# Products added after the snapshot was written are picked up on load
+		Product.objects.create(name='Samsung Galaxy Buds', price=Decimal('5.00'))
+		reset_index(loaded)
+		self.assertIn(('product', 'Samsung Galaxy Buds'), self.suggest('samsung'))
+
+
+class FacetTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		self.phone = Product.objects.create(name='Galaxy Phone', price=Decimal('15000.00'), category='electronics', subcategory='smartphones')
+		self.laptop = Product.objects.create(name='ThinkPad', price=Decimal('90000.00'), category='electronics', subcategory='laptops')
+		self.lipstick = Product.objects.create(name='Matte Lipstick', price=Decimal('399.00'), category='beauty', subcategory='makeup')
+
+	def facets(self, **params):
+		cache.clear()
+		response = self.client.get(reverse('product-facets'), params)
+		self.assertEqual(response.status_code, 200)
+		return response.data
+
+	def test_counts_follow_product_changes(self):
+		self.laptop.price = Decimal('45000.00')
+		self.laptop.save()
+		self.lipstick.delete()
+		Product.objects.get(pk=self.phone.pk).save()
+
+		incremental = self.facets()
+		rebuild_facets()
+		self.assertEqual(incremental, self.facets())
+		self.assertEqual(incremental['total'], 2)
+		self.assertEqual([band['count'] for band in incremental['price_bands']], [0, 0, 1, 1, 0])
+
+	def test_filters_and_search(self):
+		electronics = self.facets(category='electronics')
+		self.assertEqual(electronics['total'], 2)
+		self.assertEqual([c['value'] for c in electronics['subcategories']], ['smartphones', 'laptops'])
+
+		# 10,000 splits a band, so this is counted from the products table
+		self.assertEqual(self.facets(min_price='10000')['total'], 2)
+		self.assertEqual(self.facets(min_price='5000', max_price='49999.99')['total'], 1)
+		self.assertEqual(self.facets(search='phone')['categories'], [{'value': 'electronics', 'label': 'Electronics', 'count': 1}])
+
+
+class ProductFilterTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		self.cheap = Product.objects.create(name='Earbuds', price=Decimal('19.99'), category='Electronics', subcategory='Audio')
+		self.dear = Product.objects.create(name='Camera', price=Decimal('20.00'), category='electronics', subcategory='cameras')
+
+	def names(self, **params):
+		response = self.client.get(reverse('products'), params)
+		self.assertEqual(response.status_code, 200)
+		return [product['name'] for product in response.data['results']]
+
+	def test_choices_are_canonical(self):
+		self.assertEqual(Product.objects.get(pk=self.cheap.pk).category, 'electronics')
+		self.assertEqual(self.names(category='ELECTRONICS', subcategory='audio'), ['Earbuds'])
+
+	def test_price_bounds_are_exact(self):
+		self.assertEqual(self.names(min_price='19.99', max_price='19.99'), ['Earbuds'])
+		self.assertEqual(self.names(min_price='19.991'), ['Camera'])
+		self.assertEqual(self.client.get(reverse('products'), {'max_price': 'cheap'}).status_code, 400)
+
+	def test_search_matches_inside_words(self):
+		Product.objects.create(name='Wireless Headphones', price=Decimal('99.00'))
+		Product.objects.create(name='iPhone 15', price=Decimal('999.00'))
+		self.assertCountEqual(self.names(search='phone'), ['Wireless Headphones', 'iPhone 15'])
+		self.assertEqual(self.names(search='buds'), ['Earbuds'])
+		# Words too short for the index still have to match
+		self.assertEqual(self.names(search='phone 15'), ['iPhone 15'])
+		self.assertCountEqual(self.names(search='ph'), ['Wireless Headphones', 'iPhone 15'])
+
+	def test_forged_search_cursor_is_rejected(self):
+		for rank in ('x', [1], None, True):
+			cursor = base64.urlsafe_b64encode(json.dumps({'p': [rank, self.cheap.pk], 'r': 0}).encode()).decode()
+			with self.subTest(rank=rank):
+				response = self.client.get(reverse('products'), {'search': 'earbuds', 'cursor': cursor})
+				self.assertEqual(response.status_code, 404)
+
+	@skipUnless(connection.vendor == 'sqlite', 'Checks the SQLite search index')
+	def test_search_triggers_are_reinstalled_after_migrate(self):
+		self.assertEqual(self.names(search='earbuds'), ['Earbuds'])
+		# As a migration that rebuilds app_product would
+		with connection.cursor() as cursor:
+			cursor.execute('DROP TRIGGER app_product_fts_au')
+		Product.objects.filter(pk=self.cheap.pk).update(name='Headphones')
+		reinstall_search_triggers(using=connection.alias)
+		cache.clear()
+		self.assertEqual(self.names(search='earbuds'), [])
+		self.assertEqual(self.names(search='headphones'), ['Headphones'])
+
+	@skipUnless(connection.vendor == 'sqlite', 'Checks SQLite query plans')
+	def test_every_filter_combination_uses_an_index(self):
+		params = {'category': 'electronics', 'subcategory': 'audio', 'min_price': '10', 'max_price': '100'}
+		for size in range(len(params) + 1):
+			for names in itertools.combinations(params, size):
+				queryset = Product.objects.select_related('seller').order_by('-created_at', 'id')
+				plan = filter_products(queryset, {name: params[name] for name in names})[:24].explain()
+				with self.subTest(filters=names):
+					self.assertIn('USING INDEX', plan)
+					self.assertNotRegex(plan, r'SCAN app_product(?! USING)')
+
+
+class TokenCacheTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		clear_token_cache()
+		self.user = User.objects.create_user('shopper', password='shopper123')
+		self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+	def test_repeat_requests_skip_the_database(self):
+		self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse('profile'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(queries), 0)
+
+	def test_logout_and_user_changes_invalidate(self):
+		self.client.get(reverse('profile'))
+		User.objects.filter(pk=self.user.pk).update(first_name='Asha')
+		User.objects.get(pk=self.user.pk).save()
+		self.assertEqual(self.client.get(reverse('profile')).data['first_name'], 'Asha')
+
+		self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+		self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+	def test_last_login_update_skips_token_lookup(self):
+		self.user.last_login = timezone.now()
+		with CaptureQueriesContext(connection) as queries:
+			self.user.save(update_fields=['last_login'])
+		self.assertEqual(len(queries), 1)
+
+
+class ImportProductsTests(APITestCase):
+
+	def setUp(self):
+		self.seller = User.objects.create_user('seller', is_staff=True)
+
+	def run_import(self, content, suffix='.csv'):
+		with tempfile.NamedTemporaryFile('w', suffix=suffix) as feed:
+			feed.write(content)
+			feed.flush()
+			out, err = io.StringIO(), io.StringIO()
+			call_command('import_products', feed.name, batch_size=2, stdout=out, stderr=err)
+		return out.getvalue(), err.getvalue()
+
+	def test_upserts_by_sku(self):
+		self.run_import(
+			'sku,name,price,category,subcategory,stock\n'
+			'A1,Earbuds,999.00,Electronics,headphones,5\n'
+			'A2,Kettle,1499.50,appliances,,3\n'
+		)
+		out, err = self.run_import(
+			'{"sku": "A1", "name": "Earbuds Pro", "price": 1299.99, "category": "electronics", "stock": 7}\n'
+			'{"sku": "A3", "name": "Lipstick", "price": "399"}\n'
+			'{"sku": "A4", "price": "cheap"}\n',
+			suffix='.jsonl',
+		)
+		self.assertIn('2 rows imported, 1 invalid', out)
+		self.assertIn('line 3', err)
+
+		products = {product.sku: product for product in Product.objects.filter(seller=self.seller)}
+		self.assertEqual(sorted(products), ['A1', 'A2', 'A3'])
+		self.assertEqual((products['A1'].name, products['A1'].price, products['A1'].stock), ('Earbuds Pro', Decimal('1299.99'), 7))
+		self.assertEqual(products['A2'].category, 'appliances')
+		self.assertEqual(sum(ProductFacet.objects.values_list('count', flat=True)), 3)
+
+
+class ClassifySubcategoriesTests(APITestCase):
+
+	def test_keyword_priority(self):
+		# Earlier mappings win wherever they appear; overlapping keywords are all seen
+		self.assertEqual(subcategory_classifier.classify('LG Air Conditioner', 'hair care free'), 'air conditioners')
+		self.assertEqual(subcategory_classifier.classify('Silk Conditioner', ''), 'haircare')
+		self.assertEqual(subcategory_classifier.classify('Apple Watch Ultra', 'with iPhone sync'), 'smartphones')
+		self.assertIsNone(subcategory_classifier.classify('Garden Hose', 'Green'))
+
+	def test_command_fills_empty_subcategories(self):
+		Product.objects.bulk_create([
+			Product(name='Dell XPS 13', price=Decimal('99999.00'), category='electronics'),
+			Product(name='Garden Hose', price=Decimal('499.00')),
+			Product(name='Matte Lipstick', price=Decimal('399.00'), category='beauty', subcategory='skincare'),
+		])
+		call_command('classify_subcategories', '--dry-run', stdout=io.StringIO())
+		self.assertEqual(Product.objects.filter(subcategory='').count(), 2)
+
+		out = io.StringIO()
+		call_command('classify_subcategories', batch_size=1, stdout=out)
+		self.assertIn('1 of 2 products updated', out.getvalue())
+		self.assertEqual(
+			dict(Product.objects.values_list('name', 'subcategory')),
+			{'Dell XPS 13': 'laptops', 'Garden Hose': '', 'Matte Lipstick': 'skincare'},
+		)
+
+
+class RemapProductImagesTests(APITestCase):
+
+	def test_remaps_changed_rows_only(self):
+		stale = Product.objects.create(name='Kettle', price=Decimal('999.00'), image='https://old.example.com/k.jpg')
+		current = Product.objects.create(name='Toaster', price=Decimal('999.00'), image='https://cdn.example.com/t.jpg')
+		mapping = {
+			'Kettle': 'https://cdn.example.com/k.jpg',
+			'Toaster': 'https://cdn.example.com/t.jpg',
+			'Blender': 'https://cdn.example.com/b.jpg',
+		}
+		with tempfile.NamedTemporaryFile('w', suffix='.json') as source:
+			json.dump(mapping, source)
+			source.flush()
+			out, err = io.StringIO(), io.StringIO()
+			call_command('remap_product_images', source.name, batch_size=2, stdout=out, stderr=err)
+
+		self.assertIn('1 products updated, 1 already current, 1 names missing', out.getvalue())
+		self.assertIn("'Blender'", err.getvalue())
+		refreshed = Product.objects.get(pk=stale.pk)
+		self.assertEqual(refreshed.image, 'https://cdn.example.com/k.jpg')
+		self.assertGreater(refreshed.updated_at, stale.updated_at)
+		self.assertEqual(Product.objects.get(pk=current.pk).updated_at, current.updated_at)
+
+
+class ProductImageTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.enterContext(override_settings(IMAGE_CACHE_DIR=tmp.name, IMAGE_WIDTHS=[160, 320, 640]))
+		self.product = Product.objects.create(name='Kettle', sku='KT-1', price=Decimal('999.00'))
+
+	def test_ingest_and_serve_variants(self):
+		from PIL import Image
+		with tempfile.TemporaryDirectory() as sources:
+			Image.new('RGB', (400, 300), 'orange').save(f'{sources}/KT-1.jpg')
+			call_command('ingest_images', sources, workers=1, stdout=io.StringIO())
+			out = io.StringIO()
+			call_command('ingest_images', sources, workers=1, stdout=out)
+		self.assertIn('0 generated, 1 cached', out.getvalue())
+
+		images = self.client.get(reverse('product-detail', args=[self.product.pk])).data['images']
+		# Never upscaled past the 400px source
+		self.assertEqual([variant['width'] for variant in images], [160, 320, 400])
+
+		response = self.client.get(images[0]['webp'])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Content-Type'], 'image/webp')
+		self.assertIn('immutable', response['Cache-Control'])
+		self.assertEqual(self.client.get(images[0]['webp'], HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class GenerateDatasetTests(APITestCase):
+
+	def test_same_seed_same_rows(self):
+		def rows(prefix):
+			generate_dataset(products=200, users=30, orders=100, sellers=3, seed=7, prefix=prefix, batch_size=64)
+			products = Product.objects.filter(sku__startswith=f'{prefix}-').order_by('sku')
+			return list(products.values_list('name', 'price', 'subcategory', 'created_at'))
+
+		first = rows('a')
+		self.assertEqual(len(first), 200)
+		self.assertEqual(first, rows('b'))
+		self.assertEqual(sum(ProductFacet.objects.values_list('count', flat=True)), 400)
+
+		order = Order.objects.prefetch_related('items').first()
+		self.assertEqual(order.total_price, sum(item.price * item.quantity for item in order.items.all()))
+		self.assertEqual(OrderItem.objects.filter(product__isnull=True).count(), 0)
+
+
+class MetricsTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.enterContext(override_settings(METRICS_DIR=tmp.name))
+		self.enterContext(override_settings(METRICS_TOKEN='secret'))
+		self.metrics_dir = tmp.name
+		registry.reset()
+		registry.path = None
+		seller = User.objects.create_user('seller', is_staff=True)
+		self.product = Product.objects.create(seller=seller, name='Lamp', price=Decimal('499.00'), category='appliances')
+
+	def scrape(self):
+		response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+		return response.content.decode()
+
+	def test_requests_recorded_by_url_name(self):
+		self.client.get(reverse('products'))
+		self.client.get(reverse('products'))
+		self.client.get(reverse('product-detail', args=[self.product.pk + 1]))
+		self.client.get(reverse('async-products'), {'page_size': 5})
+		body = self.scrape()
+		self.assertIn('api_requests_total{view="products",method="GET",status="200"} 2', body)
+		self.assertIn('api_requests_total{view="product-detail",method="GET",status="404"} 1', body)
+		self.assertIn('api_request_duration_seconds_count{view="products",method="GET"} 2', body)
+		self.assertIn('api_request_duration_seconds_bucket{view="products",method="GET",le="+Inf"} 2', body)
+		self.assertIn('catalog_cache_hits_total 1', body)
+		queries = next(line for line in body.splitlines() if line.startswith('api_db_queries_total{view="products"}'))
+		self.assertGreater(float(queries.split()[-1]), 0)
+		for view in ('products', 'async-products'):
+			serializer = next(line for line in body.splitlines() if line.startswith(f'api_serializer_seconds_total{{view="{view}"}}'))
+			self.assertGreater(float(serializer.split()[-1]), 0)
+
+	def test_nothing_recorded_writes_no_snapshot(self):
+		registry.flush()
+		self.assertEqual(os.listdir(self.metrics_dir), [])
+
+	def test_snapshots_of_all_workers_are_summed(self):
+		self.client.get(reverse('products'))
+		other_worker = {
+			'counters': [['api_requests_total', [['view', 'products'], ['method', 'GET'], ['status', '200']], 5]],
+			'histograms': [],
+		}
+		with open(f'{self.metrics_dir}/1-1.json', 'w') as snapshot:
+			json.dump(other_worker, snapshot)
+		self.assertIn('api_requests_total{view="products",method="GET",status="200"} 6', self.scrape())
+
+	def test_token(self):
+		self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+		self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+	def test_staff_only_without_token(self):
+		with override_settings(METRICS_TOKEN=None):
+			self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+			self.client.force_authenticate(User.objects.create_user('shopper'))
+			self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+			self.client.force_authenticate(User.objects.get(username='seller'))
+			self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class AsyncCatalogTests(APITestCase):
+
+	def setUp(self):
+		cache.clear()
+		seller = User.objects.create_user('seller', is_staff=True)
+		self.products = [
+			Product.objects.create(seller=seller, name=f'Wireless Speaker {i}', price=Decimal(f'{1000 + i}.00'), category='electronics')
+			for i in range(30)
+		]
+
+	def assertSameAsSync(self, name, sync_name, *args, query=''):
+		sync = self.client.get(reverse(sync_name, args=args) + query)
+		# Drop the cached responses but keep the catalog version the ETags embed
+		version = cache.get(CATALOG_VERSION_KEY)
+		cache.clear()
+		cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+		response = self.client.get(reverse(name, args=args) + query)
+		self.assertEqual(response.status_code, sync.status_code)
+		# Pagination links point back at the URL that was requested
+		strip = lambda data: {key: value for key, value in data.items() if key not in ('next', 'previous')}
+		self.assertEqual(strip(response.json()), strip(sync.json()))
+		self.assertEqual(response.get('ETag'), sync.get('ETag'))
+		return response
+
+	def test_same_responses_as_sync_views(self):
+		response = self.assertSameAsSync('async-products', 'products', query='?search=speaker&min_price=1005&page_size=10')
+		next_page = response.json()['next']
+		self.assertIn('/api/async/products/', next_page)
+		self.assertEqual(len(self.client.get(next_page).json()['results']), 10)
+		self.assertSameAsSync('async-products', 'products', query='?min_price=abc')
+		self.assertSameAsSync('async-product-detail', 'product-detail', self.products[0].pk)
+		self.assertSameAsSync('async-product-detail', 'product-detail', 0)
+		self.assertSameAsSync('async-product-facets', 'product-facets', query='?search=speaker')
+
+	def test_cache_and_conditional_get(self):
+		url = reverse('async-product-detail', args=[self.products[0].pk])
+		first = self.client.get(url)
+		self.assertEqual(first['X-Cache'], 'MISS')
+		self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+		self.assertEqual(self.client.post(reverse('async-products'), {}).status_code, 405)
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRouterTests(SimpleTestCase):
+
+	def test_request_reads_of_catalog_models_go_to_replica_until_a_write(self):
+		router = PrimaryReplicaRouter()
+		self.assertEqual(router.db_for_read(Product), 'default')
+		token = current.set(RoutingState())
+		try:
+			self.assertEqual(router.db_for_read(Product), 'replica')
+			self.assertEqual(router.db_for_read(ProductFacet), 'replica')
+			self.assertIsNone(router.db_for_read(Cart))
+			self.assertEqual(router.db_for_write(CartItem), 'default')
+			self.assertEqual(router.db_for_read(Product), 'default')
+		finally:
+			current.reset(token)
+		self.assertFalse(router.allow_migrate('replica', 'app'))
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaPinningTests(APITestCase):
+
+	def test_write_pins_client_to_primary(self):
+		user = User.objects.create_user('shopper')
+		product = Product.objects.create(seller=user, name='Lamp', price=Decimal('499.00'), stock=5)
+		Cart.objects.create(user=user)
+		self.client.force_authenticate(user)
+		self.assertNotIn(PIN_COOKIE, self.client.get(reverse('cart')).cookies)
+		response = self.client.post(reverse('cart'), {'product_id': product.pk, 'quantity': 1}, format='json')
+		self.assertLess(response.status_code, 300)
+		self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+	def test_catalog_cache_is_filled_from_primary(self):
+		cache.clear()
+		request = Request(RequestFactory().get('/api/products/batch/'))
+		for expect_pinned in (True, False):
+			state = RoutingState()
+			token = current.set(state)
+			try:
+				cached_many('product-detail', request, [1], lambda pks: {pk: {'id': pk} for pk in pks})
+			finally:
+				current.reset(token)
+			# Pinned on the miss; the hit after it reads nothing
+			self.assertEqual(state.pinned, expect_pinned)
+
+	def test_write_pins_token_client_without_cookies(self):
+		cache.clear()
+		pinned = []
+
+		def write(request):
+			current.get().wrote = True
+			return HttpResponse()
+
+		def read(request):
+			pinned.append(current.get().pinned)
+			return HttpResponse()
+
+		# The frontend sends its token in a header and no cookies
+		factory = RequestFactory()
+		ReplicaPinningMiddleware(write)(factory.post('/api/cart/', HTTP_AUTHORIZATION='Token abc'))
+		ReplicaPinningMiddleware(read)(factory.get('/api/cart/', HTTP_AUTHORIZATION='Token abc'))
+		ReplicaPinningMiddleware(read)(factory.get('/api/cart/', HTTP_AUTHORIZATION='Token xyz'))
+		self.assertEqual(pinned, [True, False])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite transactions')
+class SqliteTransactionTests(SimpleTestCase):
+	# Outside a test transaction, so atomic() blocks really BEGIN
+	databases = {'default'}
+
+	def begins(self, block):
+		with CaptureQueriesContext(connection) as queries:
+			with block:
+				Product.objects.exists()
+		return [query['sql'] for query in queries if query['sql'].startswith('BEGIN')]
+
+	def test_write_transactions_take_the_write_lock_up_front(self):
+		# Checkout reads before it writes; DEFERRED would fail the upgrade under concurrency
+		self.assertEqual(self.begins(write_transaction()), ['BEGIN IMMEDIATE'])
+		self.assertIsNone(connection.transaction_mode)
+
+	def test_other_transactions_stay_deferred(self):
+		self.assertEqual(self.begins(transaction.atomic()), ['BEGIN'])
+
+
+class SqlitePragmaTests(APITestCase):
+
+	@skipUnless(connection.vendor == 'sqlite', 'SQLite PRAGMAs')
+	def test_pragmas_applied_to_new_connections(self):
+		with override_settings(SQLITE_PRAGMAS={'cache_size': -1234}):
+			other = connection.copy()
+			try:
+				with other.cursor() as cursor:
+					cursor.execute('PRAGMA cache_size')
+					self.assertEqual(cursor.fetchone()[0], -1234)
+			finally:
+				other.close()
@@ -1,4 +1,5 @@
-from django.urls import path
+from django.urls import path, re_path
+from .async_views import AsyncProductDetailView, AsyncProductFacetView, AsyncProductListView, catalog_view
 from .views import (
 	APIRootView,
 	RegisterView,
@@ -6,10 +7,16 @@ from .views import (
 	LogoutView,
 	ProfileView,
 	ProductListCreateView,
+	ProductFacetView,
 	ProductDetailView,
+	ProductBatchView,
+	ProductSuggestView,
+	ProductImageView,
 	CartView,
+	CartBatchView,
 	OrderListCreateView,
 	OrderDetailView,
+	MetricsView,
 )
 
 urlpatterns = [
@@ -23,14 +30,32 @@ urlpatterns = [
 	path('users/profile/', ProfileView.as_view(), name='profile'),
 
 	# Products
-	path('products/', ProductListCreateView.as_view(), name='products'),
-	path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
+	# Async reads with ASYNC_CATALOG_VIEWS (see app/async_views.py)
+	path('products/', catalog_view(AsyncProductListView, ProductListCreateView), name='products'),
+	path('products/facets/', catalog_view(AsyncProductFacetView, ProductFacetView), name='product-facets'),
+	path('products/suggest/', ProductSuggestView.as_view(), name='product-suggest'),
+	path('products/batch/', ProductBatchView.as_view(), name='product-batch'),
+	path('products/<int:pk>/', catalog_view(AsyncProductDetailView, ProductDetailView), name='product-detail'),
+	re_path(
+		r'^images/(?P<image_hash>[0-9a-f]{32})/(?P<width>[0-9]{1,5})\.(?P<extension>webp|jpg)$',
+		ProductImageView.as_view(),
+		name='product-image',
+	),
+
+	# Async catalog reads, whatever ASYNC_CATALOG_VIEWS says
+	path('async/products/', AsyncProductListView.as_view(), name='async-products'),
+	path('async/products/facets/', AsyncProductFacetView.as_view(), name='async-product-facets'),
+	path('async/products/<int:pk>/', AsyncProductDetailView.as_view(), name='async-product-detail'),
 
 	# Cart
 	path('cart/', CartView.as_view(), name='cart'),
+	path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),
 
 	# Orders
 	path('orders/', OrderListCreateView.as_view(), name='orders'),
 	path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+
+	# Monitoring
+	path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
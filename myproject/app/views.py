@@ -1,17 +1,47 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Count, Max, Prefetch, Q, prefetch_related_objects
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
 from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 
 from .serializers import (
 	UserSerializer, RegisterSerializer, ProductSerializer,
-	CartSerializer, CartItemSerializer, OrderSerializer, OrderItemSerializer
+	CartSerializer, CartItemSerializer, CartOperationSerializer, CartBatchSerializer,
+	OrderSerializer, OrderItemSerializer
 )
 from .models import Product, Cart, CartItem, Order, OrderItem
+from .pagination import KeysetPagination
+from .cache import CatalogCacheMixin, cached_many, cached_validators, catalog_version, normalize_params
+from .conditional import ConditionalGetMixin, latest, make_etag
+from .cart import add_items, apply_operations, get_cart
+from .checkout import checkout_cart
+from .inventory import cancel_order
+from .facets import facet_counts
+from .images import CONTENT_TYPES, IMMUTABLE_CACHE_CONTROL, variant_path
+from .metrics import SerializerTimingMixin, render_metrics, serializer_data
+from .filters import filter_products
+from .search import search_products
+from .suggest import get_index
+from .sparse import fieldset_params, sparse_queryset
+
+
+def cart_items_prefetch(request):
+	# CartSerializer -> CartItemSerializer -> ProductSerializer -> seller
+	items = CartItem.objects.select_related('product__seller')
+	return Prefetch('items', queryset=sparse_queryset(items, CartItemSerializer, request, ['items'], keep=['cart']))
+
+
+def orders_with_items(request, orders):
+	# Items render from their checkout snapshots, and the user is the requester
+	items = sparse_queryset(OrderItem.objects.all(), OrderItemSerializer, request, ['items'], keep=['order'])
+	return sparse_queryset(orders, OrderSerializer, request).prefetch_related(Prefetch('items', queryset=items))
 
 
 class APIRootView(APIView):
@@ -32,20 +62,27 @@ class APIRootView(APIView):
 				'products': {
 					'list': '/api/products/',
 					'detail': '/api/products/<id>/',
+					'batch': '/api/products/batch/?ids=<id>,<id>',
 					'search': '/api/products/?search=<query>',
+					'suggest': '/api/products/suggest/?q=<prefix>',
 					'filter_by_category': '/api/products/?category=<category>',
+					'facets': '/api/products/facets/',
+					'images': '/api/images/<hash>/<width>.<webp|jpg>',
+					'async': '/api/async/products/',
 				},
 				'cart': {
 					'get_cart': 'GET /api/cart/',
 					'add_item': 'POST /api/cart/',
 					'update_item': 'PATCH /api/cart/',
 					'remove_item': 'DELETE /api/cart/',
+					'batch': 'POST /api/cart/batch/',
 				},
 				'orders': {
 					'list': '/api/orders/',
 					'create': 'POST /api/orders/',
 					'detail': '/api/orders/<id>/',
-				}
+				},
+				'metrics': '/api/metrics/',
 			},
 			'documentation': 'See BACKEND_API_SETUP_TEST.md for detailed API documentation'
 		})
@@ -62,7 +99,7 @@ class RegisterView(APIView):
 			token, _ = Token.objects.get_or_create(user=user)
 			return Response({
 				'token': token.key,
-				'user': UserSerializer(user).data
+				'user': serializer_data(UserSerializer(user))
 			}, status=status.HTTP_201_CREATED)
 		return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -75,7 +112,7 @@ class LoginView(APIView):
 		user = authenticate(username=username, password=password)
 		if user:
 			token, _ = Token.objects.get_or_create(user=user)
-			return Response({'token': token.key, 'user': UserSerializer(user).data})
+			return Response({'token': token.key, 'user': serializer_data(UserSerializer(user))})
 		return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 class LogoutView(APIView):
@@ -86,47 +123,35 @@ class LogoutView(APIView):
 		Token.objects.filter(user=request.user).delete()
 		return Response({'detail': 'Logged out'})
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+class ProfileView(SerializerTimingMixin, generics.RetrieveUpdateAPIView):
 	serializer_class = UserSerializer
 	permission_classes = [permissions.IsAuthenticated]
 
 	def get_object(self):
 		return self.request.user
 
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(ConditionalGetMixin, CatalogCacheMixin, SerializerTimingMixin, generics.ListCreateAPIView):
 	serializer_class = ProductSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+	pagination_class = KeysetPagination
+	cache_namespace = 'products'
 
 	def get_queryset(self):
-		queryset = Product.objects.all().order_by('-created_at')
+		queryset = Product.objects.select_related('seller').order_by('-created_at', 'id')
 		
-		# Search by name or description
+		# Search by name or description (ranked by relevance)
 		search = self.request.query_params.get('search', None)
 		if search:
-			queryset = queryset.filter(
-				Q(name__icontains=search) | 
-				Q(description__icontains=search)
-			)
-		
-		# Filter by category
-		category = self.request.query_params.get('category', None)
-		if category:
-			queryset = queryset.filter(category__iexact=category)
-		
-		# Filter by subcategory
-		subcategory = self.request.query_params.get('subcategory', None)
-		if subcategory:
-			queryset = queryset.filter(subcategory__iexact=subcategory)
-		
-		# Filter by price range
-		min_price = self.request.query_params.get('min_price', None)
-		max_price = self.request.query_params.get('max_price', None)
-		if min_price:
-			queryset = queryset.filter(price__gte=float(min_price))
-		if max_price:
-			queryset = queryset.filter(price__lte=float(max_price))
-		
-		return queryset
+			queryset = search_products(queryset, search)
+
+		queryset = filter_products(queryset, self.request.query_params)
+		return sparse_queryset(queryset, ProductSerializer, self.request)
+
+	def get_validators(self, request, *args, **kwargs):
+		def compute():
+			stats = self.get_queryset().order_by().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+			return make_etag('products', stats['count'], stats['last_modified'], normalize_params(request.query_params))
+		return cached_validators(self.cache_namespace, request, kwargs, compute)
 
 	def perform_create(self, serializer):
 		# Only sellers (is_staff=True) can create products
@@ -135,123 +160,232 @@ class ProductListCreateView(generics.ListCreateAPIView):
 		serializer.save(seller=self.request.user)
 
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProductFacetView(CatalogCacheMixin, generics.RetrieveAPIView):
+	"""Product counts per category, subcategory and price band for the active filters"""
+	permission_classes = [permissions.AllowAny]
+	cache_namespace = 'facets'
+
+	def retrieve(self, request, *args, **kwargs):
+		search = request.query_params.get('search', None)
+		search_queryset = search_products(Product.objects.all(), search) if search else None
+		return Response(facet_counts(request.query_params, search_queryset))
+
+
+class ProductDetailView(ConditionalGetMixin, CatalogCacheMixin, SerializerTimingMixin, generics.RetrieveUpdateDestroyAPIView):
 	serializer_class = ProductSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-	queryset = Product.objects.all()
+	cache_namespace = 'product-detail'
+
+	def get_queryset(self):
+		return sparse_queryset(Product.objects.select_related('seller'), ProductSerializer, self.request)
+
+	def get_validators(self, request, *args, **kwargs):
+		def compute():
+			updated_at = Product.objects.filter(pk=kwargs['pk']).values_list('updated_at', flat=True).first()
+			if updated_at is None:
+				return None
+			return make_etag('product', kwargs['pk'], updated_at, fieldset_params(request.query_params))
+		return cached_validators(self.cache_namespace, request, kwargs, compute)
+
+
+class ProductBatchView(APIView):
+	"""Products by id in request order, e.g. ?ids=3,1,2, from the detail view's cache where possible"""
+	permission_classes = [permissions.AllowAny]
+
+	def get(self, request):
+		ids = []
+		for value in request.query_params.get('ids', '').split(','):
+			value = value.strip()
+			if not value:
+				continue
+			try:
+				pk = int(value)
+			except ValueError:
+				raise ValidationError({'ids': f'Invalid product id: {value!r}.'})
+			if pk not in ids:
+				ids.append(pk)
+		if not ids:
+			raise ValidationError({'ids': 'Give a comma separated list of product ids.'})
+		if len(ids) > settings.PRODUCT_BATCH_MAX:
+			raise ValidationError({'ids': f'At most {settings.PRODUCT_BATCH_MAX} ids per request.'})
+
+		def compute(missing):
+			queryset = Product.objects.select_related('seller').filter(pk__in=missing)
+			products = list(sparse_queryset(queryset, ProductSerializer, request))
+			data = serializer_data(ProductSerializer(products, many=True, context={'request': request}))
+			return {product.pk: item for product, item in zip(products, data)}
+
+		# Entries are shared with ProductDetailView, so each product is serialized once
+		found = cached_many(ProductDetailView.cache_namespace, request, ids, compute)
+		return Response({
+			'results': [found[pk] for pk in ids if pk in found],
+			'missing': [pk for pk in ids if pk not in found],
+		})
+
+
+class ProductSuggestView(APIView):
+	"""Typeahead suggestions for the search box: ?q=<prefix>&limit=<n>"""
+	permission_classes = [permissions.AllowAny]
+	# The same for everyone, so skip the token lookup
+	authentication_classes = []
+
+	def get(self, request):
+		try:
+			limit = min(int(request.query_params.get('limit', settings.SUGGEST_LIMIT)), settings.SUGGEST_LIMIT)
+		except ValueError:
+			raise ValidationError({'limit': 'Must be a number.'})
+		query = request.query_params.get('q', '')
+		return Response({'query': query, 'suggestions': get_index().suggest(query, max(limit, 0))})
+
+
+class ProductImageView(ConditionalGetMixin, APIView):
+	"""Serve a generated image variant. URLs are content-addressed, so responses never go stale."""
+	permission_classes = [permissions.AllowAny]
+	authentication_classes = []
 
+	def get_validators(self, request, image_hash, width, extension):
+		return quote_etag(f'{image_hash}-{width}.{extension}'), None
 
-class CartView(APIView):
+	def get(self, request, image_hash, width, extension):
+		path = variant_path(image_hash, width, extension)
+		if not path.is_file():
+			raise Http404
+		response = FileResponse(path.open('rb'), content_type=CONTENT_TYPES[extension])
+		response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+		return response
+
+class CartView(ConditionalGetMixin, APIView):
 	permission_classes = [permissions.IsAuthenticated]
 
+	def get_validators(self, request, *args, **kwargs):
+		# Item count catches removals, product timestamps catch price changes and
+		# the catalog version seller renames. Only the ETag sees all three, so
+		# there is no Last-Modified.
+		stats = CartItem.objects.filter(cart__user=request.user).aggregate(
+			count=Count('id'),
+			items_modified=Max('updated_at'),
+			products_modified=Max('product__updated_at'),
+		)
+		last_modified = latest(stats['items_modified'], stats['products_modified'])
+		etag = make_etag('cart', request.user.pk, stats['count'], last_modified, catalog_version(), fieldset_params(request.query_params))
+		return etag, None
+
 	def get(self, request):
 		# Get or create cart
 		cart, created = Cart.objects.get_or_create(user=request.user)
-		serializer = CartSerializer(cart)
-		return Response(serializer.data)
+		prefetch_related_objects([cart], cart_items_prefetch(request))
+		serializer = CartSerializer(cart, context={'request': request})
+		return Response(serializer_data(serializer))
 
 	def post(self, request):
-		# Add item to cart
-		cart, created = Cart.objects.get_or_create(user=request.user)
-		product_id = request.data.get('product_id')
-		quantity = request.data.get('quantity', 1)
-
-		try:
-			product = Product.objects.get(id=product_id)
-		except Product.DoesNotExist:
+		# Add item to cart with one upsert (see app/cart.py)
+		serializer = CartOperationSerializer(data={'product_id': request.data.get('product_id'), 'quantity': request.data.get('quantity', 1)})
+		serializer.is_valid(raise_exception=True)
+		product_id = serializer.validated_data['product_id']
+		cart = get_cart(request.user)
+		if not add_items(cart, {product_id: serializer.validated_data['quantity']}):
 			return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
-		cart_item, created = CartItem.objects.get_or_create(
-			cart=cart,
-			product=product,
-			defaults={'quantity': quantity}
-		)
-		if not created:
-			cart_item.quantity += int(quantity)
-			cart_item.save()
-
-		return Response(CartItemSerializer(cart_item).data)
+		cart_item = CartItem.objects.select_related('product__seller').get(cart=cart, product_id=product_id)
+		return Response(serializer_data(CartItemSerializer(cart_item)))
 
 	def patch(self, request):
-		# Update cart item quantity
-		cart = Cart.objects.get(user=request.user)
-		product_id = request.data.get('product_id')
-		quantity = request.data.get('quantity')
+		# Set an item's quantity, or remove it with quantity 0, as a batch update would
+		serializer = CartOperationSerializer(data={'op': 'update', 'product_id': request.data.get('product_id'), 'quantity': request.data.get('quantity')})
+		serializer.is_valid(raise_exception=True)
+		operation = serializer.validated_data
+		cart = apply_operations(request.user, [operation])
+		if not operation['quantity']:
+			return Response({'detail': 'Item removed'})
 
-		try:
-			cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-			if quantity and quantity > 0:
-				cart_item.quantity = quantity
-				cart_item.save()
-				return Response(CartItemSerializer(cart_item).data)
-			else:
-				cart_item.delete()
-				return Response({'detail': 'Item removed'})
-		except CartItem.DoesNotExist:
-			return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+		cart_item = CartItem.objects.select_related('product__seller').get(cart=cart, product_id=operation['product_id'])
+		return Response(serializer_data(CartItemSerializer(cart_item)))
 
 	def delete(self, request):
 		# Remove item from cart
-		cart = Cart.objects.get(user=request.user)
-		product_id = request.data.get('product_id')
-
-		try:
-			cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-			cart_item.delete()
-			return Response({'detail': 'Item removed'})
-		except CartItem.DoesNotExist:
+		deleted, _ = CartItem.objects.filter(cart__user=request.user, product_id=request.data.get('product_id')).delete()
+		if not deleted:
 			return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+		return Response({'detail': 'Item removed'})
+
+
+class CartBatchView(APIView):
+	"""Apply many add/update/remove operations to the cart in one transaction."""
+	permission_classes = [permissions.IsAuthenticated]
+
+	def post(self, request):
+		serializer = CartBatchSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		cart = apply_operations(request.user, serializer.validated_data['operations'])
+		prefetch_related_objects([cart], cart_items_prefetch(request))
+		return Response(serializer_data(CartSerializer(cart, context={'request': request})))
 
 
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(SerializerTimingMixin, generics.ListCreateAPIView):
 	serializer_class = OrderSerializer
 	permission_classes = [permissions.IsAuthenticated]
+	pagination_class = KeysetPagination
 
 	def get_queryset(self):
-		return Order.objects.filter(user=self.request.user).order_by('-created_at')
+		return orders_with_items(self.request, Order.objects.filter(user=self.request.user).order_by('-created_at', 'id'))
 
 	def perform_create(self, serializer):
 		# Create order from cart
-		user = self.request.user
-		try:
-			cart = Cart.objects.get(user=user)
-		except Cart.DoesNotExist:
-			raise Response({'error': 'Cart not found'}, status=status.HTTP_404_NOT_FOUND)
-
-		# Calculate total
-		total = sum(item.product.price * item.quantity for item in cart.items.all())
-
-		# Get payment method and shipping address from request
-		payment_method = self.request.data.get('payment_method', 'cod')
-		shipping_address = self.request.data.get('shipping_address', '')
-
-		# Create order
-		order = Order.objects.create(
-			user=user, 
-			total_price=total,
-			payment_method=payment_method,
-			shipping_address=shipping_address
+		order = checkout_cart(
+			self.request.user,
+			payment_method=serializer.validated_data.get('payment_method', Order.PAYMENT_COD),
+			shipping_address=serializer.validated_data.get('shipping_address', ''),
 		)
-
-		# Create order items from cart items
-		for cart_item in cart.items.all():
-			OrderItem.objects.create(
-				order=order,
-				product=cart_item.product,
-				quantity=cart_item.quantity,
-				price=cart_item.product.price
-			)
-
-		# Clear cart
-		cart.items.all().delete()
-
-		return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+		# Re-read with the list's query plan so the response is a fixed cost too
+		serializer.instance = self.get_queryset().get(pk=order.pk)
 
 
-class OrderDetailView(generics.RetrieveUpdateAPIView):
+class OrderDetailView(ConditionalGetMixin, SerializerTimingMixin, generics.RetrieveUpdateAPIView):
 	serializer_class = OrderSerializer
 	permission_classes = [permissions.IsAuthenticated]
 
 	def get_queryset(self):
-		return Order.objects.filter(user=self.request.user)
+		return orders_with_items(self.request, Order.objects.filter(user=self.request.user))
+
+	def get_validators(self, request, *args, **kwargs):
+		# Items render from snapshots, so products don't matter, but backfilling one does
+		stats = Order.objects.filter(pk=kwargs['pk'], user=request.user).aggregate(
+			last_modified=Max('updated_at'),
+			count=Count('items'),
+			unsnapshotted=Count('items', filter=Q(items__product_name='')),
+		)
+		if stats['last_modified'] is None:
+			return None, None
+		etag = make_etag('order', kwargs['pk'], stats['count'], stats['unsnapshotted'], stats['last_modified'], fieldset_params(request.query_params))
+		return etag, stats['last_modified']
+
+	def perform_update(self, serializer):
+		order = serializer.instance
+		new_status = serializer.validated_data.pop('status', order.status)
+		if new_status == Order.STATUS_CANCELLED:
+			# Releases the reserved stock exactly once
+			cancel_order(order)
+		elif order.status == Order.STATUS_CANCELLED:
+			raise ValidationError({'error': 'Cancelled orders cannot be reopened'})
+		else:
+			order.status = new_status
+		serializer.save()
+
+
+
+class MetricsView(APIView):
+	"""
+	Request metrics of every worker, in the Prometheus text format. Scrapers
+	send METRICS_TOKEN as a bearer token; without one, only staff may read.
+	"""
+	permission_classes = [permissions.AllowAny]
 
+	def get(self, request):
+		token = settings.METRICS_TOKEN
+		if token:
+			allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+		else:
+			allowed = request.user.is_staff
+		if not allowed:
+			raise PermissionDenied()
+		return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
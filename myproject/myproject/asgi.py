@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_asgi_application()
+
+# Load the typeahead index now rather than on the first request
+from app.suggest import warm_index  # noqa: E402
+warm_index()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings include the rest of the stack
+    'app.metrics.MetricsMiddleware',
+    'app.database.ReplicaPinningMiddleware',
+    # Outside everything that changes response bodies
+    'app.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -84,6 +90,111 @@ DATABASES = {
     }
 }
 
+# DJANGO_DB_PROFILE=production tunes SQLite for several concurrent workers:
+# persistent, health-checked connections and the PRAGMAs below (applied to
+# every new connection by app/database.py).
+DATABASE_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+SQLITE_PRAGMAS = {}
+if DATABASE_PROFILE == 'production':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000,
+        'cache_size': -20000,  # KiB
+        'temp_store': 'memory',
+    }
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# DJANGO_DB_REPLICA names a read replica of the database, e.g. a copy kept
+# current by Litestream or LiteFS, or locally by "manage.py sync_replica".
+# Request-time reads of REPLICA_MODELS go there; clients that write read
+# from the primary for REPLICA_PIN_SECONDS afterwards.
+REPLICA_DATABASE = None
+if os.environ.get('DJANGO_DB_REPLICA'):
+    REPLICA_DATABASE = 'replica'
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DJANGO_DB_REPLICA'],
+        # Only ever read, so no write locks
+        'OPTIONS': {},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['app.database.PrimaryReplicaRouter']
+REPLICA_MODELS = ['app.Product', 'app.ProductFacet']
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Any backend works, including django.core.cache.backends.filebased.FileBasedCache
+# when several workers should share cached catalog responses.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Seconds a cached product list/detail response may live. Product changes
+# invalidate it immediately through the catalog version (see app/cache.py).
+CATALOG_CACHE_TIMEOUT = 300
+
+# Most product ids GET /api/products/batch/ accepts in one request
+PRODUCT_BATCH_MAX = 100
+
+# Typeahead for GET /api/products/suggest/ (see app/suggest.py): the index
+# snapshot workers load at start-up (manage.py build_suggest_index writes
+# it), the most suggestions per request, and how often a worker checks for
+# product changes made by other workers.
+SUGGEST_INDEX_PATH = BASE_DIR / 'suggest_index.bin'
+SUGGEST_LIMIT = 10
+SUGGEST_REFRESH_SECONDS = 30
+
+# Serve GET on the product list, detail and facet URLs from the async views
+# in app/async_views.py. Worth it under an ASGI server (asgi.py); under WSGI
+# each async request just runs on its own event loop.
+ASYNC_CATALOG_VIEWS = False
+
+# Token -> user snapshots for app.authentication.CachedTokenAuthentication.
+# Logout and user changes evict them; other workers' in-process copies can
+# outlive that by up to TOKEN_CACHE_LOCAL_TIMEOUT seconds.
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_TIMEOUT = 5
+TOKEN_CACHE_LOCAL_SIZE = 1024
+
+# Generated product image variants (see app/images.py). Files are named by
+# content hash and served with far-future cache headers.
+MEDIA_ROOT = BASE_DIR / 'media'
+IMAGE_CACHE_DIR = MEDIA_ROOT / 'images'
+IMAGE_WIDTHS = [160, 320, 640, 1280]
+IMAGE_QUALITY = 80
+
+# Request metrics served at /api/metrics/ (see app/metrics.py). With several
+# worker processes set DJANGO_METRICS_DIR to a directory of this deploy's
+# own (e.g. one per release), where each worker writes its snapshot. Unset,
+# metrics stay in-process, which only suits a single worker. Set
+# METRICS_TOKEN to require "Authorization: Bearer <token>" from the scraper;
+# without it only staff users may read them.
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = None
+# Runs tests with METRICS_DIR unset
+TEST_RUNNER = 'app.testing.TestRunner'
+
+# Response compression (see app/compression.py): brotli when the brotli
+# package is installed and the client accepts it, otherwise gzip.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ['application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript']
+BROTLI_QUALITY = 4
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,10 +273,20 @@ CORS_ALLOW_METHODS = [
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'app.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed drop-ins for DRF's JSON renderer and parser (see app/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'app.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_wsgi_application()
+
+# Load the typeahead index now rather than on the first request
+from app.suggest import warm_index  # noqa: E402
+warm_index()
@@ -4,7 +4,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 django.setup()
 
-from app.models import Product
+from app.images import remap_product_images
 
 # Update products with real image URLs using Unsplash
 product_images = {
@@ -25,17 +25,10 @@ product_images = {
     'Nivea Face Cream': 'https://images.unsplash.com/photo-1556228578-0d85b1a4d571?w=400',
 }
 
-updated_count = 0
-for product_name, image_url in product_images.items():
-    try:
-        product = Product.objects.get(name=product_name)
-        product.image = image_url
-        product.save()
-        updated_count += 1
-        print(f"Updated: {product_name}")
-    except Product.DoesNotExist:
-        print(f"Not found: {product_name}")
+stats = remap_product_images(product_images)
+for name in stats['missing']:
+    print(f"Not found: {name}")
+for name, errors in stats['invalid'].items():
+    print(f"Invalid URL for {name}: {errors}")
 
-print(f"\nUpdated {updated_count} product images!")
-print(f"Total products: {Product.objects.count()}")
-print("All products now have real images!")
+print(f"\nUpdated {stats['updated']} product images ({stats['unchanged']} already current)")